@@ -4,13 +4,23 @@ qoc - a directory for the main package
 
 from .core import (evolve_lindblad_discrete,
                    grape_lindblad_discrete,
+                   evolve_lindblad_trajectories,
                    evolve_schroedinger_discrete,
-                   grape_schroedinger_discrete,)
+                   goat_schroedinger_discrete,
+                   grape_schroedinger_discrete,
+                   krotov_schroedinger_discrete,
+                   min_time_schroedinger_discrete,
+                   multiresolution_schroedinger_discrete,)
 
 
 __all__ = [
     "evolve_lindblad_discrete",
     "grape_lindblad_discrete",
+    "evolve_lindblad_trajectories",
     "evolve_schroedinger_discrete",
+    "goat_schroedinger_discrete",
     "grape_schroedinger_discrete",
+    "krotov_schroedinger_discrete",
+    "min_time_schroedinger_discrete",
+    "multiresolution_schroedinger_discrete",
 ]
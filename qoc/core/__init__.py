@@ -4,12 +4,22 @@ core - a directory for the primary functionality exposed by qoc
 
 from .lindbladdiscrete import (evolve_lindblad_discrete,
                                grape_lindblad_discrete,)
+from .lindbladtrajectories import evolve_lindblad_trajectories
 from .schroedingerdiscrete import (evolve_schroedinger_discrete,
-                                   grape_schroedinger_discrete,)
+                                   goat_schroedinger_discrete,
+                                   grape_schroedinger_discrete,
+                                   krotov_schroedinger_discrete,
+                                   min_time_schroedinger_discrete,
+                                   multiresolution_schroedinger_discrete,)
 
 __all__ = [
     "evolve_lindblad_discrete",
     "grape_lindblad_discrete",
+    "evolve_lindblad_trajectories",
     "evolve_schroedinger_discrete",
+    "goat_schroedinger_discrete",
     "grape_schroedinger_discrete",
+    "krotov_schroedinger_discrete",
+    "min_time_schroedinger_discrete",
+    "multiresolution_schroedinger_discrete",
 ]
@@ -3,6 +3,11 @@ common.py - This module defines methods that are used by
 multiple core functionalities.
 """
 
+import warnings
+
+from autograd import grad
+from autograd.extend import Box, defvjp_argnums, primitive
+import autograd.numpy as anp
 import numpy as np
 
 def clip_control_norms(controls, max_control_norms):
@@ -18,17 +23,118 @@ def clip_control_norms(controls, max_control_norms):
 
     Returns: None
     """
-    for i, max_control_norm in enumerate(max_control_norms):
-        control = controls[:, i]
-        control_norm = np.abs(control)
-        offending_indices = np.nonzero(np.less(max_control_norm, control_norm))
-        offending_control_points = control[offending_indices]
-        # Rescale the offending points to `max_control_norm`.
-        resolved_control_points = ((offending_control_points / control_norm[offending_indices])
-                                   * max_control_norm)
-        control[offending_indices] = resolved_control_points
+    control_norms = np.abs(controls)
+    max_control_norms = np.broadcast_to(max_control_norms, controls.shape)
+    offending_indices = np.nonzero(np.less(max_control_norms, control_norms))
+    # Rescale the offending points to their `max_control_norm`.
+    controls[offending_indices] = ((controls[offending_indices]
+                                    / control_norms[offending_indices])
+                                   * max_control_norms[offending_indices])
+
+
+@primitive
+def evaluate_cost(cost, controls, states, system_eval_step):
+    """
+    Evaluate a cost as a single autograd primitive. When this primitive is
+    differentiated, the adjoint sources are taken from `cost.cost_and_grad`
+    rather than from taping the operations inside of `cost.cost`.
+    If the differentiation is itself differentiated, e.g. for hessian-vector
+    products, the adjoint sources are taken from autograd on `cost.cost`.
+
+    Arguments:
+    cost :: qoc.models.cost.Cost - the cost to evaluate
+    controls :: ndarray - the control parameters
+    states :: ndarray - the states (or densities) at `system_eval_step`
+    system_eval_step :: int - the system time step
+
+    Returns:
+    cost_error :: float - the cost
+    """
+    return cost.cost(controls, states, system_eval_step)
+
+
+def _evaluate_cost_vjp(argnums, ans, args, kwargs):
+    cost, controls, states, system_eval_step = args
+    def vjp(g):
+        # The gradients are only computed once the backward pass reaches this node.
+        if any(isinstance(arg, Box) for arg in (g, controls, states)):
+            # The backward pass is being taped, so the gradients must be differentiable.
+            # Costs that do not depend on the controls trigger autograd's warning
+            # that the output is independent of the input.
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", UserWarning)
+                dcost_dcontrols = grad(cost.cost, 0)(controls, states, system_eval_step)
+                dcost_dstates = grad(cost.cost, 1)(controls, states, system_eval_step)
+        else:
+            _, dcost_dcontrols, dcost_dstates = cost.cost_and_grad(controls, states,
+                                                                   system_eval_step)
+        if dcost_dcontrols is None:
+            dcost_dcontrols = np.zeros_like(controls)
+        if dcost_dstates is None:
+            dcost_dstates = np.zeros_like(states)
+        grads = {1: dcost_dcontrols, 2: dcost_dstates}
+        return tuple(g * grads[argnum] for argnum in argnums)
+    #ENDDEF
+    return vjp
+
+
+defvjp_argnums(evaluate_cost, _evaluate_cost_vjp)
+
+
+def evaluate_control_costs(control_costs, controls, system_eval_step):
+    """
+    Evaluate the costs that depend only on the controls, and their gradients,
+    outside of the evolution. Because these costs do not see the states,
+    they may be re-scored for new controls without evolving the system.
+
+    Arguments:
+    control_costs :: iterable(qoc.models.cost.Cost) - costs whose
+        `requires_states` field is False
+    controls :: ndarray (control_eval_count x control_count)
+        - the control parameters
+    system_eval_step :: int - the system time step the costs are evaluated at
+
+    Returns:
+    error :: float - the total error of the costs
+    grads :: ndarray (control_eval_count x control_count) - the gradients
+        of the total error with respect to the controls, in autograd's convention
+    """
+    error = 0
+    grads = np.zeros_like(controls)
+    for cost in control_costs:
+        cost_error, dcost_dcontrols, _ = cost.cost_and_grad(controls, None,
+                                                            system_eval_step)
+        error = error + cost_error
+        grads = grads + dcost_dcontrols
     #ENDFOR
 
+    return error, grads
+
+
+def get_control_bounds(complex_controls, controls_shape, max_control_norms):
+    """
+    Translate `max_control_norms` into element-wise bounds on the controls
+    in optimizer format. For real controls the bounds are exact. For complex controls
+    the bounds on the real and imaginary parts form the square that circumscribes
+    the disk of allowed values, so the controls must still be clipped to the disk.
+
+    Arguments:
+    complex_controls :: bool - whether or not the controls in cost function
+        format are complex
+    controls_shape :: tuple(int) - the shape of the controls in cost function format
+    max_control_norms :: ndarray (control_count) - the maximum norm of each control
+
+    Returns:
+    bounds :: tuple(ndarray (2 * controls_size if COMPLEX else controls_size))
+        - the lower and upper bounds on the controls in optimizer format
+    """
+    max_controls = np.broadcast_to(max_control_norms, controls_shape)
+    if complex_controls:
+        max_controls = max_controls * (1 + 1j)
+    upper_bounds = strip_controls(complex_controls, max_controls)
+
+    return -upper_bounds, upper_bounds
+
 
 def gen_controls_cos(complex_controls, control_count, control_eval_count,
                      evolution_time, max_control_norms, periods=10.):
@@ -198,7 +304,69 @@ def initialize_controls(complex_controls,
     return controls, max_control_norms
 
 
-def slap_controls(complex_controls, controls, controls_shape,):
+def project_controls(control_basis, controls):
+    """
+    Find the coefficients of the controls in a basis,
+    in the least squares sense.
+
+    Arguments:
+    control_basis :: ndarray (control_eval_count x basis_size) - the basis
+    controls :: ndarray (control_eval_count x control_count) - the controls
+
+    Returns:
+    coefficients :: ndarray (basis_size x control_count) - the coefficients
+    """
+    coefficients, _, _, _ = np.linalg.lstsq(control_basis, controls, rcond=None)
+
+    return coefficients
+
+
+def resample_controls(controls, control_eval_count):
+    """
+    Resample controls onto a different number of evenly spaced
+    control eval times over the same evolution. The controls are
+    interpolated linearly, as they are during the evolution, so the
+    resampled controls reproduce the controls at every time that is
+    on both grids.
+
+    Arguments:
+    controls :: ndarray (control_eval_count' x control_count) - the controls
+    control_eval_count :: int - the number of control eval times to resample onto
+
+    Returns:
+    resampled_controls :: ndarray (control_eval_count x control_count)
+        - the resampled controls
+    """
+    control_eval_times = np.linspace(0, 1, controls.shape[0])
+    resampled_control_eval_times = np.linspace(0, 1, control_eval_count)
+    resampled_controls = np.stack([np.interp(resampled_control_eval_times,
+                                             control_eval_times, controls[:, i])
+                                   for i in range(controls.shape[1])], axis=1)
+
+    return resampled_controls
+
+
+def rescale_control_norms(controls, max_control_norms):
+    """
+    Rescale the controls whose norms exceed their maximum norm to that norm,
+    as `clip_control_norms` does. This method is not in place, so it may be
+    differentiated with autograd.
+
+    Arguments:
+    controls :: ndarray (control_eval_count x control_count) - the controls
+    max_control_norms :: ndarray (control_count) - the maximum norm of each control
+
+    Returns:
+    controls :: ndarray (control_eval_count x control_count) - the rescaled controls
+    """
+    # The scale is one where a control does not exceed its maximum norm
+    # and `max_control_norm` / `control_norm` where it does.
+    scales = max_control_norms / anp.maximum(anp.abs(controls), max_control_norms)
+
+    return controls * scales
+
+
+def slap_controls(complex_controls, controls, controls_shape, control_basis=None,):
     """
     Reshape and transform controls in optimizer format
     to controls in cost function format.
@@ -209,16 +377,26 @@ def slap_controls(complex_controls, controls, controls_shape,):
     controls :: ndarray (2 * controls_size if COMPLEX else controls_size)
         - the controls in optimizer format
     controls_shape :: tuple(int) - 
+    control_basis :: ndarray (control_eval_count x basis_size) - if specified,
+        the controls in optimizer format are the coefficients of the controls
+        in this basis
     
     Returns:
     controls :: ndarray (controls_shape)- the controls in cost function format
     """
     # Transform the controls to C if they are complex.
+    # These operations are differentiable so that hessian-vector products
+    # may be taken with respect to the controls in optimizer format.
     if complex_controls:
-        real, imag = np.split(controls, 2)
+        real, imag = anp.split(controls, 2)
         controls = real + 1j * imag
     # Reshape the controls.
-    controls = np.reshape(controls, controls_shape)
+    if control_basis is None:
+        controls = anp.reshape(controls, controls_shape)
+    else:
+        # Expand the coefficients in the basis.
+        coefficients = anp.reshape(controls, (control_basis.shape[1], controls_shape[1]))
+        controls = anp.matmul(control_basis, coefficients)
     
     return controls
 
@@ -5,26 +5,49 @@ lindblad master equation using time-discrete
 control parameters.
 """
 
+import os
+
+from autograd import grad, make_vjp
 from autograd.extend import Box
+from autograd.tracer import getval
+import autograd.numpy as anp
 import numpy as np
 
 from qoc.core.common import (clip_control_norms,
+                             evaluate_control_costs,
+                             evaluate_cost,
+                             get_control_bounds,
+                             project_controls,
+                             rescale_control_norms,
                              initialize_controls,
                              slap_controls, strip_controls,)
 from qoc.core.mathmethods import (integrate_rkdp5,
+                                  integrate_sdirk2_step,
                                   interpolate_linear_set,
-                                  get_lindbladian,)
-from qoc.models import (Dummy,
+                                  get_lindbladian,
+                                  get_lindbladian_superoperator,
+                                  get_lindblad_jumps,
+                                  get_lindblad_operator_cache,
+                                  magnus_m2,
+                                  magnus_m4,
+                                  magnus_m6,)
+from qoc.models import (DensityPolicy,
+                        Dummy,
                         EvolveLindbladDiscreteState,
                         EvolveLindbladResult,
                         InterpolationPolicy,
                         OperationPolicy,
                         GrapeLindbladDiscreteState,
                         GrapeLindbladResult,
-                        ProgramType,)
+                        IntegrationPolicy,
+                        MagnusPolicy,
+                        ProgramType,
+                        load_checkpoint,)
 from qoc.standard import (Adam, ans_jacobian, commutator,
-                          conjugate_transpose,
-                          matmuls,)
+                          conjugate_transpose, expm, expm_multiply,
+                          matmuls, pack_hermitian,
+                          pack_hermitian_superoperator,
+                          unpack_hermitian,)
 
 ### MAIN METHODS ###
 
@@ -33,9 +56,13 @@ def evolve_lindblad_discrete(evolution_time, initial_densities,
                              controls=None,
                              cost_eval_step=1,
                              costs=list(),
+                             density_policy=DensityPolicy.FULL,
                              hamiltonian=None,
+                             integration_policy=IntegrationPolicy.RKDP5,
                              interpolation_policy=InterpolationPolicy.LINEAR,
                              lindblad_data=None,
+                             magnus_policy=MagnusPolicy.M2,
+                             rank_tolerance=1e-10,
                              save_file_path=None,
                              save_intermediate_densities=False):
     """
@@ -51,8 +78,8 @@ def evolve_lindblad_discrete(evolution_time, initial_densities,
         evolution.
     system_eval_count :: int >= 2 - This value determines how many times
         during the evolution the system is evaluated, including the
-        initial value of the system. For lindblad evolution, this value does not
-        determine the time step of integration.
+        initial value of the system. For lindblad evolution with the RKDP5
+        integration policy, this value does not determine the time step of integration.
         This value is used as:
         `system_eval_times` = numpy.linspace(0, `evolution_time`, `system_eval_count`).
 
@@ -66,10 +93,31 @@ def evolve_lindblad_discrete(evolution_time, initial_densities,
     costs :: iterable(qoc.models.cost.Cost) - This list specifies all
         the cost functions that the optimizer should evaluate. This list
         defines the criteria for an "optimal" control set.
+    density_policy :: qoc.models.densitypolicy.DensityPolicy - This value
+        specifies how the densities are represented. If it is HERMITIAN_PACKED,
+        the densities are written to the save file as hilbert_size ** 2 reals,
+        and the MAGNUS and SDIRK2 integration policies propagate the packed densities
+        under a real superoperator, which halves the memory of the propagation.
+        If it is LOW_RANK, the densities are propagated as factors p = v v^dagger
+        of adaptively truncated rank, in O(hilbert_size^2 rank) per step,
+        and the costs are computed from the factors. LOW_RANK requires
+        the EXPONENTIAL_EULER integration policy.
     hamiltonian :: (controls :: ndarray (control_count), time :: float)
                    -> hamiltonian_matrix :: ndarray (hilbert_size x hilbert_size)
         - This function provides the system's hamiltonian given a set
         of control parameters and a time value.
+    integration_policy :: qoc.models.integrationpolicy.IntegrationPolicy
+        - This value specifies how the densities are evolved between system_eval
+        steps. RKDP5 adaptively integrates the lindblad equation. MAGNUS
+        vectorizes the densities and exponentiates the magnus expansion of the
+        lindbladian superoperator once per system_eval step, which is cheaper
+        for small hilbert spaces but has a fixed time step. RK4 and
+        EXPONENTIAL_EULER take one fixed step per system_eval step, so the
+        number of rhs evaluations, and the memory of the autograd tape,
+        is the same for every evolution. SDIRK2 takes one implicit step
+        per system_eval step on the vectorized densities. Its step size is not
+        limited by fast decay rates, so it is suited to stiff, strongly
+        dissipative systems.
     interpolation_policy :: qoc.models.interpolationpolicy.InterpolationPolicy
         - This value specifies how control parameters should be
         interpreted at points where they are not defined.
@@ -77,6 +125,15 @@ def evolve_lindblad_discrete(evolution_time, initial_densities,
                      -> (dissipators :: ndarray (operator_count),
                          operators :: ndarray (operator_count x hilbert_size x hilbert_size))
         - This function encodes the lindblad dissipators and operators for all time.
+        If the dissipators and operators do not depend on time, the tuple
+        (dissipators, operators) may be given instead, and the time-independent
+        terms of the lindbladian will be computed once.
+    magnus_policy :: qoc.models.magnuspolicy.MagnusPolicy - This value
+        specifies what method should be used to perform the magnus expansion
+        of the lindbladian superoperator if `integration_policy` is MAGNUS.
+    rank_tolerance :: float - This value is the weight, relative to the trace,
+        below which the directions of the density factors are dropped if
+        `density_policy` is LOW_RANK.
     save_file_path :: str - This is the full path to the file where
         information about program execution will be stored.
         E.g. "./out/foo.h5"
@@ -93,16 +150,22 @@ def evolve_lindblad_discrete(evolution_time, initial_densities,
         control_eval_count = 0
     
     pstate = EvolveLindbladDiscreteState(control_eval_count,
-                                         cost_eval_step, costs,
+                                         cost_eval_step, costs, density_policy,
                                          evolution_time, hamiltonian,
-                                         initial_densities,
+                                         initial_densities, integration_policy,
                                          interpolation_policy,
-                                         lindblad_data, save_file_path,
+                                         lindblad_data, magnus_policy, rank_tolerance,
+                                         save_file_path,
                                          save_intermediate_densities,
                                          system_eval_count)
     pstate.save_initial(controls)
     result = EvolveLindbladResult()
     _ = _evaluate_lindblad_discrete(controls, pstate, result)
+    # Compute the costs that depend only on the controls.
+    if controls is not None:
+        control_error, _ = evaluate_control_costs(pstate.control_costs, controls,
+                                                  pstate.final_system_eval_step)
+        result.error = result.error + control_error
 
     return result
 
@@ -111,17 +174,23 @@ def grape_lindblad_discrete(control_count, control_eval_count,
                             costs, evolution_time, initial_densities,
                             system_eval_count,
                             complex_controls=False,
+                            control_basis=None,
                             cost_eval_step=1,
+                            density_policy=DensityPolicy.FULL,
                             hamiltonian=None,
                             impose_control_conditions=None,
                             initial_controls=None,
+                            integration_policy=IntegrationPolicy.RKDP5,
                             interpolation_policy=InterpolationPolicy.LINEAR,
                             iteration_count=1000,
                             lindblad_data=None,
                             log_iteration_step=10,
+                            magnus_policy=MagnusPolicy.M2,
                             max_control_norms=None,
                             min_error=0,
                             optimizer=Adam(),
+                            rank_tolerance=1e-10,
+                            resume_from=None,
                             save_file_path=None,
                             save_intermediate_densities=False,
                             save_iteration_step=0,):
@@ -148,7 +217,8 @@ def grape_lindblad_discrete(control_count, control_eval_count,
     system_eval_count :: int >= 2 - This value determines how many times
         during the evolution the system is evaluated, including the
         initial value of the system.
-        For lindblad evolution, this value does not determine the time step of integration.
+        For lindblad evolution with the RKDP5 integration policy,
+        this value does not determine the time step of integration.
         This value is used as:
         `system_eval_times` = numpy.linspace(0, `evolution_time`, `system_eval_count`).
 
@@ -156,9 +226,28 @@ def grape_lindblad_discrete(control_count, control_eval_count,
         are complex-valued. If some controls are real only or imaginary only
         while others are complex, real only and imaginary only controls
         can be simulated by taking the real or imaginary part of a complex control.
+    control_basis :: ndarray (control_eval_count x basis_size) - If this array
+        is specified, the optimizer's parameters are the coefficients
+        (basis_size x control_count) of the controls in this real basis, which are
+        expanded to the controls as `control_basis` @ `coefficients`, see e.g.
+        qoc.standard.get_fourier_basis. The initial controls are projected onto
+        the basis, and the gradients are mapped back through the transpose
+        of the basis. The coefficients are not bounded, but the
+        controls are still rescaled to `max_control_norms`. A band-limited
+        basis bounds the bandwidth of the controls by construction,
+        so a ControlBandwidthMax cost is not needed.
     cost_eval_step :: int >= 1- This value determines how often step-costs are evaluated.
          The units of this value are in system_eval steps. E.g. if this value is 2,
          step-costs will be computed every 2 system_eval steps.
+    density_policy :: qoc.models.densitypolicy.DensityPolicy - This value
+        specifies how the densities are represented. If it is HERMITIAN_PACKED,
+        the densities are written to the save file as hilbert_size ** 2 reals,
+        and the MAGNUS and SDIRK2 integration policies propagate the packed densities
+        under a real superoperator, which halves the memory of the propagation.
+        If it is LOW_RANK, the densities are propagated as factors p = v v^dagger
+        of adaptively truncated rank, in O(hilbert_size^2 rank) per step,
+        and the costs are computed from the factors. LOW_RANK requires
+        the EXPONENTIAL_EULER integration policy.
     hamiltonian :: (controls :: ndarray (control_count), time :: float)
                    -> hamiltonian_matrix :: ndarray (hilbert_size x hilbert_size)
         - This function provides the system's hamiltonian given a set
@@ -172,6 +261,18 @@ def grape_lindblad_discrete(control_count, control_eval_count,
         control_eval step. These values will be used to determine the `controls`
         argument passed to the `hamiltonian` function at each time step for
         the first iteration of optimization.
+    integration_policy :: qoc.models.integrationpolicy.IntegrationPolicy
+        - This value specifies how the densities are evolved between system_eval
+        steps. RKDP5 adaptively integrates the lindblad equation. MAGNUS
+        vectorizes the densities and exponentiates the magnus expansion of the
+        lindbladian superoperator once per system_eval step, which is cheaper
+        for small hilbert spaces but has a fixed time step. RK4 and
+        EXPONENTIAL_EULER take one fixed step per system_eval step, so the
+        number of rhs evaluations, and the memory of the autograd tape,
+        is the same for every evolution. SDIRK2 takes one implicit step
+        per system_eval step on the vectorized densities. Its step size is not
+        limited by fast decay rates, so it is suited to stiff, strongly
+        dissipative systems.
     interpolation_policy :: qoc.models.interpolationpolicy.InterpolationPolicy
         - This value specifies how control parameters should be
         interpreted at points where they are not defined.
@@ -182,6 +283,12 @@ def grape_lindblad_discrete(control_count, control_eval_count,
                      -> (dissipators :: ndarray (operator_count),
                          operators :: ndarray (operator_count x hilbert_size x hilbert_size))
         - This function encodes the lindblad dissipators and operators for all time.
+        If the dissipators and operators do not depend on time, the tuple
+        (dissipators, operators) may be given instead, and the time-independent
+        terms of the lindbladian will be computed once.
+    magnus_policy :: qoc.models.magnuspolicy.MagnusPolicy - This value
+        specifies what method should be used to perform the magnus expansion
+        of the lindbladian superoperator if `integration_policy` is MAGNUS.
     log_iteration_step :: int - This value determines how often qoc logs
         progress to stdout. This value is specified in units of system steps,
         of which there are `control_step_count` * `system_step_multiplier`.
@@ -197,6 +304,18 @@ def grape_lindblad_discrete(control_count, control_eval_count,
     optimizer :: class instance - This optimizer object defines the
         gradient-based procedure for minimizing the total contribution
         of all cost functions with respect to the control parameters.
+        If the optimizer's `hessian_vector_products` field is True, it is also
+        given the products of the hessian of the total cost with vectors.
+    rank_tolerance :: float - This value is the weight, relative to the trace,
+        below which the directions of the density factors are dropped if
+        `density_policy` is LOW_RANK.
+    resume_from :: str - This is the full path to the save file of an
+        interrupted optimization run to resume from its last checkpoint.
+        Checkpoints are saved every `save_iteration_step` iterations.
+        The optimizer's internal state and numpy's global random state
+        are restored, so an optimizer that exposes its state continues
+        exactly as if the run had not been interrupted.
+        This value may be `save_file_path`, in which case the save file is continued.
     save_file_path :: str - This is the full path to the file where
         information about program execution will be stored.
         E.g. "./out/foo.h5"
@@ -221,20 +340,29 @@ def grape_lindblad_discrete(control_count, control_eval_count,
                                                               max_control_norms,)
     # Construct the program state.
     pstate = GrapeLindbladDiscreteState(complex_controls,
-                                        control_count,
+                                        control_basis, control_count,
                                         control_eval_count, cost_eval_step, costs,
-                                        evolution_time, hamiltonian,
+                                        density_policy, evolution_time, hamiltonian,
                                         impose_control_conditions,
                                         initial_controls,
-                                        initial_densities,
+                                        initial_densities, integration_policy,
                                         interpolation_policy, iteration_count,
                                         lindblad_data,
-                                        log_iteration_step, max_control_norms,
-                                        min_error, optimizer,
+                                        log_iteration_step, magnus_policy,
+                                        max_control_norms,
+                                        min_error, optimizer, rank_tolerance,
                                         save_file_path, save_intermediate_densities,
                                         save_iteration_step,
                                         system_eval_count,)
-    pstate.log_and_save_initial()
+    # Load the checkpoint to resume from.
+    if resume_from is None:
+        checkpoint = None
+        resume = False
+    else:
+        checkpoint = load_checkpoint(resume_from)
+        resume = (save_file_path is not None
+                  and os.path.abspath(resume_from) == os.path.abspath(save_file_path))
+    pstate.log_and_save_initial(resume=resume)
 
     # Autograd does not allow multiple return values from
     # a differentiable function.
@@ -244,14 +372,53 @@ def grape_lindblad_discrete(control_count, control_eval_count,
     # is to use a reporter object.
     reporter = Dummy()
     reporter.iteration = 0
+    reporter.last_controls = None
+    reporter.last_error = None
+    reporter.hessian_controls = None
+    reporter.hessian_vjp = None
     result = GrapeLindbladResult()
     
     # Convert the controls from cost function format to optimizer format.
-    initial_controls = strip_controls(pstate.complex_controls, pstate.initial_controls)
+    if pstate.control_basis is None:
+        initial_controls = strip_controls(pstate.complex_controls, pstate.initial_controls)
+        # Translate the maximum control norms into bounds on the optimizer's parameters.
+        bounds = get_control_bounds(pstate.complex_controls, pstate.controls_shape,
+                                    pstate.max_control_norms)
+    else:
+        # The optimizer's parameters are the coefficients of the controls in the basis,
+        # which are not bounded. The expanded controls are rescaled to their maximum norm.
+        initial_coefficients = project_controls(pstate.control_basis, pstate.initial_controls)
+        initial_controls = strip_controls(pstate.complex_controls, initial_coefficients)
+        bounds = None
+    
+    iteration_count = pstate.iteration_count
+    # Optional keywords are only passed to the optimizers that declare them,
+    # so that optimizers which only implement
+    # run(function, iteration_count, initial_params, jacobian, args) are supported.
+    # The controls are clipped to their maximum norms whether or not
+    # the optimizer is given the bounds.
+    optimizer_kwargs = dict()
+    if bounds is not None and getattr(pstate.optimizer, "box_bounds", False):
+        optimizer_kwargs["bounds"] = bounds
+    # Optimizers that consume hessian-vector products are also given them.
+    if getattr(pstate.optimizer, "hessian_vector_products", False):
+        optimizer_kwargs["hessian_vector_product"] = _eldh_wrap
+    # Continue the optimization from the checkpoint.
+    if checkpoint is not None:
+        reporter.iteration = checkpoint.iteration
+        for name, value in checkpoint.result.items():
+            setattr(result, name, value)
+        initial_controls = checkpoint.controls
+        iteration_count = iteration_count - checkpoint.iteration
+        np.random.set_state(checkpoint.rng_state)
+        if hasattr(pstate.optimizer, "set_state"):
+            optimizer_kwargs["initial_state"] = checkpoint.optimizer_state
+    #ENDIF
     
     # Run the optimization.
-    pstate.optimizer.run(_eld_wrap, pstate.iteration_count, initial_controls,
-                         _eldj_wrap, args=(pstate, reporter, result))
+    pstate.optimizer.run(_eld_wrap, iteration_count, initial_controls,
+                         _eldj_wrap, args=(pstate, reporter, result),
+                         **optimizer_kwargs)
 
     return result
 
@@ -272,18 +439,30 @@ def _eld_wrap(controls, pstate, reporter, result):
     Returns:
     error
     """
-    # Convert the controls from optimizer format to cost function format.
-    controls = slap_controls(pstate.complex_controls, controls,
-                             pstate.controls_shape)
-    # Rescale the controls to their maximum norm.
-    clip_control_norms(controls,
-                       pstate.max_control_norms)
-    # Impose user boundary conditions.
-    if pstate.impose_control_conditions:
-        controls = pstate.impose_control_conditions(controls)
+    # The jacobian wrapper computes the error too, so reuse it if the optimizer
+    # has already evaluated the jacobian at these controls.
+    if (reporter.last_controls is not None
+        and np.array_equal(controls, reporter.last_controls)):
+        error = reporter.last_error
+    else:
+        # Convert the controls from optimizer format to cost function format.
+        controls = slap_controls(pstate.complex_controls, controls,
+                                 pstate.controls_shape,
+                                 pstate.control_basis)
+        # Rescale the controls to their maximum norm.
+        clip_control_norms(controls,
+                           pstate.max_control_norms)
+        # Impose user boundary conditions.
+        if pstate.impose_control_conditions:
+            controls = pstate.impose_control_conditions(controls)
 
-    # Evaluate the cost function.
-    error =  _evaluate_lindblad_discrete(controls, pstate, reporter)
+        # Evaluate the cost function.
+        error = _evaluate_lindblad_discrete(controls, pstate, reporter)
+        # The costs that depend only on the controls are evaluated outside of the evolution.
+        control_error, _ = evaluate_control_costs(pstate.control_costs, controls,
+                                                  pstate.final_system_eval_step)
+        error = error + control_error
+    #ENDIF
 
     # Determine if optimization should terminate.
     if error <= pstate.min_error:
@@ -308,9 +487,14 @@ def _eldj_wrap(controls, pstate, reporter, result):
     Returns:
     grads
     """
+    # Key the error cache on the controls in optimizer format.
+    optimizer_controls = np.copy(controls)
+    # Save a checkpoint to resume the optimization from this iteration.
+    pstate.save_checkpoint(optimizer_controls, reporter.iteration, result)
     # Convert the controls from optimizer format to cost function format.
     controls = slap_controls(pstate.complex_controls, controls,
-                             pstate.controls_shape)
+                             pstate.controls_shape,
+                             pstate.control_basis)
     # Rescale the controls to thier maximum norm.
     clip_control_norms(controls, pstate.max_control_norms)
     # Impose user boundary conditions.
@@ -320,6 +504,13 @@ def _eldj_wrap(controls, pstate, reporter, result):
     # Evaluate the jacobian.
     error, grads = (ans_jacobian(_evaluate_lindblad_discrete, 0)
                     (controls, pstate, reporter))
+    # The costs that depend only on the controls are differentiated outside of the evolution.
+    control_error, control_grads = evaluate_control_costs(pstate.control_costs, controls,
+                                                          pstate.final_system_eval_step)
+    error = error + control_error
+    grads = grads + control_grads
+    reporter.last_controls = optimizer_controls
+    reporter.last_error = error
     # Autograd defines the derivative of a function of complex inputs as
     # df_dz = du_dx - i * du_dy for z = x + iy, f(z) = u(x, y) + iv(x, y).
     # For optimization, we care about df_dz = du_dx + i * du_dy.
@@ -332,17 +523,27 @@ def _eldj_wrap(controls, pstate, reporter, result):
 
     # Update best configuration.
     if error < result.best_error:
-        result.best_controls = controls
+        # The controls may share memory with an optimizer
+        # that updates its params in place.
+        result.best_controls = np.copy(controls)
         result.best_error = error
         result.best_final_densities = final_densities
         result.best_iteration = reporter.iteration
     
     # Save and log optimization progress.
-    pstate.log_and_save(controls, error, final_densities,
+    if pstate.density_policy == DensityPolicy.HERMITIAN_PACKED:
+        save_final_densities = pack_hermitian(final_densities)
+    else:
+        save_final_densities = final_densities
+    pstate.log_and_save(controls, error, save_final_densities,
                         grads, reporter.iteration,)
     reporter.iteration += 1
 
     # Convert the gradients from cost function to optimizer format.
+    # The gradients with respect to the coefficients are those with respect to
+    # the controls mapped through the transpose of the basis.
+    if pstate.control_basis is not None:
+        grads = np.matmul(np.transpose(pstate.control_basis), grads)
     grads = strip_controls(pstate.complex_controls, grads)
 
     # Determine if optimization should terminate.
@@ -354,6 +555,63 @@ def _eldj_wrap(controls, pstate, reporter, result):
     return grads, terminate
 
 
+def _eldh_wrap(controls, vector, pstate, reporter, result):
+    """
+    Do intermediary work between the optimizer feeding controls
+    and a vector to the hessian-vector product of _evaluate_lindblad_discrete.
+    The second derivatives are taken by differentiating the backward pass
+    of the evolution. The controls are rescaled to their maximum norm
+    as they are in `_eld_wrap` and `_eldj_wrap`, so the hessian is that of
+    the function that the optimizer minimizes.
+
+    Args:
+    controls
+    vector
+    pstate
+    reporter
+    result
+
+    Returns:
+    hessian_vector_product
+    """
+    # The evolutions performed for the hessian-vector product are not
+    # optimization iterations, so they should not be saved.
+    hessian_reporter = Dummy()
+    hessian_reporter.iteration = pstate.final_iteration + 1
+    
+    def evaluate(controls_):
+        # Convert the controls from optimizer format to cost function format.
+        controls_ = slap_controls(pstate.complex_controls, controls_,
+                                  pstate.controls_shape,
+                                  pstate.control_basis)
+        # Rescale the controls to their maximum norm.
+        controls_ = rescale_control_norms(controls_, pstate.max_control_norms)
+        # Impose user boundary conditions.
+        if pstate.impose_control_conditions is not None:
+            controls_ = pstate.impose_control_conditions(controls_)
+        
+        # Evaluate the cost function.
+        error = _evaluate_lindblad_discrete(controls_, pstate, hessian_reporter)
+        for cost in pstate.control_costs:
+            error = error + cost.cost(controls_, None, pstate.final_system_eval_step)
+        #ENDFOR
+        
+        return error
+    #ENDDEF
+
+    # The gradient is taped once for each set of controls. Because the hessian
+    # is symmetric, the hessian-vector product for each vector is a backward pass
+    # over that tape. Differentiating with respect to the controls in optimizer format
+    # yields the hessian in optimizer format.
+    if (reporter.hessian_controls is None
+        or not np.array_equal(controls, reporter.hessian_controls)):
+        reporter.hessian_controls = np.copy(controls)
+        reporter.hessian_vjp, _ = make_vjp(grad(evaluate))(controls)
+    hessian_vector_product = reporter.hessian_vjp(vector)
+
+    return hessian_vector_product
+
+
 def _evaluate_lindblad_discrete(controls, pstate, reporter):
     """
     Evolve a set of density matrices under the lindblad equation
@@ -374,38 +632,124 @@ def _evaluate_lindblad_discrete(controls, pstate, reporter):
     cost_eval_step = pstate.cost_eval_step
     costs = pstate.costs
     densities = pstate.initial_densities
+    density_policy = pstate.density_policy
     dt = pstate.dt
     evolution_time = pstate.evolution_time
     final_system_eval_step = pstate.final_system_eval_step
     hamiltonian = pstate.hamiltonian
+    integration_policy = pstate.integration_policy
     interpolation_policy = pstate.interpolation_policy
     lindblad_data = pstate.lindblad_data
+    magnus_policy = pstate.magnus_policy
     program_type = pstate.program_type
     if program_type == ProgramType.GRAPE:
         iteration = reporter.iteration
     else:
         iteration = 0
+    rank_tolerance = pstate.rank_tolerance
     save_intermediate_densities = pstate.save_intermediate_densities_
     step_costs = pstate.step_costs
     system_eval_count = pstate.system_eval_count
     error = 0
-    rhs_lindbladian = _get_rhs_lindbladian(control_eval_times,
-                                           controls,
-                                           evolution_time,
-                                           hamiltonian,
-                                           interpolation_policy,
-                                           lindblad_data,)
+    is_low_rank = density_policy == DensityPolicy.LOW_RANK
+    if is_low_rank and integration_policy != IntegrationPolicy.EXPONENTIAL_EULER:
+        raise ValueError("The low rank density policy requires the exponential euler "
+                         "integration policy, but the integration policy {} was specified."
+                         "".format(integration_policy))
+    if integration_policy in (IntegrationPolicy.RKDP5, IntegrationPolicy.RK4):
+        rhs_lindbladian = _get_rhs_lindbladian(control_eval_times,
+                                               controls,
+                                               evolution_time,
+                                               hamiltonian,
+                                               interpolation_policy,
+                                               lindblad_data,)
+        evolve_step = lambda densities_, time: _evolve_step_lindblad_rk4(densities_, dt,
+                                                                        rhs_lindbladian,
+                                                                        time)
+    elif integration_policy in (IntegrationPolicy.MAGNUS, IntegrationPolicy.SDIRK2):
+        superoperator_lindbladian = _get_superoperator_lindbladian(densities.shape[-1],
+                                                                   control_eval_times,
+                                                                   controls,
+                                                                   hamiltonian,
+                                                                   interpolation_policy,
+                                                                   lindblad_data,
+                                                                   density_policy,)
+        if integration_policy == IntegrationPolicy.MAGNUS:
+            evolve_step = lambda densities_, time: _evolve_step_lindblad_magnus(densities_, dt,
+                                                                               magnus_policy,
+                                                                               superoperator_lindbladian,
+                                                                               time)
+        else:
+            evolve_step = lambda densities_, time: _evolve_step_lindblad_sdirk2(densities_, dt,
+                                                                               superoperator_lindbladian,
+                                                                               time)
+    elif integration_policy == IntegrationPolicy.EXPONENTIAL_EULER:
+        effective_lindblad_data = _get_effective_lindblad_data(densities.shape[-1],
+                                                               control_eval_times,
+                                                               controls,
+                                                               hamiltonian,
+                                                               interpolation_policy,
+                                                               lindblad_data,)
+        if is_low_rank:
+            evolve_step = (lambda densities_, time:
+                           _evolve_step_lindblad_low_rank(densities_, dt,
+                                                          effective_lindblad_data,
+                                                          rank_tolerance, time))
+        else:
+            evolve_step = (lambda densities_, time:
+                           _evolve_step_lindblad_exponential_euler(densities_, dt,
+                                                                   effective_lindblad_data,
+                                                                   time))
+    else:
+        raise ValueError("Unrecognized integration policy {}."
+                         "".format(integration_policy))
+    #ENDIF
 
-    # Evolve the densities to `evolution_time`.
-    # Compute step-costs along the way.
-    for system_eval_step in range(system_eval_count):
+    # The MAGNUS and SDIRK2 policies propagate the vectorized densities,
+    # and the LOW_RANK policy propagates the density factors.
+    # Construct the maps from the propagated densities to the full densities
+    # and to the densities that are saved.
+    densities_shape = densities.shape
+    is_packed = density_policy == DensityPolicy.HERMITIAN_PACKED
+    if integration_policy in (IntegrationPolicy.MAGNUS, IntegrationPolicy.SDIRK2):
+        if is_packed:
+            densities = pack_hermitian(densities)
+            get_densities = unpack_hermitian
+            get_save_densities = lambda densities_: densities_
+        else:
+            densities = anp.reshape(densities, (densities_shape[0], -1))
+            get_densities = lambda densities_: anp.reshape(densities_, densities_shape)
+            get_save_densities = get_densities
+    elif is_low_rank:
+        densities = pstate.initial_density_factors
+        get_densities = lambda densities_: matmuls(densities_, conjugate_transpose(densities_))
+        get_save_densities = get_densities
+    else:
+        get_densities = lambda densities_: densities_
+        get_save_densities = pack_hermitian if is_packed else get_densities
+    #ENDIF
+
+    # The costs see the full densities, or the density factors if the
+    # densities are low rank.
+    if is_low_rank:
+        get_cost_densities = lambda densities_: densities_
+        evaluate_cost_ = (lambda cost, densities_, system_eval_step:
+                          cost.cost_low_rank(controls, densities_, system_eval_step))
+    else:
+        get_cost_densities = get_densities
+        evaluate_cost_ = (lambda cost, densities_, system_eval_step:
+                          evaluate_cost(cost, controls, densities_, system_eval_step))
+
+    # Save the densities and compute the step-costs at each system_eval step.
+    def eval_system_step(system_eval_step, densities_):
+        nonlocal error
         # Save the current densities.
         if save_intermediate_densities:
-            if isinstance(densities, Box):
-                intermediate_densities = densities._value
+            if isinstance(densities_, Box):
+                intermediate_densities = densities_._value
             else:
-                intermediate_densities = densities
-            pstate.save_intermediate_densities(intermediate_densities,
+                intermediate_densities = densities_
+            pstate.save_intermediate_densities(get_save_densities(intermediate_densities),
                                                iteration,
                                                system_eval_step)
 
@@ -413,34 +757,268 @@ def _evaluate_lindblad_discrete(controls, pstate, reporter):
         cost_step, cost_step_remainder = divmod(system_eval_step, cost_eval_step)
         is_cost_step = cost_step_remainder == 0
         is_first_system_eval_step = system_eval_step == 0
-        is_final_system_eval_step = system_eval_step == final_system_eval_step
-        time = system_eval_step * dt
 
         # Compute step costs every `cost_step`.
-        if is_cost_step and not is_first_system_eval_step:
+        if is_cost_step and not is_first_system_eval_step and len(step_costs) != 0:
+            densities_ = get_cost_densities(densities_)
             for i, step_cost in enumerate(step_costs):
-                cost_error = step_cost.cost(controls, densities, system_eval_step)
+                cost_error = evaluate_cost_(step_cost, densities_, system_eval_step)
                 error = error + cost_error
-        
-        # Evolve the densities to the next time step.
-        if not is_final_system_eval_step:
-            densities = integrate_rkdp5(rhs_lindbladian, np.array([time + dt]),
-                                        time, densities)
-    #ENDFOR
+    #ENDDEF
+
+    # Evolve the densities to `evolution_time`.
+    # Compute step-costs along the way.
+    if integration_policy == IntegrationPolicy.RKDP5:
+        # Integrate over the whole evolution at once so that the tuned step size
+        # and the FSAL stage carry across system_eval steps. The densities
+        # at each system_eval time are obtained from the dense output.
+        eval_system_step(0, densities)
+        system_eval_times = np.arange(1, system_eval_count) * dt
+        eval_callback = lambda index, densities_: eval_system_step(index + 1, densities_)
+        densities = integrate_rkdp5(rhs_lindbladian, system_eval_times, 0, densities,
+                                    eval_callback=eval_callback)[-1]
+    else:
+        # The remaining policies take one fixed step per system_eval step.
+        for system_eval_step in range(system_eval_count):
+            eval_system_step(system_eval_step, densities)
+            # Evolve the densities to the next time step.
+            if system_eval_step != final_system_eval_step:
+                time = system_eval_step * dt
+                densities = evolve_step(densities, time)
+        #ENDFOR
+    #ENDIF
 
     # Compute non-step-costs.
+    cost_densities = get_cost_densities(densities)
     for i, cost in enumerate(costs):
-        if not cost.requires_step_evaluation:
-            cost_error = cost.cost(controls, densities, system_eval_step)
+        if cost.requires_states and not cost.requires_step_evaluation:
+            cost_error = evaluate_cost_(cost, cost_densities, final_system_eval_step)
             error = error + cost_error
     
     # Report results.
     reporter.error = error  
-    reporter.final_densities = densities
+    reporter.final_densities = get_densities(densities)
 
     return error
 
 
+def _evolve_step_lindblad_exponential_euler(densities, dt, effective_lindblad_data, time):
+    """
+    Use the exponential (Lawson) Euler method to evolve the density matrices
+    to the next time step under the lindblad equation. The effective hamiltonian
+    H_eff = H - (i / 2) sum_k g_k L_k^dagger L_k is propagated exactly by
+    U = e^(-i dt H_eff) and the jump terms are taken to first order:
+    p(t + dt) = U (p + dt sum_k g_k L_k p L_k^dagger) U^dagger.
+    The step is in Kraus form, so it preserves the positivity of the densities.
+    The data is evaluated at the midpoint of the step.
+
+    Arguments:
+    densities
+    dt
+    effective_lindblad_data :: (time :: float)
+        -> (effective_hamiltonian, dissipators, operators, operators_dagger)
+    time
+
+    Returns:
+    densities
+    """
+    (effective_hamiltonian, dissipators,
+     operators, operators_dagger) = effective_lindblad_data(time + 0.5 * dt)
+    if operators is not None:
+        densities = densities + dt * get_lindblad_jumps(densities, dissipators,
+                                                         operators, operators_dagger)
+    step_propagator = expm(-1j * dt * effective_hamiltonian)
+    densities = matmuls(step_propagator, densities, conjugate_transpose(step_propagator))
+
+    return densities
+
+
+def _evolve_step_lindblad_low_rank(density_factors, dt, effective_lindblad_data,
+                                   rank_tolerance, time):
+    """
+    Use the exponential (Lawson) Euler method to evolve the factors v of the
+    density matrices p = v v^dagger to the next time step under the lindblad equation.
+    The jump terms of the step are in Kraus form,
+    p + dt sum_k g_k L_k p L_k^dagger = w w^dagger for w = [v, sqrt(dt g_1) L_1 v, ...],
+    so the rank of the factors grows and is then truncated. The step propagator
+    U = e^(-i dt H_eff) is applied to the factors without being formed, so the step
+    costs O(hilbert_size^2 rank) rather than O(hilbert_size^3).
+
+    Arguments:
+    density_factors :: ndarray (density_count x hilbert_size x rank)
+    dt
+    effective_lindblad_data :: (time :: float)
+        -> (effective_hamiltonian, dissipators, operators, operators_dagger)
+    rank_tolerance
+    time
+
+    Returns:
+    density_factors
+    """
+    (effective_hamiltonian, dissipators,
+     operators, _) = effective_lindblad_data(time + 0.5 * dt)
+    if operators is not None:
+        density_count, hilbert_size, _ = density_factors.shape
+        jump_factors = (anp.sqrt(dt * dissipators)[:, None, None, None]
+                        * anp.matmul(operators[:, None, :, :], density_factors))
+        density_factors = anp.concatenate((density_factors[None], jump_factors), axis=0)
+        density_factors = anp.reshape(anp.transpose(density_factors, (1, 2, 0, 3)),
+                                      (density_count, hilbert_size, -1))
+        density_factors = _truncate_density_factors(density_factors, rank_tolerance)
+    density_factors = expm_multiply(-1j * dt * effective_hamiltonian, density_factors)
+
+    return density_factors
+
+
+def _evolve_step_lindblad_rk4(densities, dt, rhs_lindbladian, time):
+    """
+    Use the classical fourth order Runge-Kutta method to evolve the density matrices
+    to the next time step under the lindblad equation.
+
+    Arguments:
+    densities
+    dt
+    rhs_lindbladian
+    time
+
+    Returns:
+    densities
+    """
+    k1 = rhs_lindbladian(time, densities)
+    k2 = rhs_lindbladian(time + 0.5 * dt, densities + 0.5 * dt * k1)
+    k3 = rhs_lindbladian(time + 0.5 * dt, densities + 0.5 * dt * k2)
+    k4 = rhs_lindbladian(time + dt, densities + dt * k3)
+    densities = densities + (dt / 6) * (k1 + 2 * k2 + 2 * k3 + k4)
+
+    return densities
+
+
+def _evolve_step_lindblad_sdirk2(densities, dt, superoperator_lindbladian, time):
+    """
+    Use the L-stable SDIRK2 method to evolve the vectorized density matrices
+    to the next time step under the lindblad equation. The step size is not
+    limited by fast decay rates, which makes this method suitable for
+    strongly dissipative systems.
+
+    Arguments:
+    densities :: ndarray (density_count x hilbert_size ** 2) - the vectorized
+        (or packed) densities
+    dt
+    superoperator_lindbladian :: (time :: float)
+        -> superoperator :: ndarray (hilbert_size ** 2 x hilbert_size ** 2)
+    time
+
+    Returns:
+    densities
+    """
+    # Stack the vectorized densities as columns so that each implicit stage
+    # is a single linear solve.
+    densities = anp.transpose(integrate_sdirk2_step(superoperator_lindbladian, dt, time,
+                                                    anp.transpose(densities)))
+
+    return densities
+
+
+def _truncate_density_factors(density_factors, rank_tolerance):
+    """
+    Rotate the factors v of the density matrices onto the eigenvectors of
+    their gram matrices v^dagger v, which are only rank x rank, and drop the
+    directions whose weights, relative to the trace, are below `rank_tolerance`.
+    All of the factors share the largest remaining rank.
+    The rotation is not differentiated. The dropped directions carry
+    (almost) no weight, so the gradients of v v^dagger are unchanged.
+
+    Arguments:
+    density_factors :: ndarray (density_count x hilbert_size x rank)
+    rank_tolerance :: float
+
+    Returns:
+    density_factors :: ndarray (density_count x hilbert_size x truncated_rank)
+    """
+    density_factors_ = getval(density_factors)
+    gram = np.matmul(conjugate_transpose(density_factors_), density_factors_)
+    eigenvalues, eigenvectors = np.linalg.eigh(gram)
+    eigenvalues = np.maximum(eigenvalues, 0)
+    weights = eigenvalues / np.sum(eigenvalues, axis=-1, keepdims=True)
+    rank = max(1, np.max(np.sum(weights > rank_tolerance, axis=-1)))
+    density_factors = anp.matmul(density_factors, eigenvectors[..., -rank:])
+
+    return density_factors
+
+
+def _get_effective_lindblad_data(hilbert_size,
+                                 control_eval_times=None,
+                                 controls=None,
+                                 hamiltonian=None,
+                                 interpolation_policy=InterpolationPolicy.LINEAR,
+                                 lindblad_data=None,):
+    """
+    Produce a function that returns the effective hamiltonian
+    H_eff = H - (i / 2) sum_k g_k L_k^dagger L_k and the lindblad data
+    at any point in time.
+
+    Arguments:
+    hilbert_size
+    control_eval_times
+    controls
+    hamiltonian
+    interpolation_policy
+    lindblad_data
+
+    Returns:
+    effective_lindblad_data :: (time :: float)
+        -> (effective_hamiltonian :: ndarray (hilbert_size x hilbert_size),
+            dissipators :: ndarray (operator_count),
+            operators :: ndarray (operator_count x hilbert_size x hilbert_size),
+            operators_dagger :: ndarray (operator_count x hilbert_size x hilbert_size))
+    """
+    # Construct an interpolator for the controls if controls were specified.
+    # Otherwise, construct a dummy function.
+    if controls is not None and control_eval_times is not None:
+        if interpolation_policy == InterpolationPolicy.LINEAR:
+            interpolate = interpolate_linear_set
+        else:
+            raise NotImplementedError("This operation does not yet support the interpolation "
+                                      "policy {}."
+                                      "".format(interpolation_policy))
+    else:
+        interpolate = lambda x, xs, ys: None
+
+    # Construct dummy functions if the hamiltonian or lindblad functions were not specified.
+    if hamiltonian is None:
+        hamiltonian = lambda controls, time: 0
+
+    # Precompute the dissipator terms if they do not depend on time.
+    if lindblad_data is None:
+        get_lindblad_data = lambda time: (None, None, None, 0)
+    elif callable(lindblad_data):
+        def get_lindblad_data(time):
+            dissipators, operators = lindblad_data(time)
+            operators_dagger, operators_product_sum = get_lindblad_operator_cache(dissipators,
+                                                                                  operators)
+            return dissipators, operators, operators_dagger, operators_product_sum
+        #ENDDEF
+    else:
+        dissipators, operators = lindblad_data
+        operators_dagger, operators_product_sum = get_lindblad_operator_cache(dissipators,
+                                                                              operators)
+        lindblad_data_ = (dissipators, operators, operators_dagger, operators_product_sum)
+        get_lindblad_data = lambda time: lindblad_data_
+
+    zero_hamiltonian = np.zeros((hilbert_size, hilbert_size))
+    def effective_lindblad_data(time):
+        controls_ = interpolate(time, control_eval_times, controls)
+        (dissipators, operators,
+         operators_dagger, operators_product_sum) = get_lindblad_data(time)
+        effective_hamiltonian = (zero_hamiltonian + hamiltonian(controls_, time)
+                                 - 0.5j * operators_product_sum)
+
+        return effective_hamiltonian, dissipators, operators, operators_dagger
+    #ENDDEF
+
+    return effective_lindblad_data
+
+
 def _get_rhs_lindbladian(control_eval_times=None,
                          controls=None,
                          evolution_time=None,
@@ -482,14 +1060,144 @@ def _get_rhs_lindbladian(control_eval_times=None,
         
     if lindblad_data is None:
         lindblad_data = lambda time: (None, None)
+
+    # Precompute the dissipator terms if they do not depend on time.
+    if callable(lindblad_data):
+        get_lindblad_data = lambda time: tuple(lindblad_data(time)) + (None, None)
+    else:
+        dissipators, operators = lindblad_data
+        operators_dagger, operators_product_sum = get_lindblad_operator_cache(dissipators,
+                                                                              operators)
+        lindblad_data_ = (dissipators, operators, operators_dagger, operators_product_sum)
+        get_lindblad_data = lambda time: lindblad_data_
         
     def rhs(time, densities):
         controls_ = interpolate(time, control_eval_times, controls)
         hamiltonian_ = hamiltonian(controls_, time)
-        dissipators, operators = lindblad_data(time)
-        lindbladian = get_lindbladian(densities, dissipators, hamiltonian_, operators)
+        (dissipators, operators,
+         operators_dagger, operators_product_sum) = get_lindblad_data(time)
+        lindbladian = get_lindbladian(densities, dissipators, hamiltonian_, operators,
+                                      operators_dagger, operators_product_sum)
 
         return lindbladian
     #ENDDEF
 
     return rhs
+
+
+def _evolve_step_lindblad_magnus(densities, dt, magnus_policy,
+                                 superoperator_lindbladian, time):
+    """
+    Use the exponential series method via magnus expansion to evolve the
+    vectorized density matrices to the next time step under the lindblad equation.
+    Magnus expansions are implemented using the methods described in
+    https://arxiv.org/abs/1709.06483.
+
+    Arguments:
+    densities :: ndarray (density_count x hilbert_size ** 2) - the vectorized
+        (or packed) densities
+    dt
+    magnus_policy
+    superoperator_lindbladian :: (time :: float)
+        -> superoperator :: ndarray (hilbert_size ** 2 x hilbert_size ** 2)
+    time
+
+    Returns:
+    densities
+    """
+    if magnus_policy == MagnusPolicy.M2:
+        magnus = magnus_m2(superoperator_lindbladian, dt, time)
+    elif magnus_policy == MagnusPolicy.M4:
+        magnus = magnus_m4(superoperator_lindbladian, dt, time)
+    elif magnus_policy == MagnusPolicy.M6:
+        magnus = magnus_m6(superoperator_lindbladian, dt, time)
+    else:
+        raise ValueError("Unrecognized magnus policy {}."
+                         "".format(magnus_policy))
+    #ENDIF
+
+    step_propagator = expm(magnus)
+    densities = anp.matmul(densities, anp.transpose(step_propagator))
+
+    return densities
+
+
+def _get_superoperator_lindbladian(hilbert_size,
+                                   control_eval_times=None,
+                                   controls=None,
+                                   hamiltonian=None,
+                                   interpolation_policy=InterpolationPolicy.LINEAR,
+                                   lindblad_data=None,
+                                   density_policy=DensityPolicy.FULL,):
+    """
+    Produce a function that returns the lindbladian superoperator,
+    which acts on row-major vectorized density matrices, at any point in time.
+    If `density_policy` is HERMITIAN_PACKED, the superoperator acts on
+    packed density matrices instead and is real.
+
+    Arguments:
+    hilbert_size
+    control_eval_times
+    controls
+    hamiltonian
+    interpolation_policy
+    lindblad_data
+    density_policy
+
+    Returns:
+    superoperator_lindbladian :: (time :: float)
+        -> superoperator :: ndarray (hilbert_size ** 2 x hilbert_size ** 2)
+        - A function that returns the generator of the vectorized lindblad master equation
+        dvec(p)_dt = superoperator(t) vec(p)
+    """
+    # Construct an interpolator for the controls if controls were specified.
+    # Otherwise, construct a dummy function.
+    if controls is not None and control_eval_times is not None:
+        if interpolation_policy == InterpolationPolicy.LINEAR:
+            interpolate = interpolate_linear_set
+        else:
+            raise NotImplementedError("This operation does not yet support the interpolation "
+                                      "policy {}."
+                                      "".format(interpolation_policy))
+    else:
+        interpolate = lambda x, xs, ys: None
+
+    # Construct dummy functions if the hamiltonian or lindblad functions were not specified.
+    if hamiltonian is None:
+        hamiltonian = lambda controls, time: None
+        
+    if lindblad_data is None:
+        lindblad_data = lambda time: (None, None)
+
+    if density_policy == DensityPolicy.HERMITIAN_PACKED:
+        pack = pack_hermitian_superoperator
+    else:
+        pack = lambda superoperator: superoperator
+
+    # Precompute the dissipator superoperator if it does not depend on time.
+    if callable(lindblad_data):
+        def superoperator_lindbladian(time):
+            controls_ = interpolate(time, control_eval_times, controls)
+            hamiltonian_ = hamiltonian(controls_, time)
+            dissipators, operators = lindblad_data(time)
+            superoperator = pack(get_lindbladian_superoperator(hilbert_size, dissipators,
+                                                               hamiltonian_, operators))
+
+            return superoperator
+        #ENDDEF
+    else:
+        dissipators, operators = lindblad_data
+        dissipator_superoperator = pack(get_lindbladian_superoperator(hilbert_size, dissipators,
+                                                                      None, operators))
+        def superoperator_lindbladian(time):
+            controls_ = interpolate(time, control_eval_times, controls)
+            hamiltonian_ = hamiltonian(controls_, time)
+            superoperator = (dissipator_superoperator
+                             + pack(get_lindbladian_superoperator(hilbert_size,
+                                                                  hamiltonian=hamiltonian_)))
+
+            return superoperator
+        #ENDDEF
+    #ENDIF
+
+    return superoperator_lindbladian
@@ -0,0 +1,342 @@
+"""
+lindbladtrajectories.py - This module defines methods to
+evolve a set of states under the lindblad master equation
+by averaging stochastic quantum trajectories, i.e. the
+monte carlo wave function method, using time-discrete
+control parameters.
+"""
+
+import numpy as np
+
+from qoc.core.common import evaluate_control_costs
+from qoc.core.mathmethods import get_lindblad_operator_cache
+from qoc.core.schroedingerdiscrete import _evolve_step_schroedinger_discrete
+from qoc.models import (EvolveLindbladResult,
+                        EvolveLindbladTrajectoriesState,
+                        InterpolationPolicy,
+                        MagnusPolicy,)
+from qoc.standard import matmuls
+
+### MAIN METHODS ###
+
+def evolve_lindblad_trajectories(evolution_time, initial_states,
+                                 system_eval_count,
+                                 controls=None,
+                                 cost_eval_step=1,
+                                 costs=list(),
+                                 hamiltonian=None,
+                                 interpolation_policy=InterpolationPolicy.LINEAR,
+                                 lindblad_data=None,
+                                 magnus_policy=MagnusPolicy.M2,
+                                 save_file_path=None,
+                                 save_intermediate_densities=False,
+                                 seed=None,
+                                 trajectory_batch_size=None,
+                                 trajectory_count=100,
+                                 trajectory_step_multiplier=1,):
+    """
+    Evolve a set of states under the lindblad equation by unraveling
+    the lindblad data into stochastic pure-state trajectories,
+    and compute the optimization error on the trajectory-averaged densities.
+    Each trajectory is evolved under the non-hermitian effective hamiltonian
+    H_eff = H - (i / 2) sum_k dissipators[k] operators[k]^dagger operators[k]
+    and a jump is applied when the squared norm of the trajectory
+    decays below a uniformly distributed random threshold [1].
+    This requires O(hilbert_size) memory per trajectory rather than
+    O(hilbert_size ** 2) per density.
+
+    References:
+    [1] K. Molmer, Y. Castin, and J. Dalibard, J. Opt. Soc. Am. B 10, 524 (1993)
+
+    Arguments:
+    evolution_time :: float - This value specifies the duration of the
+        system's evolution.
+    initial_states :: ndarray (state_count x hilbert_size x 1)
+        - This array specifies the states that should be evolved under
+        the specified system. These are the states at the beginning of
+        evolution.
+    system_eval_count :: int >= 2 - This value determines how many times
+        during the evolution the system is evaluated, including the
+        initial value of the system.
+        This value is used as:
+        `system_eval_times` = numpy.linspace(0, `evolution_time`, `system_eval_count`).
+
+    controls :: ndarray (control_step_count x control_count)
+        - This array specifies the control parameter values at each
+          control step. These values will be used to determine the `controls`
+          argument passed to the `hamiltonian` function.
+    cost_eval_step :: int >= 1- This value determines how often step-costs are evaluated.
+         The units of this value are in system_eval steps. E.g. if this value is 2,
+         step-costs will be computed every 2 system_eval steps.
+    costs :: iterable(qoc.models.cost.Cost) - This list specifies all
+        the cost functions that the optimizer should evaluate. This list
+        defines the criteria for an "optimal" control set. The costs are
+        evaluated on the trajectory-averaged densities.
+    hamiltonian :: (controls :: ndarray (control_count), time :: float)
+                   -> hamiltonian_matrix :: ndarray (hilbert_size x hilbert_size)
+        - This function provides the system's hamiltonian given a set
+        of control parameters and a time value.
+    interpolation_policy :: qoc.models.interpolationpolicy.InterpolationPolicy
+        - This value specifies how control parameters should be
+        interpreted at points where they are not defined.
+    lindblad_data :: (time :: float)
+                     -> (dissipators :: ndarray (operator_count),
+                         operators :: ndarray (operator_count x hilbert_size x hilbert_size))
+        - This function encodes the lindblad dissipators and operators for all time.
+        If the dissipators and operators do not depend on time, the tuple
+        (dissipators, operators) may be given instead.
+    magnus_policy :: qoc.models.magnuspolicy.MagnusPolicy - This value
+        specifies what method should be used to perform the magnus expansion
+        of the effective hamiltonian for each trajectory step.
+    save_file_path :: str - This is the full path to the file where
+        information about program execution will be stored.
+        E.g. "./out/foo.h5"
+    save_intermediate_densities :: bool - If this value is set to True,
+        qoc will write the trajectory-averaged densities to the save file
+        after every system_eval step.
+    seed :: int - This value seeds the random number generator that
+        determines the jumps. Evolutions with the same seed and arguments
+        produce the same trajectories.
+    trajectory_batch_size :: int - This value determines how many trajectories
+        of each initial state are evolved at once. It bounds the memory
+        used by the evolution. By default, all trajectories are evolved at once.
+    trajectory_count :: int - This value determines how many trajectories
+        are averaged for each initial state.
+    trajectory_step_multiplier :: int >= 1 - This value determines how many
+        trajectory steps are taken per system_eval step. Jumps are resolved
+        to the nearest trajectory step, so a larger value yields more
+        accuracy for strong dissipation.
+
+    Returns:
+    result
+    """
+    if controls is not None:
+        control_eval_count = controls.shape[0]
+    else:
+        control_eval_count = 0
+
+    pstate = EvolveLindbladTrajectoriesState(control_eval_count,
+                                             cost_eval_step, costs,
+                                             evolution_time, hamiltonian,
+                                             initial_states,
+                                             interpolation_policy,
+                                             lindblad_data, magnus_policy,
+                                             save_file_path,
+                                             save_intermediate_densities,
+                                             seed, system_eval_count,
+                                             trajectory_batch_size,
+                                             trajectory_count,
+                                             trajectory_step_multiplier,)
+    pstate.save_initial(controls)
+    result = EvolveLindbladResult()
+    _ = _evaluate_lindblad_trajectories(controls, pstate, result)
+    # Compute the costs that depend only on the controls.
+    if controls is not None:
+        control_error, _ = evaluate_control_costs(pstate.control_costs, controls,
+                                                  pstate.final_system_eval_step)
+        result.error = result.error + control_error
+
+    return result
+
+
+### HELPER METHODS ###
+
+def _evaluate_lindblad_trajectories(controls, pstate, reporter):
+    """
+    Evolve batches of quantum trajectories, average them into
+    density matrices, and compute associated optimization costs
+    for time-discrete control parameters.
+
+    Arguments:
+    controls :: ndarray - the control parameters
+    pstate :: qoc.models.EvolveLindbladTrajectoriesState - the program state
+    reporter :: any - the object to keep track of relevant information
+
+    Returns:
+    error :: float - total error of the evolution
+    """
+    # Initialize local variables (heap -> stack).
+    control_eval_times = pstate.control_eval_times
+    cost_eval_step = pstate.cost_eval_step
+    costs = pstate.costs
+    dt = pstate.dt
+    final_system_eval_step = pstate.final_system_eval_step
+    initial_states = pstate.initial_states
+    interpolation_policy = pstate.interpolation_policy
+    magnus_policy = pstate.magnus_policy
+    save_intermediate_densities = pstate.save_intermediate_densities_
+    step_costs = pstate.step_costs
+    system_eval_count = pstate.system_eval_count
+    trajectory_batch_size = pstate.trajectory_batch_size
+    trajectory_count = pstate.trajectory_count
+    trajectory_step_multiplier = pstate.trajectory_step_multiplier
+    trajectory_dt = dt / trajectory_step_multiplier
+    state_count, hilbert_size, _ = initial_states.shape
+    random = np.random.default_rng(pstate.seed)
+    error = 0
+    effective_hamiltonian, get_lindblad_data = _get_effective_hamiltonian(hilbert_size,
+                                                                          pstate.hamiltonian,
+                                                                          pstate.lindblad_data,)
+
+    # Only accumulate the averaged densities at the system_eval steps
+    # where they are used.
+    density_sums = dict()
+    for system_eval_step in range(system_eval_count):
+        is_cost_step = (np.mod(system_eval_step, cost_eval_step) == 0
+                        and system_eval_step != 0 and len(step_costs) != 0)
+        if (is_cost_step or save_intermediate_densities
+            or system_eval_step == final_system_eval_step):
+            density_sums[system_eval_step] = np.zeros((state_count, hilbert_size,
+                                                       hilbert_size),
+                                                      dtype=np.complex128)
+    #ENDFOR
+
+    # Evolve each batch of trajectories to `evolution_time`.
+    for batch_start in range(0, trajectory_count, trajectory_batch_size):
+        batch_size = min(trajectory_batch_size, trajectory_count - batch_start)
+        # Every initial state is unraveled by `batch_size` trajectories.
+        states = np.repeat(initial_states[:, None].astype(np.complex128),
+                           batch_size, axis=1)
+        thresholds = random.random((state_count, batch_size))
+        for system_eval_step in range(system_eval_count):
+            # Accumulate the normalized trajectory densities.
+            if system_eval_step in density_sums:
+                norms = np.sqrt(np.sum(np.abs(states) ** 2, axis=(-2, -1), keepdims=True))
+                normalized_states = (states / norms)[..., 0]
+                density_sums[system_eval_step] += np.matmul(np.swapaxes(normalized_states, -1, -2),
+                                                            np.conjugate(normalized_states))
+
+            # Evolve the trajectories to the next system_eval step.
+            if system_eval_step == final_system_eval_step:
+                break
+            for trajectory_step in range(trajectory_step_multiplier):
+                time = system_eval_step * dt + trajectory_step * trajectory_dt
+                states = _evolve_step_schroedinger_discrete(trajectory_dt, effective_hamiltonian,
+                                                            states, time,
+                                                            control_eval_times=control_eval_times,
+                                                            controls=controls,
+                                                            interpolation_policy=interpolation_policy,
+                                                            magnus_policy=magnus_policy,)
+                states, thresholds = _jump_trajectories(get_lindblad_data, random, states,
+                                                        thresholds, time + trajectory_dt)
+            #ENDFOR
+        #ENDFOR
+    #ENDFOR
+
+    # Compute the costs on the averaged densities.
+    for system_eval_step in sorted(density_sums):
+        densities = density_sums[system_eval_step] / trajectory_count
+        if save_intermediate_densities:
+            pstate.save_intermediate_densities(densities, 0, system_eval_step)
+        if (system_eval_step != 0
+            and np.mod(system_eval_step, cost_eval_step) == 0):
+            for i, step_cost in enumerate(step_costs):
+                cost_error = step_cost.cost(controls, densities, system_eval_step)
+                error = error + cost_error
+        #ENDIF
+    #ENDFOR
+
+    # Compute non-step-costs.
+    for i, cost in enumerate(costs):
+        if cost.requires_states and not cost.requires_step_evaluation:
+            cost_error = cost.cost(controls, densities, final_system_eval_step)
+            error = error + cost_error
+
+    # Report results.
+    reporter.error = error
+    reporter.final_densities = densities
+
+    return error
+
+
+def _get_effective_hamiltonian(hilbert_size, hamiltonian=None, lindblad_data=None,):
+    """
+    Produce a function that returns the non-hermitian effective hamiltonian
+    of the trajectories and a function that returns the lindblad data.
+
+    Arguments:
+    hilbert_size
+    hamiltonian
+    lindblad_data
+
+    Returns:
+    effective_hamiltonian :: (controls :: ndarray (control_count), time :: float)
+        -> effective_hamiltonian :: ndarray (hilbert_size x hilbert_size)
+    get_lindblad_data :: (time :: float)
+        -> (dissipators :: ndarray (operator_count),
+            operators :: ndarray (operator_count x hilbert_size x hilbert_size),
+            operators_product_sum :: ndarray (hilbert_size x hilbert_size))
+    """
+    # Construct dummy functions if the hamiltonian or lindblad functions were not specified.
+    if hamiltonian is None:
+        hamiltonian = lambda controls, time: 0
+
+    if lindblad_data is None:
+        get_lindblad_data = lambda time: (None, None, None)
+    # Precompute the dissipator terms if they do not depend on time.
+    elif callable(lindblad_data):
+        def get_lindblad_data(time):
+            dissipators, operators = lindblad_data(time)
+            _, operators_product_sum = get_lindblad_operator_cache(dissipators, operators)
+            return dissipators, operators, operators_product_sum
+        #ENDDEF
+    else:
+        dissipators, operators = lindblad_data
+        _, operators_product_sum = get_lindblad_operator_cache(dissipators, operators)
+        lindblad_data_ = (dissipators, operators, operators_product_sum)
+        get_lindblad_data = lambda time: lindblad_data_
+
+    zero_hamiltonian = np.zeros((hilbert_size, hilbert_size))
+    def effective_hamiltonian(controls, time):
+        _, _, operators_product_sum = get_lindblad_data(time)
+        effective_hamiltonian_ = zero_hamiltonian + hamiltonian(controls, time)
+        if operators_product_sum is not None:
+            effective_hamiltonian_ = effective_hamiltonian_ - 0.5j * operators_product_sum
+        return effective_hamiltonian_
+    #ENDDEF
+
+    return effective_hamiltonian, get_lindblad_data
+
+
+def _jump_trajectories(get_lindblad_data, random, states, thresholds, time):
+    """
+    Apply a quantum jump to each trajectory whose squared norm has decayed
+    below its threshold. The jump operator is drawn with probability
+    proportional to dissipators[k] * ||operators[k] state||^2. The jumped
+    trajectories are normalized and receive a new threshold.
+
+    Arguments:
+    get_lindblad_data
+    random :: numpy.random.Generator - the source of randomness
+    states :: ndarray (state_count x batch_size x hilbert_size x 1)
+    thresholds :: ndarray (state_count x batch_size)
+    time :: float - the time of the jump
+
+    Returns:
+    states
+    thresholds
+    """
+    dissipators, operators, _ = get_lindblad_data(time)
+    if operators is None:
+        return states, thresholds
+
+    norms_squared = np.sum(np.abs(states) ** 2, axis=(-2, -1))
+    jump_indices = np.nonzero(norms_squared < thresholds)
+    jump_count = len(jump_indices[0])
+    if jump_count != 0:
+        jump_states = states[jump_indices]
+        # Apply every operator to every jumping trajectory at once.
+        candidate_states = matmuls(operators[:, None], jump_states)
+        candidate_weights = (dissipators[:, None]
+                             * np.sum(np.abs(candidate_states) ** 2, axis=(-2, -1)))
+        cumulative_weights = np.cumsum(candidate_weights, axis=0)
+        draws = random.random(jump_count) * cumulative_weights[-1]
+        operator_indices = np.argmax(cumulative_weights > draws, axis=0)
+        jump_states = candidate_states[operator_indices, np.arange(jump_count)]
+        jump_states = jump_states / np.sqrt(np.sum(np.abs(jump_states) ** 2,
+                                                   axis=(-2, -1), keepdims=True))
+        states[jump_indices] = jump_states
+        thresholds[jump_indices] = random.random(jump_count)
+    #ENDIF
+
+    return states, thresholds
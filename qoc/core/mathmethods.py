@@ -3,6 +3,7 @@ mathmethods.py - mathematical methods in physics
 """
 
 import autograd.numpy as anp
+from autograd.tracer import getval
 import numpy as np
 
 from qoc.standard.functions.convenience import (commutator, conjugate_transpose,
@@ -167,7 +168,8 @@ def magnus_m6(a, dt, time):
 ### LINDBLAD METHODS ###
 
 def get_lindbladian(densities, dissipators=None, hamiltonian=None,
-                    operators=None,):
+                    operators=None, operators_dagger=None,
+                    operators_product_sum=None,):
     """
     Compute the action of the lindblad equation on a single (set of)
     density matrix (matrices). This implementation uses the definiton:
@@ -178,34 +180,141 @@ def get_lindbladian(densities, dissipators=None, hamiltonian=None,
     dissipators :: ndarray - the lindblad dissipators
     hamiltonian :: ndarray
     operators :: ndarray - the lindblad operators
+    operators_dagger :: ndarray - the conjugate transpose of `operators`,
+        see `get_lindblad_operator_cache`
+    operators_product_sum :: ndarray - the sum of the lindblad operator products
+        weighted by the dissipators, see `get_lindblad_operator_cache`
     operation_policy :: qoc.OperationPolicy - how computations should be
         performed, e.g. CPU, GPU, sparse, etc.
 
     Returns:
     lindbladian :: ndarray - the lindbladian operator acting on the densities
     """
-    if hamiltonian is not None:
+    if dissipators is not None and operators is not None:
+        if operators_dagger is None or operators_product_sum is None:
+            operators_dagger, operators_product_sum = get_lindblad_operator_cache(dissipators,
+                                                                                  operators)
+        # Fold the anticommutator terms -1/2 {sum_k g_k L_k^dagger L_k, p} into the
+        # non-hermitian effective hamiltonian H_eff = H - (i / 2) sum_k g_k L_k^dagger L_k,
+        # so that the coherent and anticommutator terms are -i (H_eff p - p H_eff^dagger).
+        # H_eff^dagger is written as H + (i / 2) sum_k g_k L_k^dagger L_k so that
+        # this also holds for a non-hermitian H.
+        anticommutator_term = 0.5j * operators_product_sum
+        if hamiltonian is not None:
+            effective_hamiltonian = hamiltonian - anticommutator_term
+            effective_hamiltonian_dagger = hamiltonian + anticommutator_term
+        else:
+            effective_hamiltonian = -anticommutator_term
+            effective_hamiltonian_dagger = anticommutator_term
+        lindbladian = -1j * (matmuls(effective_hamiltonian, densities,)
+                             - matmuls(densities, effective_hamiltonian_dagger,))
+        lindbladian = lindbladian + get_lindblad_jumps(densities, dissipators,
+                                                       operators, operators_dagger)
+    elif hamiltonian is not None:
         lindbladian = -1j * commutator(hamiltonian, densities,)
     else:
         lindbladian = 0
-        
-    if dissipators is not None and operators is not None:
-        operators_dagger = conjugate_transpose(operators,)
-        operators_product = matmuls(operators_dagger, operators,)
-        for i, operator in enumerate(operators):
-            dissipator = dissipators[i]
-            operator_dagger = operators_dagger[i]
-            operator_product = operators_product[i]
-            lindbladian = (lindbladian
-                           + (dissipator
-                              * (matmuls(operator, densities, operator_dagger,)
-                                 - 0.5 * matmuls(operator_product, densities,)
-                                 - 0.5 * matmuls(densities, operator_product,))))
-        #ENDFOR
     #ENDIF
     return lindbladian
 
 
+def get_lindblad_jumps(densities, dissipators, operators, operators_dagger):
+    """
+    Compute the jump terms sum_k dissipators[k] * operators[k] @ densities @ operators_dagger[k]
+    of the lindbladian by applying every operator to the densities at once.
+
+    Args:
+    densities :: ndarray - the probability density matrices
+    dissipators :: ndarray (operator_count) - the lindblad dissipators
+    operators :: ndarray (operator_count x hilbert_size x hilbert_size)
+        - the lindblad operators
+    operators_dagger :: ndarray (operator_count x hilbert_size x hilbert_size)
+        - the conjugate transpose of `operators`
+
+    Returns:
+    jumps :: ndarray - the jump terms acting on the densities
+    """
+    operators_shape = ((operators.shape[0],) + (1,) * (anp.ndim(densities) - 2)
+                       + operators.shape[1:])
+    sandwiches = matmuls(anp.reshape(operators, operators_shape), densities,
+                         anp.reshape(operators_dagger, operators_shape),)
+    jumps = anp.tensordot(dissipators, sandwiches, axes=1)
+
+    return jumps
+
+
+def get_lindblad_operator_cache(dissipators, operators):
+    """
+    Precompute the terms of the lindbladian that depend only on time-independent
+    lindblad dissipators and operators.
+
+    Args:
+    dissipators :: ndarray (operator_count) - the lindblad dissipators
+    operators :: ndarray (operator_count x hilbert_size x hilbert_size)
+        - the lindblad operators
+
+    Returns:
+    operators_dagger :: ndarray (operator_count x hilbert_size x hilbert_size)
+        - the conjugate transpose of each operator
+    operators_product_sum :: ndarray (hilbert_size x hilbert_size)
+        - sum_k dissipators[k] * operators_dagger[k] @ operators[k]
+    """
+    operators_dagger = conjugate_transpose(operators,)
+    operators_product = matmuls(operators_dagger, operators,)
+    operators_product_sum = anp.tensordot(dissipators, operators_product, axes=1)
+
+    return operators_dagger, operators_product_sum
+
+
+def get_lindbladian_superoperator(hilbert_size, dissipators=None, hamiltonian=None,
+                                  operators=None,):
+    """
+    Construct the lindbladian as a superoperator that acts on row-major
+    vectorized density matrices, i.e. vec(lindbladian(rho)) = superoperator @ vec(rho)
+    where vec(rho) = rho.reshape(hilbert_size ** 2). Using
+    vec(A rho B) = (A kron B^T) vec(rho), the superoperator is
+    -i (H_eff kron I - I kron H_eff^*) + sum_k gamma_k L_k kron L_k^*
+    for the effective hamiltonian H_eff = H - (i / 2) sum_k gamma_k L_k^dagger L_k.
+
+    Args:
+    hilbert_size :: int - the dimension of the density matrices
+    dissipators :: ndarray (operator_count) - the lindblad dissipators
+    hamiltonian :: ndarray (hilbert_size x hilbert_size)
+    operators :: ndarray (operator_count x hilbert_size x hilbert_size)
+        - the lindblad operators
+
+    Returns:
+    superoperator :: ndarray (hilbert_size ** 2 x hilbert_size ** 2)
+        - the lindbladian superoperator
+    """
+    superoperator_size = hilbert_size ** 2
+    identity = np.eye(hilbert_size)
+    effective_hamiltonian = np.zeros((hilbert_size, hilbert_size))
+    superoperator = np.zeros((superoperator_size, superoperator_size))
+    
+    if hamiltonian is not None:
+        effective_hamiltonian = effective_hamiltonian + hamiltonian
+
+    if dissipators is not None and operators is not None:
+        operators_product = matmuls(conjugate_transpose(operators), operators,)
+        effective_hamiltonian = (effective_hamiltonian
+                                 - 0.5j * anp.einsum("k,kij->ij", dissipators,
+                                                     operators_product))
+        # The sandwich terms gamma_k L_k rho L_k^dagger.
+        jump_superoperator = anp.einsum("k,kij,kab->iajb", dissipators, operators,
+                                        anp.conjugate(operators))
+        superoperator = superoperator + anp.reshape(jump_superoperator,
+                                                    (superoperator_size,
+                                                     superoperator_size))
+    #ENDIF
+
+    superoperator = (superoperator
+                     - 1j * (anp.kron(effective_hamiltonian, identity)
+                             - anp.kron(identity, anp.conjugate(effective_hamiltonian))))
+
+    return superoperator
+
+
 ### ODE METHODS ###
 
 # RKDP5(4) Butcher tableau constants.
@@ -279,7 +388,7 @@ def rkdp5_dense(ks, x0, x1, x_eval_step, y0, y1):
     y1 :: ndarray (N) - the y value corresponding to `x1`
 
     Returns:
-    y_eval_step :: ndarray (eval_step_count) - The y values corresponding
+    y_eval_step :: ndarray (eval_step_count x N) - The y values corresponding
         to the x values in `x_eval_step`.
     """
     # Interpolate.
@@ -291,7 +400,9 @@ def rkdp5_dense(ks, x0, x1, x_eval_step, y0, y1):
     # Note that D2=0. Therefore, we may compute r5 like so:
     r5 = h * (D1 * ks[0] + D3 * ks[2] + D4 * ks[3] + D5 * ks[4]
               + D6 * ks[5] + D7 * ks[6])
-    theta = (x_eval_step - x0) / h
+    # Broadcast each interpolation point against the shape of y.
+    theta = anp.reshape((x_eval_step - x0) / h,
+                        (len(x_eval_step),) + (1,) * anp.ndim(y0))
     theta2 = theta ** 2
     theta3 = theta ** 3
     theta4 = theta2 ** 2
@@ -350,7 +461,7 @@ def integrate_rkdp5_step(h, rhs, x0, y0, k1=None):
 
 
 def integrate_rkdp5(rhs, x_eval, x_initial, y_initial,
-                    atol=1e-12, rtol=0.,
+                    atol=1e-12, eval_callback=None, rtol=0.,
                     step_safety_factor=0.9,
                     step_update_factor_max=10,
                     step_update_factor_min=2e-1,):
@@ -372,6 +483,9 @@ def integrate_rkdp5(rhs, x_eval, x_initial, y_initial,
     Arguments:
     atol :: float or array(N) - the absolute tolerance of the component-wise
         local error, i.e. "Atoli" in e.q. 4.10 on pp. 167 of [1]
+    eval_callback :: (x_eval_index :: int, y_eval :: array(N)) -> None
+        - a function that is called on each point of `x_eval`, in order,
+        as soon as the integration reaches it
     rhs :: (x :: float, y :: array(N)) -> dy_dx :: array(N)
         - the right-hand side of the equation dy_dx = rhs(x, y)
         that defines the first order differential equation
@@ -402,17 +516,21 @@ def integrate_rkdp5(rhs, x_eval, x_initial, y_initial,
     else:
         x_final = x_eval[-1]
     
+    # The step size control is kept off of the autograd tape. Each step size
+    # is a constant of the differentiated method, so the gradients are those
+    # of the integration on the accepted mesh. Differentiating through the
+    # step size control instead amplifies the round-off in the error estimate.
     # Compute initial step size per pp. 169 of [1].
     f0 = rhs(x_initial, y_initial)
-    d0 = rms_norm(y_initial)
-    d1 = rms_norm(f0)
+    d0 = rms_norm(getval(y_initial))
+    d1 = rms_norm(getval(f0))
     if d0 < 1e-5 or d1 < 1e-5:
         h0 = 1e-6
     else:
         h0 = 0.01 * d0 / d1
-    y1 = y_initial + h0 * f0
-    f1 = rhs(x_initial + h0, y1)
-    d2 = rms_norm(f1 - f0) / h0
+    y1 = getval(y_initial) + h0 * getval(f0)
+    f1 = getval(rhs(x_initial + h0, y1))
+    d2 = rms_norm(f1 - getval(f0)) / h0
     if anp.maximum(d1, d2) <= 1e-15:
         h1 = anp.maximum(1e-6, h0 * 1e-3)
     else:
@@ -424,7 +542,7 @@ def integrate_rkdp5(rhs, x_eval, x_initial, y_initial,
     x_current = x_initial
     y_current = y_initial
     k1 = f0
-    while x_current <= x_final:
+    while x_current < x_final:
         step_rejected = False
         step_accepted = False
         # Repeatedly attempt to move to the next position in the mesh
@@ -438,8 +556,10 @@ def integrate_rkdp5(rhs, x_eval, x_initial, y_initial,
             # the current attempted step size places us in the mesh.
             x_new = x_current + step_current
             # Compute the local error associated with the attempted step.
-            scale = atol + anp.maximum(anp.abs(y1), anp.abs(y1h)) * rtol
-            error_norm = rms_norm((y1 - y1h) / scale)
+            y1_ = getval(y1)
+            y1h_ = getval(y1h)
+            scale = atol + np.maximum(np.abs(y1_), np.abs(y1h_)) * rtol
+            error_norm = rms_norm((y1_ - y1h_) / scale)
 
             # If the step is accepted, increase the step size,
             # and move to the next step.
@@ -464,12 +584,17 @@ def integrate_rkdp5(rhs, x_eval, x_initial, y_initial,
                 step_current = step_current * step_update_factor
         #ENDWHILE
         # Interpolate any output points that ocurred in the step.
-        x_eval_step_indices = anp.nonzero(anp.logical_and(x_current <= x_eval, x_eval <= x_new))[0]
+        # The interval is half-open so that a point on a step boundary
+        # is only emitted once.
+        x_eval_step_indices = anp.nonzero(anp.logical_and(x_current < x_eval, x_eval <= x_new))[0]
         x_eval_step = x_eval[x_eval_step_indices]
         if len(x_eval_step) != 0:
             y_eval_step = rkdp5_dense(ks, x_current, x_new, x_eval_step, y_current, y1)
-            for y_eval_ in y_eval_step:
+            for i, y_eval_ in enumerate(y_eval_step):
                 y_eval_list.append(y_eval_)
+                if eval_callback is not None:
+                    eval_callback(x_eval_step_indices[i], y_eval_)
+            #ENDFOR
         
         # Update the position in the mesh.
         x_current = x_new
@@ -478,3 +603,38 @@ def integrate_rkdp5(rhs, x_eval, x_initial, y_initial,
     #ENDWHILE
     
     return anp.stack(y_eval_list)
+
+
+# SDIRK2 constants from [6].
+_SDIRK2_GAMMA = 1 - np.divide(np.sqrt(2), 2)
+
+
+def integrate_sdirk2_step(a, dt, time, y):
+    """
+    Take one step of the two stage, L-stable, stiffly accurate singly diagonally
+    implicit Runge-Kutta method of order two (SDIRK2) [6] for the linear equation
+    dy_dt = a(t) y. Because the method is implicit, its step size is not bounded
+    by the stiffness of `a`, e.g. by fast decay rates.
+
+    References:
+    [6] R. Alexander, Diagonally implicit Runge-Kutta methods for stiff O.D.E.'s,
+    SIAM J. Numer. Anal. 14, 1006 (1977)
+
+    Arguments:
+    a :: (time :: float) -> ndarray (N x N) - the system matrix
+    dt :: float - the time step
+    time :: float - the current time
+    y :: ndarray (N x M) - the (column stacked) initial values
+
+    Returns:
+    y1 :: ndarray (N x M) - the values at `time` + `dt`
+    """
+    identity = np.eye(y.shape[0])
+    # Note that the method is stiffly accurate, so the second stage is the step.
+    a1 = a(time + _SDIRK2_GAMMA * dt)
+    y_stage = anp.linalg.solve(identity - _SDIRK2_GAMMA * dt * a1, y)
+    a2 = a(time + dt)
+    y1 = anp.linalg.solve(identity - _SDIRK2_GAMMA * dt * a2,
+                          y + (1 - _SDIRK2_GAMMA) * dt * anp.matmul(a1, y_stage))
+
+    return y1
@@ -3,24 +3,43 @@ schroedingerdiscrete.py - a module to expose the grape schroedinger discrete
 optimization algorithm
 """
 
+from copy import copy
+import os
+
+from autograd import grad, make_jvp, make_vjp
 from autograd.extend import Box
+import autograd.numpy as anp
 import numpy as np
+from scipy.linalg import expm_frechet
 
 from qoc.core.common import (initialize_controls,
                              slap_controls, strip_controls,
-                             clip_control_norms,)
+                             clip_control_norms,
+                             evaluate_control_costs,
+                             evaluate_cost,
+                             get_control_bounds,
+                             project_controls,
+                             resample_controls,
+                             rescale_control_norms,)
 from qoc.core.mathmethods import (interpolate_linear_set,
                                   magnus_m2,
                                   magnus_m4,
                                   magnus_m6,)
 from qoc.models import (Dummy, EvolveSchroedingerDiscreteState,
                         EvolveSchroedingerResult,
+                        GoatSchroedingerDiscreteState,
+                        GoatSchroedingerResult,
                         GrapeSchroedingerDiscreteState,
                         GrapeSchroedingerResult,
                         InterpolationPolicy,
+                        KrotovSchroedingerDiscreteState,
                         MagnusPolicy,
-                        ProgramType,)
+                        MinTimeSchroedingerResult,
+                        MultiresolutionSchroedingerResult,
+                        ProgramType,
+                        load_checkpoint,)
 from qoc.standard import (Adam, ans_jacobian,
+                          conjugate_transpose,
                           expm, matmuls)
 
 ### MAIN METHODS ###
@@ -99,6 +118,11 @@ def evolve_schroedinger_discrete(evolution_time, hamiltonian,
     pstate.save_initial(controls)
     result = EvolveSchroedingerResult()
     _ = _evaluate_schroedinger_discrete(controls, pstate, result)
+    # Compute the costs that depend only on the controls.
+    if controls is not None:
+        control_error, _ = evaluate_control_costs(pstate.control_costs, controls,
+                                                  pstate.final_system_eval_step)
+        result.error = result.error + control_error
 
     return result
 
@@ -106,7 +130,9 @@ def evolve_schroedinger_discrete(evolution_time, hamiltonian,
 def grape_schroedinger_discrete(control_count, control_eval_count,
                                 costs, evolution_time, hamiltonian,
                                 initial_states, system_eval_count,
+                                batch_size=None,
                                 complex_controls=False,
+                                control_basis=None,
                                 cost_eval_step=1,
                                 impose_control_conditions=None,
                                 initial_controls=None,
@@ -117,9 +143,11 @@ def grape_schroedinger_discrete(control_count, control_eval_count,
                                 max_control_norms=None,
                                 min_error=0,
                                 optimizer=Adam(),
+                                resume_from=None,
                                 save_file_path=None,
                                 save_intermediate_states=False,
-                                save_iteration_step=0,):
+                                save_iteration_step=0,
+                                variance_reduction_step=0,):
     """
     This method optimizes the evolution of a set of states under the schroedinger
     equation for time-discrete control parameters.
@@ -150,10 +178,28 @@ def grape_schroedinger_discrete(control_count, control_eval_count,
         This value is used as:
         `system_eval_times` = numpy.linspace(0, `evolution_time`, `system_eval_count`).
 
+    batch_size :: int - If this value is specified, each optimization iteration
+        evolves a mini-batch of `batch_size` of the `initial_states`,
+        sampled uniformly without replacement with numpy's global random state.
+        The costs that depend on the states are normalized for the size of the
+        mini-batch, so the error and gradients of each iteration are unbiased
+        estimates of those of all the states. The errors that are logged and
+        saved are those of the mini-batch, and the final states
+        of the states that were not in the mini-batch are saved as NaN.
     complex_controls :: bool - This value determines if the control parameters
         are complex-valued. If some controls are real only or imaginary only
         while others are complex, real only and imaginary only controls
         can be simulated by taking the real or imaginary part of a complex control.
+    control_basis :: ndarray (control_eval_count x basis_size) - If this array
+        is specified, the optimizer's parameters are the coefficients
+        (basis_size x control_count) of the controls in this real basis, which are
+        expanded to the controls as `control_basis` @ `coefficients`, see e.g.
+        qoc.standard.get_fourier_basis. The initial controls are projected onto
+        the basis, and the gradients are mapped back through the transpose
+        of the basis. The coefficients are not bounded, but the
+        controls are still rescaled to `max_control_norms`. A band-limited
+        basis bounds the bandwidth of the controls by construction,
+        so a ControlBandwidthMax cost is not needed.
     cost_eval_step :: int >= 1- This value determines how often step-costs are evaluated.
          The units of this value are in system_eval steps. E.g. if this value is 2,
          step-costs will be computed every 2 system_eval steps.
@@ -192,6 +238,15 @@ def grape_schroedinger_discrete(control_count, control_eval_count,
     optimizer :: class instance - This optimizer object defines the
         gradient-based procedure for minimizing the total contribution
         of all cost functions with respect to the control parameters.
+        If the optimizer's `hessian_vector_products` field is True, it is also
+        given the products of the hessian of the total cost with vectors.
+    resume_from :: str - This is the full path to the save file of an
+        interrupted optimization run to resume from its last checkpoint.
+        Checkpoints are saved every `save_iteration_step` iterations.
+        The optimizer's internal state and numpy's global random state
+        are restored, so an optimizer that exposes its state continues
+        exactly as if the run had not been interrupted.
+        This value may be `save_file_path`, in which case the save file is continued.
     save_file_path :: str - This is the full path to the file where
         information about program execution will be stored.
         E.g. "./out/foo.h5"
@@ -206,6 +261,14 @@ def grape_schroedinger_discrete(control_count, control_eval_count,
         This value is specified in units of system steps, of which
         there are `control_step_count` * `system_step_multiplier`.
         Set this value to 0 to disable saving.
+    variance_reduction_step :: int - If this value is nonzero and `batch_size`
+        is specified, the mini-batch gradients are corrected with stochastic
+        variance reduced gradients (SVRG, https://papers.nips.cc/paper/4937).
+        Every `variance_reduction_step` iterations the error and gradients of all the
+        states are computed at a snapshot of the controls. The estimate of each
+        iteration is the mini-batch value at the controls, minus the mini-batch value
+        at the snapshot, plus the value of all the states at the snapshot.
+        Set this value to 0 to disable variance reduction.
 
     Returns:
     result :: qoc.models.schroedingermodels.GrapeSchroedingerResult
@@ -218,7 +281,8 @@ def grape_schroedinger_discrete(control_count, control_eval_count,
                                                               initial_controls,
                                                               max_control_norms)
     # Construct the program state.
-    pstate = GrapeSchroedingerDiscreteState(complex_controls, control_count,
+    pstate = GrapeSchroedingerDiscreteState(batch_size, complex_controls,
+                                            control_basis, control_count,
                                             control_eval_count, cost_eval_step,
                                             costs, evolution_time, hamiltonian,
                                             impose_control_conditions,
@@ -231,8 +295,17 @@ def grape_schroedinger_discrete(control_count, control_eval_count,
                                             save_file_path,
                                             save_intermediate_states,
                                             save_iteration_step,
-                                            system_eval_count,)
-    pstate.log_and_save_initial()
+                                            system_eval_count,
+                                            variance_reduction_step,)
+    # Load the checkpoint to resume from.
+    if resume_from is None:
+        checkpoint = None
+        resume = False
+    else:
+        checkpoint = load_checkpoint(resume_from)
+        resume = (save_file_path is not None
+                  and os.path.abspath(resume_from) == os.path.abspath(save_file_path))
+    pstate.log_and_save_initial(resume=resume)
 
     # Autograd does not allow multiple return values from
     # a differentiable function.
@@ -242,12 +315,543 @@ def grape_schroedinger_discrete(control_count, control_eval_count,
     # is to use a reporter object.
     reporter = Dummy()
     reporter.iteration = 0
+    reporter.last_controls = None
+    reporter.last_error = None
+    reporter.hessian_controls = None
+    reporter.hessian_vjp = None
+    reporter.snapshot_controls = None
+    reporter.snapshot_error = None
+    reporter.snapshot_grads = None
     result = GrapeSchroedingerResult()
     # Convert the controls from cost function format to optimizer format.
-    initial_controls = strip_controls(pstate.complex_controls, pstate.initial_controls)
+    if pstate.control_basis is None:
+        initial_controls = strip_controls(pstate.complex_controls, pstate.initial_controls)
+        # Translate the maximum control norms into bounds on the optimizer's parameters.
+        bounds = get_control_bounds(pstate.complex_controls, pstate.controls_shape,
+                                    pstate.max_control_norms)
+    else:
+        # The optimizer's parameters are the coefficients of the controls in the basis,
+        # which are not bounded. The expanded controls are rescaled to their maximum norm.
+        initial_coefficients = project_controls(pstate.control_basis, pstate.initial_controls)
+        initial_controls = strip_controls(pstate.complex_controls, initial_coefficients)
+        bounds = None
+    iteration_count = pstate.iteration_count
+    # Optional keywords are only passed to the optimizers that declare them,
+    # so that optimizers which only implement
+    # run(function, iteration_count, initial_params, jacobian, args) are supported.
+    # The controls are clipped to their maximum norms whether or not
+    # the optimizer is given the bounds.
+    optimizer_kwargs = dict()
+    if bounds is not None and getattr(pstate.optimizer, "box_bounds", False):
+        optimizer_kwargs["bounds"] = bounds
+    # Optimizers that consume hessian-vector products are also given them.
+    if getattr(pstate.optimizer, "hessian_vector_products", False):
+        optimizer_kwargs["hessian_vector_product"] = _esdh_wrap
+    # Continue the optimization from the checkpoint.
+    if checkpoint is not None:
+        reporter.iteration = checkpoint.iteration
+        for name, value in checkpoint.result.items():
+            setattr(result, name, value)
+        initial_controls = checkpoint.controls
+        iteration_count = iteration_count - checkpoint.iteration
+        np.random.set_state(checkpoint.rng_state)
+        if hasattr(pstate.optimizer, "set_state"):
+            optimizer_kwargs["initial_state"] = checkpoint.optimizer_state
+    #ENDIF
+    
+    # Run the optimization.
+    pstate.optimizer.run(_esd_wrap, iteration_count, initial_controls,
+                         _esdj_wrap, args=(pstate, reporter, result),
+                         **optimizer_kwargs)
+
+    return result
+
+
+def goat_schroedinger_discrete(costs, evolution_time, hamiltonian,
+                               initial_params, initial_states, pulse,
+                               system_eval_count,
+                               iteration_count=1000,
+                               log_iteration_step=10,
+                               magnus_policy=MagnusPolicy.M2,
+                               min_error=0,
+                               optimizer=Adam(),
+                               param_bounds=None,
+                               save_file_path=None,
+                               save_iteration_step=0,):
+    """
+    This method optimizes the evolution of a set of states under the schroedinger
+    equation for controls that are an analytic function of a few parameters,
+    e.g. Gaussian, DRAG or Fourier series pulses, in the manner of GOAT
+    (https://arxiv.org/abs/1507.04261). The derivatives of the states with respect to
+    the parameters are propagated forward alongside the states, so the memory
+    does not grow with `system_eval_count` and each iteration requires
+    `param_count` derivative propagations rather than a backward pass
+    through the evolution.
+
+    Args:
+    costs :: iterable(qoc.models.cost.Cost) - This list specifies all
+        the cost functions that the optimizer should evaluate. This list
+        defines the criteria for an "optimal" control set. The derivatives
+        are propagated forward, so each cost must depend only on the final states.
+    evolution_time :: float - This value specifies the duration of the
+        system's evolution.
+    hamiltonian :: (controls :: ndarray (control_count), time :: float)
+                   -> hamiltonian_matrix :: ndarray (hilbert_size x hilbert_size)
+        - This function provides the system's hamiltonian given a set
+        of control parameters and a time value.
+    initial_params :: ndarray (param_count) - This array specifies the real parameters
+        of the pulse for the first iteration of optimization.
+    initial_states :: ndarray (state_count x hilbert_size x 1)
+        - This array specifies the states that should be evolved under the
+        specified system. These are the states at the beginning of the evolution.
+    pulse :: (params :: ndarray (param_count), time :: float)
+             -> controls :: ndarray (control_count)
+        - This function provides the controls passed to the `hamiltonian`
+        given the parameters and a time value. It must be differentiable by
+        autograd's forward mode, e.g. it may be written with autograd.numpy.
+    system_eval_count :: int >= 2 - This value determines how many times
+        during the evolution the system is evaluated, including the
+        initial value of the system. For the schroedinger evolution,
+        this value determines the time step of integration.
+        This value is used as:
+        `system_eval_times` = numpy.linspace(0, `evolution_time`, `system_eval_count`).
+
+    iteration_count :: int - This value determines how many total system
+        evolutions the optimizer will perform to determine the
+        optimal parameters.
+    log_iteration_step :: int - This value determines how often qoc logs
+        progress to stdout. Set this value to 0 to disable logging.
+    magnus_policy :: qoc.models.magnuspolicy.MagnusPolicy - This value
+        specifies what method should be used to perform the magnus expansion
+        of the system matrix for ode integration.
+    min_error :: float - This value is the threshold below which
+        optimization will terminate.
+    optimizer :: class instance - This optimizer object defines the
+        gradient-based procedure for minimizing the total contribution
+        of all cost functions with respect to the parameters.
+    param_bounds :: tuple(ndarray (param_count)) - This value specifies
+        the lower and upper bounds on the parameters, which are passed to the optimizer.
+    save_file_path :: str - This is the full path to the file where
+        information about program execution will be stored.
+        E.g. "./out/foo.h5"
+        The save file has the layout of `grape_schroedinger_discrete`,
+        where the "controls" are the pulse evaluated at the system eval times
+        and the "grads" are with respect to the parameters,
+        which are saved as "params".
+    save_iteration_step :: int - This value determines how often qoc
+        saves progress to the save file specified by `save_file_path`.
+        Set this value to 0 to disable saving.
+
+    Returns:
+    result :: qoc.models.schroedingermodels.GoatSchroedingerResult
+    """
+    initial_params = np.asarray(initial_params, dtype=np.float64)
+    # Construct the program state.
+    pstate = GoatSchroedingerDiscreteState(costs, evolution_time, hamiltonian,
+                                           initial_params, initial_states,
+                                           iteration_count,
+                                           log_iteration_step, magnus_policy,
+                                           min_error, optimizer, param_bounds,
+                                           pulse, save_file_path,
+                                           save_iteration_step,
+                                           system_eval_count,)
+    pstate.log_and_save_initial()
+
+    reporter = Dummy()
+    reporter.iteration = 0
+    reporter.last_params = None
+    reporter.last_error = None
+    result = GoatSchroedingerResult()
+
+    # The bounds are only passed if they are set, so that optimizers which only
+    # implement run(function, iteration_count, initial_params, jacobian, args)
+    # are supported.
+    optimizer_kwargs = dict()
+    if pstate.param_bounds is not None:
+        optimizer_kwargs["bounds"] = pstate.param_bounds
+
     # Run the optimization.
-    pstate.optimizer.run(_esd_wrap, pstate.iteration_count, initial_controls,
-                         _esdj_wrap, args=(pstate, reporter, result))
+    pstate.optimizer.run(_esgd_wrap, pstate.iteration_count, initial_params,
+                         _esgdj_wrap, args=(pstate, reporter, result),
+                         **optimizer_kwargs)
+
+    return result
+
+
+def krotov_schroedinger_discrete(control_count, control_eval_count,
+                                 costs, evolution_time, hamiltonian,
+                                 initial_states, system_eval_count,
+                                 complex_controls=False,
+                                 initial_controls=None,
+                                 interpolation_policy=InterpolationPolicy.LINEAR,
+                                 iteration_count=1000,
+                                 lambda_a=1.,
+                                 log_iteration_step=10,
+                                 magnus_policy=MagnusPolicy.M2,
+                                 max_control_norms=None,
+                                 min_error=0,
+                                 save_file_path=None,
+                                 save_iteration_step=0,
+                                 update_shape=1.,):
+    """
+    This method optimizes the evolution of a set of states under the schroedinger
+    equation for time-discrete control parameters with Krotov's method
+    (https://arxiv.org/abs/1902.11284).
+    Each iteration propagates the costates backward under the current controls,
+    then propagates the states forward while the controls are updated sequentially
+    with the states they produce. Every control is updated at the first system step
+    whose evolution depends on it, so the states at the end of the forward
+    propagation are those of the updated controls. Each iteration
+    therefore requires one backward and one forward propagation and no line search.
+    The sequential updates are most effective when `control_eval_count`
+    equals `system_eval_count`.
+
+    Args:
+    control_count :: int - This is the number of control parameters that qoc should
+        optimize over. I.e. it is the length of the `controls` array passed
+        to the hamiltonian.
+    control_eval_count :: int >= 2 - This value determines where definite values
+        of the control parameters are evaluated. This value is used as:
+        `control_eval_times`= numpy.linspace(0, `evolution_time`, `control_eval_count`).
+    costs :: iterable(qoc.models.cost.Cost) - This list specifies all
+        the cost functions that the optimizer should evaluate. This list
+        defines the criteria for an "optimal" control set. Krotov's method
+        requires that each cost depends only on the final states.
+    evolution_time :: float - This value specifies the duration of the
+        system's evolution.
+    hamiltonian :: (controls :: ndarray (control_count), time :: float)
+                   -> hamiltonian_matrix :: ndarray (hilbert_size x hilbert_size)
+        - This function provides the system's hamiltonian given a set
+        of control parameters and a time value.
+    initial_states :: ndarray (state_count x hilbert_size x 1)
+        - This array specifies the states that should be evolved under the
+        specified system. These are the states at the beginning of the evolution.
+    system_eval_count :: int >= 2 - This value determines how many times
+        during the evolution the system is evaluated, including the
+        initial value of the system. For the schroedinger evolution,
+        this value determines the time step of integration.
+        This value is used as:
+        `system_eval_times` = numpy.linspace(0, `evolution_time`, `system_eval_count`).
+
+    complex_controls :: bool - This value determines if the control parameters
+        are complex-valued.
+    initial_controls :: ndarray (control_step_count x control_count)
+        - This array specifies the control parameters at each
+        control step for the first iteration of optimization.
+    interpolation_policy :: qoc.models.interpolationpolicy.InterpolationPolicy
+        - This value specifies how control parameters should be
+        interpreted at points where they are not defined.
+    iteration_count :: int - This value determines how many times the
+        controls are evaluated, i.e. one more than the number of updates.
+    lambda_a :: float - This value is the inverse step size of the updates.
+        Each control is updated by `update_shape` / `lambda_a` times the
+        negative gradient of the error with respect to the control
+        through the system step at which it is updated.
+        Larger values yield smaller, more reliably monotonic, updates.
+    log_iteration_step :: int - This value determines how often qoc logs
+        progress to stdout. Set this value to 0 to disable logging.
+    magnus_policy :: qoc.models.magnuspolicy.MagnusPolicy - This value
+        specifies what method should be used to perform the magnus expansion
+        of the system matrix for ode integration.
+    max_control_norms :: ndarray (control_count) - This array
+        specifies the element-wise maximum norm that each control is
+        allowed to achieve. Updated controls that exceed their maximum norm
+        are rescaled to it.
+    min_error :: float - This value is the threshold below which
+        optimization will terminate.
+    save_file_path :: str - This is the full path to the file where
+        information about program execution will be stored.
+        E.g. "./out/foo.h5"
+        The save file has the layout of `grape_schroedinger_discrete`,
+        where the "grads" of each iteration are the update that was applied
+        to its controls, which is zero at the final iteration.
+    save_iteration_step :: int - This value determines how often qoc
+        saves progress to the save file specified by `save_file_path`.
+        Set this value to 0 to disable saving.
+    update_shape :: ndarray (control_eval_count x control_count) - This array
+        scales the update of each control, e.g. to switch the controls on and off
+        smoothly at the ends of the evolution, it may be any array that broadcasts
+        to the shape of the controls.
+
+    Returns:
+    result :: qoc.models.schroedingermodels.GrapeSchroedingerResult
+    """
+    # Initialize the controls.
+    initial_controls, max_control_norms = initialize_controls(complex_controls,
+                                                              control_count,
+                                                              control_eval_count,
+                                                              evolution_time,
+                                                              initial_controls,
+                                                              max_control_norms)
+    # Construct the program state.
+    pstate = KrotovSchroedingerDiscreteState(complex_controls, control_count,
+                                             control_eval_count, costs,
+                                             evolution_time, hamiltonian,
+                                             initial_controls,
+                                             initial_states, interpolation_policy,
+                                             iteration_count, lambda_a,
+                                             log_iteration_step,
+                                             max_control_norms, magnus_policy,
+                                             min_error,
+                                             save_file_path, save_iteration_step,
+                                             system_eval_count, update_shape,)
+    pstate.log_and_save_initial()
+    result = GrapeSchroedingerResult()
+
+    # Evolve the states under the initial controls.
+    controls = np.copy(pstate.initial_controls)
+    controls, final_states = _krotov_forward(controls, None, pstate)
+    for iteration in range(pstate.iteration_count):
+        error, final_costates = _krotov_costates(controls, final_states, pstate)
+        terminate = (error <= pstate.min_error
+                     or iteration == pstate.final_iteration)
+        if terminate:
+            update = np.zeros_like(controls)
+        else:
+            costates = _krotov_backward(controls, final_costates, pstate)
+            next_controls, next_final_states = _krotov_forward(np.copy(controls),
+                                                               costates, pstate)
+            update = next_controls - controls
+        #ENDIF
+
+        # Update best configuration.
+        if error < result.best_error:
+            result.best_controls = controls
+            result.best_error = error
+            result.best_final_states = final_states
+            result.best_iteration = iteration
+
+        # Save and log optimization progress.
+        pstate.log_and_save(controls, error, final_states, update, iteration)
+
+        if terminate:
+            break
+        controls = next_controls
+        final_states = next_final_states
+    #ENDFOR
+
+    return result
+
+
+def min_time_schroedinger_discrete(control_count, control_eval_count,
+                                   costs, hamiltonian, initial_states,
+                                   max_evolution_time, min_error,
+                                   system_eval_count,
+                                   initial_controls=None,
+                                   log_iteration_step=0,
+                                   min_evolution_time=0.,
+                                   save_file_path=None,
+                                   time_tolerance=None,
+                                   **grape_kwargs):
+    """
+    This method finds the shortest evolution time for which
+    `grape_schroedinger_discrete` reduces the error to `min_error`
+    by bisecting on the evolution time. Each optimization stops once the error
+    reaches `min_error`, and it is warm started from the best controls of the
+    shortest evolution time found so far. The control and system eval counts
+    are fixed, so those controls are resampled onto the grid of the new
+    evolution time by keeping their values at each control eval step,
+    i.e. the pulse is compressed in time. Costs that are constructed for
+    an evolution time, e.g. `ControlBandwidthMax`, must be reconstructed at each
+    evolution time, so they are specified by a function of the evolution time.
+
+    Args:
+    control_count :: int - See `grape_schroedinger_discrete`.
+    control_eval_count :: int >= 2 - See `grape_schroedinger_discrete`.
+    costs :: iterable(qoc.models.cost.Cost) or
+             (evolution_time :: float) -> iterable(qoc.models.cost.Cost)
+        - This list specifies the cost functions. If any of the costs
+        requires the evolution time, this value must instead be a function
+        that returns the costs for each evolution time.
+    hamiltonian :: (controls :: ndarray (control_count), time :: float)
+                   -> hamiltonian_matrix :: ndarray (hilbert_size x hilbert_size)
+        - See `grape_schroedinger_discrete`.
+    initial_states :: ndarray (state_count x hilbert_size x 1)
+        - See `grape_schroedinger_discrete`.
+    max_evolution_time :: float - This value is the longest evolution time
+        that is considered. It is optimized first, and if the error
+        does not reach `min_error` no other evolution times are considered.
+    min_error :: float - This value is the error below which an evolution time
+        is feasible.
+    system_eval_count :: int >= 2 - See `grape_schroedinger_discrete`.
+
+    initial_controls :: ndarray (control_eval_count x control_count)
+        - This array specifies the initial controls of the optimization
+        at `max_evolution_time`.
+    log_iteration_step :: int - This value determines how often qoc logs
+        the progress of each optimization to stdout. If this value is nonzero,
+        the result of each optimization is also logged.
+        Set this value to 0 to disable logging.
+    min_evolution_time :: float - This value is a lower bound
+        on the shortest evolution time.
+    save_file_path :: str - This is the full path from which the save file
+        of each optimization is derived. The index of the optimization
+        in `result.evolution_times` is appended to the file name,
+        e.g. "./out/foo.h5" becomes "./out/foo_0.h5", "./out/foo_1.h5", ...
+    time_tolerance :: float - The bisection terminates when the shortest
+        feasible evolution time is known to within this value. If it is not
+        specified, it is 1e-2 * `max_evolution_time`.
+    grape_kwargs :: dict - These are the other arguments of
+        `grape_schroedinger_discrete`, which are passed to each optimization.
+        A single save file can not resume the bisection, so `resume_from`
+        is not accepted.
+
+    Returns:
+    result :: qoc.models.schroedingermodels.MinTimeSchroedingerResult
+    """
+    if "resume_from" in grape_kwargs:
+        raise ValueError("The program does not support resume_from, "
+                         "because each evolution time is optimized in its own run.")
+    if callable(costs):
+        get_costs = costs
+    else:
+        for cost in costs:
+            if cost.requires_evolution_time:
+                raise ValueError("The cost {} requires the evolution time, so the "
+                                 "program expected that costs was a function of the "
+                                 "evolution time.".format(cost))
+        #ENDFOR
+        get_costs = lambda evolution_time: costs
+    #ENDIF
+    if time_tolerance is None:
+        time_tolerance = 1e-2 * max_evolution_time
+    result = MinTimeSchroedingerResult()
+
+    def optimize(evolution_time, initial_controls_):
+        if save_file_path is None:
+            save_file_path_ = None
+        else:
+            save_file_root, save_file_extension = os.path.splitext(save_file_path)
+            save_file_path_ = "{}_{}{}".format(save_file_root, len(result.evolution_times),
+                                               save_file_extension)
+        #ENDIF
+        grape_result = grape_schroedinger_discrete(control_count, control_eval_count,
+                                                   get_costs(evolution_time),
+                                                   evolution_time, hamiltonian,
+                                                   initial_states, system_eval_count,
+                                                   initial_controls=initial_controls_,
+                                                   log_iteration_step=log_iteration_step,
+                                                   min_error=min_error,
+                                                   save_file_path=save_file_path_,
+                                                   **grape_kwargs)
+        result.errors.append(grape_result.best_error)
+        result.evolution_times.append(evolution_time)
+        result.save_file_paths.append(save_file_path_)
+        feasible = grape_result.best_error <= min_error
+        if log_iteration_step != 0:
+            print("evolution_time: {:1.8e}, best_error: {:1.8e}, feasible: {}"
+                  "".format(evolution_time, grape_result.best_error, feasible))
+        if feasible:
+            result.best_evolution_time = evolution_time
+            result.best_result = grape_result
+        
+        return feasible
+    #ENDDEF
+
+    # The shortest feasible evolution time lies in (lower, upper].
+    lower = min_evolution_time
+    upper = max_evolution_time
+    if not optimize(upper, initial_controls):
+        return result
+    while upper - lower > time_tolerance:
+        evolution_time = (lower + upper) / 2
+        if optimize(evolution_time, result.best_result.best_controls):
+            upper = evolution_time
+        else:
+            lower = evolution_time
+    #ENDWHILE
+
+    return result
+
+
+def multiresolution_schroedinger_discrete(control_count, control_eval_counts,
+                                          costs, evolution_time, hamiltonian,
+                                          initial_states, system_eval_counts,
+                                          initial_controls=None,
+                                          iteration_counts=1000,
+                                          log_iteration_step=0,
+                                          min_errors=0,
+                                          **grape_kwargs):
+    """
+    This method optimizes the evolution of a set of states under the schroedinger
+    equation with a coarse-to-fine continuation over the resolution of the controls
+    and of the evolution. `grape_schroedinger_discrete` is run at each resolution
+    in turn, from the coarsest to the finest, and each run is warm started from the
+    best controls of the previous run, resampled onto the new control grid.
+    The early iterations, in which the controls are still far from optimal,
+    are thus performed at a fraction of the cost of the finest resolution.
+
+    Args:
+    control_count :: int - See `grape_schroedinger_discrete`.
+    control_eval_counts :: iterable(int >= 2) - These values are the
+        `control_eval_count` of each resolution, from the coarsest to the finest.
+    costs :: iterable(qoc.models.cost.Cost) or
+             (control_eval_count :: int, system_eval_count :: int)
+             -> iterable(qoc.models.cost.Cost)
+        - This list specifies the cost functions. Costs that are constructed for a
+        `control_eval_count` or a `system_eval_count` differ between resolutions, so
+        this value may instead be a function that returns the costs for each resolution.
+    evolution_time :: float - See `grape_schroedinger_discrete`.
+    hamiltonian :: (controls :: ndarray (control_count), time :: float)
+                   -> hamiltonian_matrix :: ndarray (hilbert_size x hilbert_size)
+        - See `grape_schroedinger_discrete`.
+    initial_states :: ndarray (state_count x hilbert_size x 1)
+        - See `grape_schroedinger_discrete`.
+    system_eval_counts :: iterable(int >= 2) - These values are the
+        `system_eval_count` of each resolution, from the coarsest to the finest.
+
+    initial_controls :: ndarray (control_eval_count x control_count)
+        - This array specifies the initial controls. It is resampled onto
+        the coarsest control grid.
+    iteration_counts :: int or iterable(int) - These values are the
+        `iteration_count` of each resolution, or of every resolution.
+    log_iteration_step :: int - See `grape_schroedinger_discrete`.
+    min_errors :: float or iterable(float) - These values are the `min_error`
+        of each resolution, or of every resolution. A loose tolerance at
+        the coarse resolutions avoids converging the controls further than
+        the resolution warrants.
+    grape_kwargs :: dict - These are the other arguments of
+        `grape_schroedinger_discrete`, which are passed to each optimization.
+
+    Returns:
+    result :: qoc.models.schroedingermodels.MultiresolutionSchroedingerResult
+    """
+    resolution_count = len(control_eval_counts)
+    if len(system_eval_counts) != resolution_count:
+        raise ValueError("The program expected that control_eval_counts and "
+                         "system_eval_counts had the same length, but the program "
+                         "found {} and {}."
+                         "".format(resolution_count, len(system_eval_counts)))
+    iteration_counts = np.broadcast_to(iteration_counts, resolution_count)
+    min_errors = np.broadcast_to(min_errors, resolution_count)
+    result = MultiresolutionSchroedingerResult()
+
+    controls = initial_controls
+    for i in range(resolution_count):
+        control_eval_count = control_eval_counts[i]
+        system_eval_count = system_eval_counts[i]
+        # Resample the controls onto the control grid of this resolution.
+        if controls is not None:
+            controls = resample_controls(controls, control_eval_count)
+        if callable(costs):
+            costs_ = costs(control_eval_count, system_eval_count)
+        else:
+            costs_ = costs
+        if log_iteration_step != 0:
+            print("control_eval_count: {}, system_eval_count: {}"
+                  "".format(control_eval_count, system_eval_count))
+        grape_result = grape_schroedinger_discrete(control_count, control_eval_count,
+                                                   costs_, evolution_time, hamiltonian,
+                                                   initial_states, system_eval_count,
+                                                   initial_controls=controls,
+                                                   iteration_count=int(iteration_counts[i]),
+                                                   log_iteration_step=log_iteration_step,
+                                                   min_error=min_errors[i],
+                                                   **grape_kwargs)
+        result.results.append(grape_result)
+        controls = grape_result.best_controls
+    #ENDFOR
+    result.best_result = result.results[-1]
 
     return result
 
@@ -268,18 +872,30 @@ def _esd_wrap(controls, pstate, reporter, result):
     Returns:
     error
     """
-    # Convert the controls from optimizer format to cost function format.
-    controls = slap_controls(pstate.complex_controls, controls,
-                             pstate.controls_shape)
-    # Rescale the controls to their maximum norm.
-    clip_control_norms(controls,
-                       pstate.max_control_norms)
-    # Impose user boundary conditions.
-    if pstate.impose_control_conditions:
-        controls = pstate.impose_control_conditions(controls)
+    # The jacobian wrapper computes the error too, so reuse it if the optimizer
+    # has already evaluated the jacobian at these controls.
+    if (reporter.last_controls is not None
+        and np.array_equal(controls, reporter.last_controls)):
+        error = reporter.last_error
+    else:
+        # Convert the controls from optimizer format to cost function format.
+        controls = slap_controls(pstate.complex_controls, controls,
+                                 pstate.controls_shape,
+                                 pstate.control_basis)
+        # Rescale the controls to their maximum norm.
+        clip_control_norms(controls,
+                           pstate.max_control_norms)
+        # Impose user boundary conditions.
+        if pstate.impose_control_conditions:
+            controls = pstate.impose_control_conditions(controls)
 
-    # Evaluate the cost function.
-    error = _evaluate_schroedinger_discrete(controls, pstate, reporter)
+        # Evaluate the cost function.
+        error = _evaluate_schroedinger_discrete(controls, pstate, reporter)
+        # The costs that depend only on the controls are evaluated outside of the evolution.
+        control_error, _ = evaluate_control_costs(pstate.control_costs, controls,
+                                                  pstate.final_system_eval_step)
+        error = error + control_error
+    #ENDIF
 
     # Determine if optimization should terminate.
     if error <= pstate.min_error:
@@ -304,9 +920,14 @@ def _esdj_wrap(controls, pstate, reporter, result):
     Returns:
     grads
     """
+    # Key the error cache on the controls in optimizer format.
+    optimizer_controls = np.copy(controls)
+    # Save a checkpoint to resume the optimization from this iteration.
+    pstate.save_checkpoint(optimizer_controls, reporter.iteration, result)
     # Convert the controls from optimizer format to cost function format.
     controls = slap_controls(pstate.complex_controls, controls,
-                             pstate.controls_shape)
+                             pstate.controls_shape,
+                             pstate.control_basis)
     # Rescale the controls to their maximum norm.
     clip_control_norms(controls,
                        pstate.max_control_norms)
@@ -314,24 +935,38 @@ def _esdj_wrap(controls, pstate, reporter, result):
     if pstate.impose_control_conditions is not None:
         controls = pstate.impose_control_conditions(controls)
 
-    # Evaluate the jacobian.
-    error, grads = (ans_jacobian(_evaluate_schroedinger_discrete, 0)
-                          (controls, pstate, reporter))
+    if pstate.batch_size is None:
+        # Evaluate the jacobian.
+        error, grads = (ans_jacobian(_evaluate_schroedinger_discrete, 0)
+                        (controls, pstate, reporter))
+        # The states need to be unwrapped from their autograd box.
+        if isinstance(reporter.final_states, Box):
+            final_states = reporter.final_states._value
+        else:
+            final_states = reporter.final_states
+    else:
+        error, grads, final_states = _evaluate_batch(controls, pstate, reporter)
+    # The costs that depend only on the controls are differentiated outside of the evolution.
+    control_error, control_grads = evaluate_control_costs(pstate.control_costs, controls,
+                                                          pstate.final_system_eval_step)
+    error = error + control_error
+    grads = grads + control_grads
+    # The error of a mini-batch is not the error of the controls, so it is not
+    # reused as the function value.
+    if pstate.batch_size is None:
+        reporter.last_controls = optimizer_controls
+        reporter.last_error = error
     # Autograd defines the derivative of a function of complex inputs as
     # df_dz = du_dx - i * du_dy for z = x + iy, f(z) = u(x, y) + iv(x, y).
     # For optimization, we care about df_dz = du_dx + i * du_dy.
     if pstate.complex_controls:
         grads = np.conjugate(grads)
 
-    # The states need to be unwrapped from their autograd box.
-    if isinstance(reporter.final_states, Box):
-        final_states = reporter.final_states._value
-    else:
-        final_states = reporter.final_states
-
     # Update best configuration.
     if error < result.best_error:
-        result.best_controls = controls
+        # The controls may share memory with an optimizer
+        # that updates its params in place.
+        result.best_controls = np.copy(controls)
         result.best_error = error
         result.best_final_states = final_states
         result.best_iteration = reporter.iteration
@@ -342,6 +977,10 @@ def _esdj_wrap(controls, pstate, reporter, result):
     reporter.iteration += 1
 
     # Convert the gradients from cost function to optimizer format.
+    # The gradients with respect to the coefficients are those with respect to
+    # the controls mapped through the transpose of the basis.
+    if pstate.control_basis is not None:
+        grads = np.matmul(np.transpose(pstate.control_basis), grads)
     grads = strip_controls(pstate.complex_controls, grads)
 
     # Determine if optimization should terminate.
@@ -353,6 +992,309 @@ def _esdj_wrap(controls, pstate, reporter, result):
     return grads, terminate
 
 
+def _esdh_wrap(controls, vector, pstate, reporter, result):
+    """
+    Do intermediary work between the optimizer feeding controls
+    and a vector to the hessian-vector product of _evaluate_schroedinger_discrete.
+    The second derivatives are taken by differentiating the backward pass
+    of the evolution. The controls are rescaled to their maximum norm
+    as they are in `_esd_wrap` and `_esdj_wrap`, so the hessian is that of
+    the function that the optimizer minimizes.
+
+    Args:
+    controls
+    vector
+    pstate
+    reporter
+    result
+
+    Returns:
+    hessian_vector_product
+    """
+    # The evolutions performed for the hessian-vector product are not
+    # optimization iterations, so they should not be saved.
+    hessian_reporter = Dummy()
+    hessian_reporter.iteration = pstate.final_iteration + 1
+    
+    def evaluate(controls_):
+        # Convert the controls from optimizer format to cost function format.
+        controls_ = slap_controls(pstate.complex_controls, controls_,
+                                  pstate.controls_shape,
+                                  pstate.control_basis)
+        # Rescale the controls to their maximum norm.
+        controls_ = rescale_control_norms(controls_, pstate.max_control_norms)
+        # Impose user boundary conditions.
+        if pstate.impose_control_conditions is not None:
+            controls_ = pstate.impose_control_conditions(controls_)
+        
+        # Evaluate the cost function.
+        error = _evaluate_schroedinger_discrete(controls_, pstate, hessian_reporter)
+        for cost in pstate.control_costs:
+            error = error + cost.cost(controls_, None, pstate.final_system_eval_step)
+        #ENDFOR
+        
+        return error
+    #ENDDEF
+
+    # The gradient is taped once for each set of controls. Because the hessian
+    # is symmetric, the hessian-vector product for each vector is a backward pass
+    # over that tape. Differentiating with respect to the controls in optimizer format
+    # yields the hessian in optimizer format.
+    if (reporter.hessian_controls is None
+        or not np.array_equal(controls, reporter.hessian_controls)):
+        reporter.hessian_controls = np.copy(controls)
+        reporter.hessian_vjp, _ = make_vjp(grad(evaluate))(controls)
+    hessian_vector_product = reporter.hessian_vjp(vector)
+
+    return hessian_vector_product
+
+
+def _esgd_wrap(params, pstate, reporter, result):
+    """
+    Do intermediary work between the optimizer feeding params
+    to _evaluate_goat_schroedinger_discrete.
+
+    Args:
+    params
+    pstate
+    reporter
+    result
+
+    Returns:
+    error
+    """
+    # The jacobian wrapper computes the error too, so reuse it if the optimizer
+    # has already evaluated the jacobian at these params.
+    if (reporter.last_params is not None
+        and np.array_equal(params, reporter.last_params)):
+        error = reporter.last_error
+    else:
+        error, _, _ = _evaluate_goat_schroedinger_discrete(params, pstate,
+                                                           sensitivities=False)
+
+    # Determine if optimization should terminate.
+    if error <= pstate.min_error:
+        terminate = True
+    else:
+        terminate = False
+
+    return error, terminate
+
+
+def _esgdj_wrap(params, pstate, reporter, result):
+    """
+    Do intermediary work between the optimizer feeding params to 
+    the jacobian of _evaluate_goat_schroedinger_discrete.
+
+    Args:
+    params
+    pstate
+    reporter
+    result
+
+    Returns:
+    grads
+    """
+    # The params may share memory with an optimizer
+    # that updates its params in place.
+    params = np.copy(params)
+    error, grads, final_states = _evaluate_goat_schroedinger_discrete(params, pstate)
+    reporter.last_params = params
+    reporter.last_error = error
+
+    # Update best configuration.
+    if error < result.best_error:
+        result.best_error = error
+        result.best_final_states = final_states
+        result.best_iteration = reporter.iteration
+        result.best_params = params
+
+    # Save and log optimization progress.
+    pstate.log_and_save(error, final_states, grads, reporter.iteration, params)
+    reporter.iteration += 1
+
+    # Determine if optimization should terminate.
+    if error <= pstate.min_error:
+        terminate = True
+    else:
+        terminate = False
+
+    return grads, terminate
+
+
+def _evaluate_goat_schroedinger_discrete(params, pstate, sensitivities=True):
+    """
+    Compute the value of the total cost function for one evolution and,
+    by propagating the derivatives of the states with respect to the params
+    alongside the states, its gradients with respect to the params.
+    For each system step, the derivative of the magnus expansion is computed
+    with autograd's forward mode, and the derivative of its exponential
+    is its Frechet derivative.
+
+    Arguments:
+    params :: ndarray (param_count) - the parameters of the pulse
+    pstate :: qoc.models.GoatSchroedingerDiscreteState - static objects
+    sensitivities :: bool - whether or not to propagate the derivatives
+
+    Returns:
+    error :: float - total error of the evolution
+    grads :: ndarray (param_count) - the gradients of the error
+        with respect to the params, None if `sensitivities` is False
+    final_states :: ndarray (state_count x hilbert_size x 1)
+        - the states at the final system step
+    """
+    # Initialize local variables (heap -> stack).
+    dt = pstate.dt
+    final_system_eval_step = pstate.final_system_eval_step
+    hamiltonian = pstate.hamiltonian
+    magnus_policy = pstate.magnus_policy
+    param_count = pstate.param_count
+    pulse = pstate.pulse
+    param_directions = np.eye(param_count)
+    states = pstate.initial_states.astype(np.complex128)
+    if sensitivities:
+        dstates_dparams = np.zeros((param_count, *states.shape), dtype=np.complex128)
+    if magnus_policy == MagnusPolicy.M2:
+        magnus = magnus_m2
+    elif magnus_policy == MagnusPolicy.M4:
+        magnus = magnus_m4
+    elif magnus_policy == MagnusPolicy.M6:
+        magnus = magnus_m6
+    else:
+        raise ValueError("Unrecognized magnus policy {}."
+                         "".format(magnus_policy))
+    #ENDIF
+
+    # Evolve the states and their derivatives to `evolution_time`.
+    for system_eval_step in range(final_system_eval_step):
+        time = system_eval_step * dt
+        def get_magnus(params_):
+            get_hamiltonian = lambda time_: -1j * hamiltonian(pulse(params_, time_), time_)
+            return magnus(get_hamiltonian, dt, time)
+        #ENDDEF
+        if sensitivities:
+            magnus_jvp = make_jvp(get_magnus)(params)
+            for i in range(param_count):
+                magnus_, dmagnus_dparam = magnus_jvp(param_directions[i])
+                step_unitary, dstep_unitary_dparam = expm_frechet(magnus_, dmagnus_dparam)
+                # d(U psi) = dU psi + U dpsi
+                dstates_dparams[i] = (np.matmul(dstep_unitary_dparam, states)
+                                      + np.matmul(step_unitary, dstates_dparams[i]))
+            #ENDFOR
+        else:
+            step_unitary = expm(get_magnus(params))
+        states = np.matmul(step_unitary, states)
+    #ENDFOR
+
+    # Compute the costs and their gradients with respect to the params.
+    error = 0
+    grads = np.zeros(param_count) if sensitivities else None
+    for cost in pstate.costs:
+        cost_error, _, dcost_dstates = cost.cost_and_grad(None, states,
+                                                          final_system_eval_step)
+        error = error + cost_error
+        # For real params, d error = Re(sum(dcost_dstates * dstates))
+        # in autograd's convention.
+        if sensitivities:
+            grads = grads + np.real(np.sum(dcost_dstates * dstates_dparams,
+                                           axis=tuple(range(1, dstates_dparams.ndim))))
+    #ENDFOR
+
+    return error, grads, states
+
+
+def _evaluate_batch(controls, pstate, reporter):
+    """
+    Compute the error and its gradients for a mini-batch of the initial states.
+    If variance reduction is enabled, the error and gradients are corrected
+    with those of all the initial states at the last snapshot of the controls.
+    On the iterations that refresh the snapshot, the error and gradients
+    of all the initial states are returned without evaluating a mini-batch.
+
+    Arguments:
+    controls :: ndarray (control_eval_count x control_count)
+        - the control parameters
+    pstate :: qoc.GrapeSchroedingerDiscreteState - static objects
+    reporter :: any - a reporter for mutable objects
+
+    Returns:
+    error :: float - the estimate of the total error of the evolution
+    grads :: ndarray (control_eval_count x control_count) - the estimate
+        of the gradients of the total error with respect to the controls
+    final_states :: ndarray (state_count x hilbert_size x 1) - the final states
+        of the mini-batch, the final states of the other states are NaN
+        unless the snapshot was refreshed
+    """
+    if pstate.variance_reduction_step != 0:
+        # The evolutions performed for the snapshot are not
+        # optimization iterations, so they should not be saved.
+        snapshot_reporter = Dummy()
+        snapshot_reporter.iteration = pstate.final_iteration + 1
+        # When the snapshot is refreshed, it is taken at the current controls,
+        # so the correction of the mini-batch vanishes, and the estimate
+        # is the error and gradients of all the initial states.
+        if (reporter.snapshot_controls is None
+            or np.mod(reporter.iteration, pstate.variance_reduction_step) == 0):
+            reporter.snapshot_controls = np.copy(controls)
+            reporter.snapshot_error, reporter.snapshot_grads = (
+                ans_jacobian(_evaluate_schroedinger_discrete, 0)
+                (controls, pstate, snapshot_reporter))
+            final_states = snapshot_reporter.final_states
+            if isinstance(final_states, Box):
+                final_states = final_states._value
+            #ENDIF
+            return reporter.snapshot_error, reporter.snapshot_grads, final_states
+        #ENDIF
+    #ENDIF
+
+    state_count = pstate.initial_states.shape[0]
+    # The mini-batch is sampled with the global random state so that
+    # it is restored with the other random state on resume.
+    batch_indices = np.sort(np.random.choice(state_count, pstate.batch_size,
+                                             replace=False))
+    batch_pstate = _get_batch_pstate(pstate, batch_indices)
+    error, grads = (ans_jacobian(_evaluate_schroedinger_discrete, 0)
+                    (controls, batch_pstate, reporter))
+    batch_final_states = reporter.final_states
+    if isinstance(batch_final_states, Box):
+        batch_final_states = batch_final_states._value
+    final_states = np.full(pstate.initial_states.shape, np.nan,
+                           dtype=batch_final_states.dtype)
+    final_states[batch_indices] = batch_final_states
+
+    if pstate.variance_reduction_step != 0:
+        snapshot_batch_error, snapshot_batch_grads = (
+            ans_jacobian(_evaluate_schroedinger_discrete, 0)
+            (reporter.snapshot_controls, batch_pstate, snapshot_reporter))
+        error = error - snapshot_batch_error + reporter.snapshot_error
+        grads = grads - snapshot_batch_grads + reporter.snapshot_grads
+    #ENDIF
+
+    return error, grads, final_states
+
+
+def _get_batch_pstate(pstate, batch_indices):
+    """
+    Get a program state that evolves a mini-batch of the initial states.
+
+    Arguments:
+    pstate :: qoc.GrapeSchroedingerDiscreteState - static objects
+    batch_indices :: ndarray (batch_size) - the indices of the initial states
+        in the mini-batch
+
+    Returns:
+    batch_pstate :: qoc.GrapeSchroedingerDiscreteState - a shallow copy
+        of `pstate` whose initial states and costs are those of the mini-batch
+    """
+    batch_pstate = copy(pstate)
+    batch_pstate.costs = [cost.subset(batch_indices) for cost in pstate.costs]
+    batch_pstate.initial_states = pstate.initial_states[batch_indices]
+    batch_pstate.save_intermediate_states_ = False
+    batch_pstate.step_costs = [cost.subset(batch_indices) for cost in pstate.step_costs]
+
+    return batch_pstate
+
+
 def _evaluate_schroedinger_discrete(controls, pstate, reporter):
     """
     Compute the value of the total cost function for one evolution.
@@ -411,7 +1353,7 @@ def _evaluate_schroedinger_discrete(controls, pstate, reporter):
         # Compute step costs every `cost_step`.
         if is_cost_step and not is_first_system_eval_step:
             for i, step_cost in enumerate(step_costs):
-                cost_error = step_cost.cost(controls, states, system_eval_step)
+                cost_error = evaluate_cost(step_cost, controls, states, system_eval_step)
                 error = error + cost_error
             #ENDFOR
 
@@ -427,8 +1369,8 @@ def _evaluate_schroedinger_discrete(controls, pstate, reporter):
 
     # Compute non-step-costs.
     for i, cost in enumerate(costs):
-        if not cost.requires_step_evaluation:
-            cost_error = cost.cost(controls, states, final_system_eval_step)
+        if cost.requires_states and not cost.requires_step_evaluation:
+            cost_error = evaluate_cost(cost, controls, states, final_system_eval_step)
             error = error + cost_error
 
     # Report reults.
@@ -438,6 +1380,147 @@ def _evaluate_schroedinger_discrete(controls, pstate, reporter):
     return error
 
 
+def _krotov_backward(controls, final_costates, pstate):
+    """
+    Propagate the costates backward under the controls.
+
+    Arguments:
+    controls :: ndarray (control_eval_count x control_count)
+        - the control parameters
+    final_costates :: ndarray (state_count x hilbert_size x 1)
+        - the costates at the final system step
+    pstate :: qoc.models.KrotovSchroedingerDiscreteState - static objects
+
+    Returns:
+    costates :: ndarray (system_eval_count x state_count x hilbert_size x 1)
+        - the costates at each system step
+    """
+    # Initialize local variables (heap -> stack).
+    control_eval_times = pstate.control_eval_times
+    dt = pstate.dt
+    final_system_eval_step = pstate.final_system_eval_step
+    hamiltonian = pstate.hamiltonian
+    interpolation_policy = pstate.interpolation_policy
+    magnus_policy = pstate.magnus_policy
+    costates = np.zeros((pstate.system_eval_count, *final_costates.shape),
+                        dtype=np.complex128)
+    costates[final_system_eval_step] = final_costates
+
+    for system_eval_step in range(final_system_eval_step - 1, -1, -1):
+        time = system_eval_step * dt
+        step_unitary = _get_step_unitary_schroedinger_discrete(dt, hamiltonian, time,
+                                                               control_eval_times=control_eval_times,
+                                                               controls=controls,
+                                                               interpolation_policy=interpolation_policy,
+                                                               magnus_policy=magnus_policy,)
+        costates[system_eval_step] = matmuls(conjugate_transpose(step_unitary),
+                                             costates[system_eval_step + 1])
+    #ENDFOR
+
+    return costates
+
+
+def _krotov_costates(controls, final_states, pstate):
+    """
+    Compute the error of the final states and the costates
+    chi = -d error / d <psi| at the final system step.
+
+    Arguments:
+    controls :: ndarray (control_eval_count x control_count)
+        - the control parameters
+    final_states :: ndarray (state_count x hilbert_size x 1)
+        - the states at the final system step
+    pstate :: qoc.models.KrotovSchroedingerDiscreteState - static objects
+
+    Returns:
+    error :: float - the total error of the evolution
+    final_costates :: ndarray (state_count x hilbert_size x 1)
+        - the costates at the final system step
+    """
+    error = 0
+    dcost_dstates = np.zeros_like(final_states)
+    for cost in pstate.costs:
+        cost_error, _, dcost_dstates_ = cost.cost_and_grad(controls, final_states,
+                                                           pstate.final_system_eval_step)
+        error = error + cost_error
+        dcost_dstates = dcost_dstates + dcost_dstates_
+    #ENDFOR
+    # Autograd's gradient du_dx - i * du_dy is twice the conjugate
+    # of the derivative with respect to the bra.
+    final_costates = -np.conjugate(dcost_dstates) / 2
+
+    return error, final_costates
+
+
+def _krotov_forward(controls, costates, pstate):
+    """
+    Propagate the states forward and update the controls sequentially.
+
+    Arguments:
+    controls :: ndarray (control_eval_count x control_count)
+        - the control parameters, which are updated in place
+    costates :: ndarray (system_eval_count x state_count x hilbert_size x 1)
+        - the costates at each system step under the controls,
+        if None the controls are not updated
+    pstate :: qoc.models.KrotovSchroedingerDiscreteState - static objects
+
+    Returns:
+    controls :: ndarray (control_eval_count x control_count)
+        - the updated control parameters
+    final_states :: ndarray (state_count x hilbert_size x 1)
+        - the states at the final system step under the updated controls
+    """
+    # Initialize local variables (heap -> stack).
+    control_eval_times = pstate.control_eval_times
+    control_update_steps = pstate.control_update_steps
+    dt = pstate.dt
+    final_system_eval_step = pstate.final_system_eval_step
+    hamiltonian = pstate.hamiltonian
+    interpolation_policy = pstate.interpolation_policy
+    magnus_policy = pstate.magnus_policy
+    update_scale = 2 * pstate.update_shape / pstate.lambda_a
+    states = pstate.initial_states
+
+    for system_eval_step in range(final_system_eval_step):
+        time = system_eval_step * dt
+        # Update the controls that this system step is the first to depend on.
+        # Because the controls are updated in order, they form a slice.
+        update_indices = np.flatnonzero(control_update_steps == system_eval_step)
+        if costates is not None and update_indices.size != 0:
+            start = update_indices[0]
+            stop = update_indices[-1] + 1
+            next_costates = costates[system_eval_step + 1]
+            # To first order, the error decreases by twice the increase
+            # of Re <chi(t + dt)|U(t + dt, t)|psi(t)>.
+            def step_overlap(update_controls):
+                controls_ = anp.concatenate((controls[:start], update_controls,
+                                             controls[stop:]))
+                states_ = _evolve_step_schroedinger_discrete(dt, hamiltonian,
+                                                             states, time,
+                                                             control_eval_times=control_eval_times,
+                                                             controls=controls_,
+                                                             interpolation_policy=interpolation_policy,
+                                                             magnus_policy=magnus_policy,)
+                return anp.real(anp.sum(anp.conjugate(next_costates) * states_))
+            #ENDDEF
+            update_grads = grad(step_overlap)(controls[start:stop])
+            # For complex controls, the direction of steepest ascent
+            # is the conjugate of autograd's gradient.
+            controls[start:stop] = (controls[start:stop]
+                                    + update_scale[start:stop] * np.conjugate(update_grads))
+            clip_control_norms(controls, pstate.max_control_norms)
+        #ENDIF
+        states = _evolve_step_schroedinger_discrete(dt, hamiltonian,
+                                                    states, time,
+                                                    control_eval_times=control_eval_times,
+                                                    controls=controls,
+                                                    interpolation_policy=interpolation_policy,
+                                                    magnus_policy=magnus_policy,)
+    #ENDFOR
+
+    return controls, states
+
+
 def _evolve_step_schroedinger_discrete(dt, hamiltonian,
                                        states, time,
                                        control_eval_times=None,
@@ -464,6 +1547,39 @@ def _evolve_step_schroedinger_discrete(dt, hamiltonian,
     Returns:
     states
     """
+    step_unitary = _get_step_unitary_schroedinger_discrete(dt, hamiltonian, time,
+                                                           control_eval_times=control_eval_times,
+                                                           controls=controls,
+                                                           interpolation_policy=interpolation_policy,
+                                                           magnus_policy=magnus_policy,)
+    states = matmuls(step_unitary, states)
+
+    return states
+
+
+def _get_step_unitary_schroedinger_discrete(dt, hamiltonian, time,
+                                            control_eval_times=None,
+                                            controls=None,
+                                            interpolation_policy=InterpolationPolicy.LINEAR,
+                                            magnus_policy=MagnusPolicy.M2,):
+    """
+    Use the exponential series method via magnus expansion to compute the
+    propagator from `time` to `time` + `dt` under the schroedinger equation
+    for time-discrete controls.
+
+    Arguments:
+    dt
+    hamiltonian
+    time
+
+    control_eval_times
+    controls
+    interpolation_policy
+    magnus_policy
+    
+    Returns:
+    step_unitary
+    """
     # Choose an interpolator.
     if interpolation_policy == InterpolationPolicy.LINEAR:
         interpolate = interpolate_linear_set
@@ -497,6 +1613,5 @@ def _evolve_step_schroedinger_discrete(dt, hamiltonian,
     #ENDIF
 
     step_unitary = expm(magnus)
-    states = matmuls(step_unitary, states)
 
-    return states
+    return step_unitary
@@ -3,35 +3,49 @@ models - a directory for qoc's data models
 """
 
 from .cost import Cost
+from .densitypolicy import DensityPolicy
 from .dummy import Dummy
+from .integrationpolicy import IntegrationPolicy
 from .interpolationpolicy import InterpolationPolicy
 from .lindbladmodels import (EvolveLindbladDiscreteState,
                              EvolveLindbladResult,
+                             EvolveLindbladTrajectoriesState,
                              GrapeLindbladDiscreteState,
                              GrapeLindbladResult,)
 from .magnuspolicy import MagnusPolicy
 from .operationpolicy import OperationPolicy
 from .performancepolicy import PerformancePolicy
 from .programtype import ProgramType
-from .programstate import ProgramState
+from .programstate import ProgramState, load_checkpoint
 from .schroedingermodels import (EvolveSchroedingerDiscreteState,
                                  EvolveSchroedingerResult,
+                                 GoatSchroedingerDiscreteState,
+                                 GoatSchroedingerResult,
                                  GrapeSchroedingerDiscreteState,
-                                 GrapeSchroedingerResult,)
+                                 GrapeSchroedingerResult,
+                                 KrotovSchroedingerDiscreteState,
+                                 MinTimeSchroedingerResult,
+                                 MultiresolutionSchroedingerResult,)
 
 __all__ = [
-    "Cost", "Dummy", "InterpolationPolicy",
+    "Cost", "DensityPolicy", "Dummy", "IntegrationPolicy", "InterpolationPolicy",
     "EvolveLindbladDiscreteState",
     "EvolveLindbladResult",
+    "EvolveLindbladTrajectoriesState",
     "GrapeLindbladDiscreteState",
     "GrapeLindbladResult",
     "MagnusPolicy",
     "OperationPolicy",
     "PerformancePolicy",
-    "ProgramType", "ProgramState",
+    "ProgramType", "ProgramState", "load_checkpoint",
     "EvolveSchroedingerDiscreteState",
     "EvolveSchroedingerResult",
+    "GoatSchroedingerDiscreteState",
+    "GoatSchroedingerResult",
     "GrapeSchroedingerDiscreteState",
     "GrapeSchroedingerResult",
+    "KrotovSchroedingerDiscreteState",
+    "MinTimeSchroedingerResult",
+    "MultiresolutionSchroedingerResult",
 ]
 
@@ -2,6 +2,9 @@
 cost.py - This module defines the parent cost function class.
 """
 
+from autograd import value_and_grad
+import autograd.numpy as anp
+
 class Cost(object):
     """
     This class is the parent class for all cost functions.
@@ -9,12 +12,21 @@ class Cost(object):
     Fields:
     cost_multiplier :: float - the weight factor for this cost
     name :: str - a unique identifier for this cost
+    requires_evolution_time :: bool - True if the cost is constructed for
+                                      a fixed evolution time, in which case
+                                      it must be reconstructed if the evolution
+                                      time changes
+    requires_states :: bool - True if the cost depends on the evolved states,
+                              False if it depends only on the controls, in which
+                              case it is evaluated outside of the evolution
     requires_step_evaluation :: bool - True if the cost needs to be computed
                                        at each optimization time step, False
                                        if it should be computed only at the
                                        final optimization time step
     """
     name = "parent_cost"
+    requires_evolution_time = False
+    requires_states = True
     requires_step_evaluation = False
     
     def __init__(self, cost_multiplier=1.):
@@ -33,7 +45,7 @@ class Cost(object):
         return self.__str__()
 
         
-    def cost(params, states, step):
+    def cost(self, params, states, step):
         """
         an autograd compatible function (https://github.com/HIPS/autograd)
         to compute the cost at each pulse time step given the pulse time step,
@@ -49,3 +61,81 @@ class Cost(object):
         """
         raise NotImplementedError("The cost {} has not implemented an evaluation function."
                                   "".format(self))
+
+
+    def cost_and_grad(self, controls, states, system_eval_step):
+        """
+        Compute the cost and its gradients with respect to the controls
+        and the states. The gradients follow autograd's convention for
+        complex arguments, i.e. dcost_dz = du_dx - i * du_dy for z = x + iy.
+        This implementation differentiates `cost` with autograd. Costs that
+        have closed form gradients should override it.
+
+        Arguments:
+        controls :: numpy.ndarray - the control parameters for all time steps
+        states :: numpy.ndarray - an array of the initial states evolved to the
+            current time step
+        system_eval_step :: int - the system time step
+
+        Returns:
+        cost :: float - the cost for the given parameters, states, and time step
+        dcost_dcontrols :: numpy.ndarray - the gradient of the cost with respect
+            to `controls`, None if `controls` is None
+        dcost_dstates :: numpy.ndarray - the gradient of the cost with respect
+            to `states`, None if `states` is None
+        """
+        argnums = tuple(argnum for argnum, arg in enumerate((controls, states))
+                        if arg is not None)
+        if len(argnums) == 0:
+            return self.cost(controls, states, system_eval_step), None, None
+
+        cost, grads = (value_and_grad(self.cost, argnums)
+                       (controls, states, system_eval_step))
+        grads = dict(zip(argnums, grads))
+
+        return cost, grads.get(0), grads.get(1)
+
+
+    def cost_low_rank(self, controls, density_factors, system_eval_step):
+        """
+        an autograd compatible function to compute the cost from the factors
+        v of the densities p = v v^dagger. This implementation forms the
+        densities and calls `cost`. Costs that can be computed from the
+        factors directly should override it.
+
+        Arguments:
+        controls :: numpy.ndarray - the control parameters for all time steps
+        density_factors :: numpy.ndarray (density_count x hilbert_size x rank)
+            - the factors of the densities evolved to the current time step
+        system_eval_step :: int - the system time step
+
+        Returns:
+        cost :: float - the cost for the given parameters, densities, and time step
+        """
+        densities = anp.matmul(density_factors,
+                               anp.conjugate(anp.swapaxes(density_factors, -1, -2)))
+
+        return self.cost(controls, densities, system_eval_step)
+
+
+    def subset(self, indices):
+        """
+        Get this cost for a subset of the evolving states (or densities),
+        e.g. for a mini-batch. The subset cost is normalized for the number
+        of states in the subset, so that for uniformly sampled subsets it is
+        an unbiased estimate of this cost. Costs that do not depend on the
+        states are returned as they are. Costs that depend on the states
+        should override this method.
+
+        Arguments:
+        indices :: numpy.ndarray (subset_count) - the indices of the states
+            in the subset
+
+        Returns:
+        cost :: qoc.models.cost.Cost - the cost for the subset of the states
+        """
+        if not self.requires_states:
+            return self
+
+        raise NotImplementedError("The cost {} can not be evaluated on a subset "
+                                  "of the states.".format(self))
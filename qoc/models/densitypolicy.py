@@ -0,0 +1,38 @@
+"""
+densitypolicy.py - a module to define a class to encapsulate the choice
+of how density matrices are stored and propagated
+"""
+
+from enum import Enum
+
+class DensityPolicy(Enum):
+    """a class to encapsulate the choice of how density matrices
+    are stored and propagated
+
+    FULL - the density matrices are complex hilbert_size x hilbert_size arrays
+    HERMITIAN_PACKED - the density matrices are packed into hilbert_size ** 2 reals:
+        the real part of the diagonal and the strict upper triangle followed by the
+        imaginary part of the strict upper triangle. The packed densities are
+        written to the save file, and the MAGNUS and SDIRK2 integration policies
+        propagate them under a real superoperator. This representation
+        assumes that the hamiltonian is hermitian.
+    LOW_RANK - each density matrix is propagated as a factor V with p = V V^dagger,
+        where V has hilbert_size rows and a small rank that is truncated
+        adaptively at each step. This representation requires the EXPONENTIAL_EULER
+        integration policy, and costs are computed from the factors.
+    """
+    FULL = 1
+    HERMITIAN_PACKED = 2
+    LOW_RANK = 3
+
+    def __str__(self):
+        if self.value == 1:
+            return "density_full"
+        elif self.value == 2:
+            return "density_hermitian_packed"
+        else:
+            return "density_low_rank"
+
+
+    def __repr__(self):
+        return self.__str__()
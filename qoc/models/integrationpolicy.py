@@ -0,0 +1,43 @@
+"""
+integrationpolicy.py - a module to define a class to encapsulate the choice
+of the method used to integrate the lindblad equation
+"""
+
+from enum import Enum
+
+class IntegrationPolicy(Enum):
+    """a class to encapsulate the choice of the method used to integrate
+    the lindblad equation
+
+    RKDP5 - adaptive Runge-Kutta Dormand-Prince 5(4) integration of the
+        density matrices
+    MAGNUS - exponentiation of the magnus expansion of the lindbladian
+        superoperator acting on the vectorized density matrices
+    RK4 - one classical fourth order Runge-Kutta step per system_eval step
+    EXPONENTIAL_EULER - one exponential (Lawson) Euler step per system_eval step,
+        which propagates the effective hamiltonian exactly and the jump
+        terms to first order
+    SDIRK2 - one L-stable implicit Runge-Kutta step per system_eval step
+        on the vectorized density matrices, for stiff dissipative systems
+    """
+    RKDP5 = 1
+    MAGNUS = 2
+    RK4 = 3
+    EXPONENTIAL_EULER = 4
+    SDIRK2 = 5
+
+    def __str__(self):
+        if self.value == 1:
+            return "integration_rkdp5"
+        elif self.value == 2:
+            return "integration_magnus"
+        elif self.value == 3:
+            return "integration_rk4"
+        elif self.value == 4:
+            return "integration_exponential_euler"
+        else:
+            return "integration_sdirk2"
+
+
+    def __repr__(self):
+        return self.__str__()
@@ -8,6 +8,8 @@ from filelock import FileLock, Timeout
 import h5py
 import numpy as np
 
+from qoc.models.densitypolicy import DensityPolicy
+from qoc.models.integrationpolicy import IntegrationPolicy
 from qoc.models.programtype import ProgramType
 from qoc.models.programstate import (GrapeState, ProgramState,)
 
@@ -17,19 +19,28 @@ class EvolveLindbladDiscreteState(ProgramState):
     qoc.core.lindbladdiscrete.evolve_lindblad_discrete program.
 
     Fields:
+    control_cost_indices
+    control_costs
     control_eval_count
     control_eval_times
     cost_eval_step
     costs
+    density_policy
     dt
     evolution_time
     final_system_eval_step
     hamiltonian
     initial_densities
+    initial_density_factors
+    integration_policy
     interpolation_policy
     lindblad_data
+    magnus_policy
     method
     program_type
+    rank_tolerance
+    save_densities_dtype
+    save_densities_shape
     save_file_lock_path
     save_file_path
     save_intermediate_densities_
@@ -40,9 +51,10 @@ class EvolveLindbladDiscreteState(ProgramState):
     method = "evolve_lindblad_discrete"
     
     def __init__(self, control_eval_count, cost_eval_step, costs,
-                 evolution_time, hamiltonian, initial_densities,
-                 interpolation_policy,
-                 lindblad_data, save_file_path, save_intermediate_densities_,
+                 density_policy, evolution_time, hamiltonian, initial_densities,
+                 integration_policy, interpolation_policy,
+                 lindblad_data, magnus_policy, rank_tolerance,
+                 save_file_path, save_intermediate_densities_,
                  system_eval_count):
         """
         See class fields for arguments not listed here.
@@ -51,8 +63,18 @@ class EvolveLindbladDiscreteState(ProgramState):
                          evolution_time, hamiltonian, interpolation_policy,
                          ProgramType.EVOLVE,
                          save_file_path, system_eval_count)
+        self.density_policy = density_policy
         self.initial_densities = initial_densities
+        self.integration_policy = integration_policy
+        self.initial_density_factors = _get_initial_density_factors(density_policy,
+                                                                    initial_densities,
+                                                                    rank_tolerance)
         self.lindblad_data = lindblad_data
+        self.magnus_policy = magnus_policy
+        self.rank_tolerance = rank_tolerance
+        (self.save_densities_shape,
+         self.save_densities_dtype) = _get_save_densities_layout(density_policy,
+                                                                 initial_densities)
         self.save_intermediate_densities_ = (save_intermediate_densities_
                                              and save_file_path is not None)
 
@@ -69,15 +91,20 @@ class EvolveLindbladDiscreteState(ProgramState):
                     with h5py.File(self.save_file_path, "w") as save_file:
                         save_file["controls"] = controls
                         save_file["cost_eval_step"] = self.cost_eval_step
-                        save_file["costs"] = np.array(["{}".format(cost)
+                        save_file["costs"] = np.array([np.string_("{}".format(cost))
                                                        for cost in self.costs])
+                        save_file["density_policy"] = "{}".format(self.density_policy)
                         save_file["evolution_time"] = self.evolution_time
                         save_file["initial_densities"] = self.initial_densities
+                        save_file["integration_policy"] = "{}".format(self.integration_policy)
                         save_file["interpolation_policy"] = "{}".format(self.interpolation_policy)
+                        save_file["magnus_policy"] = "{}".format(self.magnus_policy)
+                        if self.rank_tolerance is not None:
+                            save_file["rank_tolerance"] = self.rank_tolerance
                         if self.save_intermediate_densities_:
                             save_file["intermediate_densities"] = np.zeros((self.system_eval_count,
-                                                                            *self.initial_densities.shape),
-                                                                           dtype=np.complex128)
+                                                                            *self.save_densities_shape),
+                                                                           dtype=self.save_densities_dtype)
                         save_file["method"] = self.method
                         save_file["program_type"] = self.program_type.value
                         save_file["system_eval_count"] = self.system_eval_count
@@ -102,6 +129,97 @@ class EvolveLindbladDiscreteState(ProgramState):
                   "".format(self.save_file_lock_path, system_eval_step))
 
 
+class EvolveLindbladTrajectoriesState(EvolveLindbladDiscreteState):
+    """
+    This class encapsulates data fields that are used by the
+    qoc.core.lindbladtrajectories.evolve_lindblad_trajectories program.
+
+    Fields:
+    control_cost_indices
+    control_costs
+    control_eval_count
+    control_eval_times
+    cost_eval_step
+    costs
+    density_policy
+    dt
+    evolution_time
+    final_system_eval_step
+    hamiltonian
+    initial_densities
+    initial_density_factors
+    initial_states
+    integration_policy
+    interpolation_policy
+    lindblad_data
+    magnus_policy
+    method
+    program_type
+    rank_tolerance
+    save_densities_dtype
+    save_densities_shape
+    save_file_lock_path
+    save_file_path
+    save_intermediate_densities_
+    seed
+    step_cost_indices
+    step_costs
+    system_eval_count
+    trajectory_batch_size
+    trajectory_count
+    trajectory_step_multiplier
+    """
+    method = "evolve_lindblad_trajectories"
+
+    def __init__(self, control_eval_count, cost_eval_step, costs,
+                 evolution_time, hamiltonian, initial_states,
+                 interpolation_policy,
+                 lindblad_data, magnus_policy,
+                 save_file_path, save_intermediate_densities_,
+                 seed, system_eval_count, trajectory_batch_size,
+                 trajectory_count, trajectory_step_multiplier,):
+        """
+        See class fields for arguments not listed here.
+        """
+        initial_densities = np.matmul(initial_states,
+                                      np.conjugate(np.swapaxes(initial_states, -1, -2)))
+        super().__init__(control_eval_count, cost_eval_step, costs,
+                         DensityPolicy.FULL, evolution_time, hamiltonian, initial_densities,
+                         IntegrationPolicy.MAGNUS, interpolation_policy,
+                         lindblad_data, magnus_policy, None,
+                         save_file_path, save_intermediate_densities_,
+                         system_eval_count)
+        self.initial_states = initial_states
+        self.seed = seed
+        if trajectory_batch_size is None:
+            trajectory_batch_size = trajectory_count
+        self.trajectory_batch_size = trajectory_batch_size
+        self.trajectory_count = trajectory_count
+        self.trajectory_step_multiplier = trajectory_step_multiplier
+
+
+    def save_initial(self, controls):
+        """
+        Perform the initial save.
+        """
+        super().save_initial(controls)
+        if self.save_file_path is not None:
+            try:
+                with FileLock(self.save_file_lock_path):
+                    with h5py.File(self.save_file_path, "a") as save_file:
+                        save_file["initial_states"] = self.initial_states
+                        if self.seed is not None:
+                            save_file["seed"] = self.seed
+                        save_file["trajectory_count"] = self.trajectory_count
+                        save_file["trajectory_step_multiplier"] = self.trajectory_step_multiplier
+                    #ENDWITH
+                #ENDWITH
+            except Timeout:
+                print("Timeout while locking {}."
+                      "".format(self.save_file_lock_path))
+        #ENDIF
+
+
 class EvolveLindbladResult(object):
     """
     This class encapsulates the result of the
@@ -129,6 +247,9 @@ class GrapeLindbladDiscreteState(GrapeState):
 
     Fields:
     complex_controls
+    control_basis
+    control_cost_indices
+    control_costs
     control_count
     control_eval_count
     control_eval_times
@@ -144,15 +265,21 @@ class GrapeLindbladDiscreteState(GrapeState):
     impose_control_conditions
     initial_controls
     initial_densities
+    initial_density_factors
+    integration_policy
     interpolation_policy
     iteration_count
     lindblad_data
     log_iteration_step
+    magnus_policy
     max_control_norms
     method
     min_error
     optimizer
     program_type
+    rank_tolerance
+    save_densities_dtype
+    save_densities_shape
     save_file_lock_path
     save_file_path
     save_intermediate_densities_
@@ -168,16 +295,16 @@ class GrapeLindbladDiscreteState(GrapeState):
 
     def __init__(self,
                  complex_controls,
-                 control_count,
+                 control_basis, control_count,
                  control_eval_count, cost_eval_step, costs,
-                 evolution_time, hamiltonian,
+                 density_policy, evolution_time, hamiltonian,
                  impose_control_conditions,
                  initial_controls,
-                 initial_densities,
+                 initial_densities, integration_policy,
                  interpolation_policy, iteration_count,
                  lindblad_data,
-                 log_iteration_step, max_control_norms,
-                 min_error, optimizer,
+                 log_iteration_step, magnus_policy, max_control_norms,
+                 min_error, optimizer, rank_tolerance,
                  save_file_path, save_intermediate_densities_,
                  save_iteration_step,
                  system_eval_count,):
@@ -185,7 +312,7 @@ class GrapeLindbladDiscreteState(GrapeState):
         See class fields for arguments not listed here.
         """
         super().__init__(complex_controls,
-                 control_count,
+                 control_basis, control_count,
                  control_eval_count, cost_eval_step, costs,
                  evolution_time, hamiltonian,
                  impose_control_conditions,
@@ -195,9 +322,19 @@ class GrapeLindbladDiscreteState(GrapeState):
                  min_error, optimizer,
                  save_file_path, save_iteration_step,
                  system_eval_count,)
+        self.density_policy = density_policy
         self.hilbert_size = initial_densities[0].shape[0]
         self.initial_densities = initial_densities
+        self.integration_policy = integration_policy
+        self.initial_density_factors = _get_initial_density_factors(density_policy,
+                                                                    initial_densities,
+                                                                    rank_tolerance)
         self.lindblad_data = lindblad_data
+        self.magnus_policy = magnus_policy
+        self.rank_tolerance = rank_tolerance
+        (self.save_densities_shape,
+         self.save_densities_dtype) = _get_save_densities_layout(density_policy,
+                                                                 initial_densities)
         self.save_intermediate_densities_ = (self.should_save and
                                              save_intermediate_densities_)
     
@@ -251,18 +388,25 @@ class GrapeLindbladDiscreteState(GrapeState):
                       "".format(self.save_file_lock_path, iteration))
 
 
-    def log_and_save_initial(self):
+    def log_and_save_initial(self, resume=False):
         """
         Perform the initial log and save.
+
+        Arguments:
+        resume :: bool - whether or not the optimization run is resuming
+            from a checkpoint in the save file, in which case the save file
+            is continued rather than overwritten
         """
-        if self.should_save:
+        if self.should_save and resume:
+            print("QOC is resuming this optimization run in {}."
+                  "".format(self.save_file_path))
+        elif self.should_save:
             # Notify the user where the file is being saved.
             print("QOC is saving this optimization run to {}."
                   "".format(self.save_file_path))
 
             save_count, save_count_remainder = np.divmod(self.iteration_count,
                                                          self.save_iteration_step)
-            density_count = len(self.initial_densities)
             # If the final iteration doesn't fall on a save step, add a save step.
             if save_count_remainder != 0:
                 save_count += 1
@@ -281,9 +425,10 @@ class GrapeLindbladDiscreteState(GrapeState):
                                                             for cost in self.costs])
                         save_file["error"] = np.repeat(np.finfo(np.float64).max, save_count)
                         save_file["evolution_time"]= self.evolution_time
-                        save_file["final_densities"] = np.zeros((save_count, density_count,
-                                                                 self.hilbert_size, self.hilbert_size),
-                                                                dtype=np.complex128)
+                        save_file["density_policy"] = "{}".format(self.density_policy)
+                        save_file["final_densities"] = np.zeros((save_count,
+                                                                 *self.save_densities_shape),
+                                                                dtype=self.save_densities_dtype)
                         save_file["grads"] = np.zeros((save_count, self.control_eval_count,
                                                        self.control_count), dtype=self.initial_controls.dtype)
                         save_file["initial_controls"] = self.initial_controls
@@ -291,14 +436,17 @@ class GrapeLindbladDiscreteState(GrapeState):
                         if self.save_intermediate_densities_:
                             save_file["intermediate_densities"] = np.zeros((save_count,
                                                                             self.system_eval_count,
-                                                                            *self.initial_densities.shape),
-                                                                           dtype=np.complex128)
+                                                                            *self.save_densities_shape),
+                                                                           dtype=self.save_densities_dtype)
+                        save_file["integration_policy"] = "{}".format(self.integration_policy)
                         save_file["interpolation_policy"] = "{}".format(self.interpolation_policy)
                         save_file["iteration_count"] = self.iteration_count
+                        save_file["magnus_policy"] = "{}".format(self.magnus_policy)
                         save_file["max_control_norms"] = self.max_control_norms
                         save_file["method"] = self.method
                         save_file["optimizer"] = "{}".format(self.optimizer)
                         save_file["program_type"] = self.program_type.value
+                        save_file["rank_tolerance"] = self.rank_tolerance
                         save_file["system_eval_count"] = self.system_eval_count
                     #ENDWITH
                 #ENDWITH
@@ -331,7 +479,7 @@ class GrapeLindbladDiscreteState(GrapeState):
             try:
                 with FileLock(self.save_file_lock_path):
                     with h5py.File(self.save_file_path, "a") as save_file:
-                        save_file["intermediate_densities"][iteration, system_eval_step, :, :, :] = densities.astype(np.complex128)
+                        save_file["intermediate_densities"][save_step, system_eval_step] = densities
             except Timeout:
                 print("Timeout while locking {} while saving intermediate densities on iteration {} and "
                       "system_eval_step {}."
@@ -363,3 +511,54 @@ class GrapeLindbladResult(object):
         self.best_error = best_error
         self.best_final_densities = best_final_densities
         self.best_iteration = best_iteration
+
+
+def _get_initial_density_factors(density_policy, initial_densities, rank_tolerance):
+    """
+    Factor the initial densities as p = v v^dagger if they are propagated
+    in low rank form. The eigenvectors whose weights are below `rank_tolerance`
+    are dropped, and all of the factors share the largest remaining rank.
+
+    Arguments:
+    density_policy :: qoc.models.densitypolicy.DensityPolicy
+    initial_densities :: ndarray (density_count x hilbert_size x hilbert_size)
+    rank_tolerance :: float
+
+    Returns:
+    initial_density_factors :: ndarray (density_count x hilbert_size x rank)
+        - the factors, or None if `density_policy` is not LOW_RANK
+    """
+    if density_policy != DensityPolicy.LOW_RANK:
+        return None
+
+    eigenvalues, eigenvectors = np.linalg.eigh(initial_densities)
+    eigenvalues = np.maximum(eigenvalues, 0)
+    weights = eigenvalues / np.sum(eigenvalues, axis=-1, keepdims=True)
+    rank = max(1, np.max(np.sum(weights > rank_tolerance, axis=-1)))
+    initial_density_factors = (eigenvectors[..., -rank:]
+                               * np.sqrt(eigenvalues[..., None, -rank:]))
+
+    return initial_density_factors
+
+
+def _get_save_densities_layout(density_policy, initial_densities):
+    """
+    Determine the shape and data type that the densities are saved with.
+
+    Arguments:
+    density_policy :: qoc.models.densitypolicy.DensityPolicy
+    initial_densities :: ndarray (density_count x hilbert_size x hilbert_size)
+
+    Returns:
+    save_densities_shape :: tuple(int)
+    save_densities_dtype :: numpy.dtype
+    """
+    density_count, hilbert_size, _ = np.shape(initial_densities)
+    if density_policy == DensityPolicy.HERMITIAN_PACKED:
+        save_densities_shape = (density_count, hilbert_size ** 2)
+        save_densities_dtype = np.float64
+    else:
+        save_densities_shape = (density_count, hilbert_size, hilbert_size)
+        save_densities_dtype = np.complex128
+
+    return save_densities_shape, save_densities_dtype
@@ -3,9 +3,11 @@ programstate.py - This module defines classes to encapsulate data fields
 necessary to execute qoc programs.
 """
 
-from filelock import FileLock
+from filelock import FileLock, Timeout
+import h5py
 import numpy as np
 
+from qoc.models.dummy import Dummy
 from qoc.models.programtype import ProgramType
 
 class ProgramState(object):
@@ -14,6 +16,8 @@ class ProgramState(object):
     by most programs.
 
     Fields:
+    control_cost_indices
+    control_costs
     control_eval_count
     control_eval_times
     cost_eval_step
@@ -49,13 +53,22 @@ class ProgramState(object):
         self.program_type = program_type
         self.save_file_lock_path = "{}.lock".format(save_file_path)
         self.save_file_path = save_file_path
+        control_cost_indices = list()
+        control_costs = list()
         step_cost_indices = list()
         step_costs = list()
         for i, cost in enumerate(costs):
-            if cost.requires_step_evaluation:
+            # Costs that depend only on the controls are evaluated
+            # outside of the evolution.
+            if not (cost.requires_states or cost.requires_step_evaluation):
+                control_costs.append(cost)
+                control_cost_indices.append(i)
+            elif cost.requires_step_evaluation:
                 step_costs.append(cost)
                 step_cost_indices.append(i)
         #ENDFOR
+        self.control_cost_indices = control_cost_indices
+        self.control_costs = control_costs
         self.step_cost_indices = step_cost_indices
         self.step_costs = step_costs
         self.system_eval_count = system_eval_count
@@ -68,6 +81,9 @@ class GrapeState(ProgramState):
     
     Fields:
     complex_controls
+    control_basis
+    control_cost_indices
+    control_costs
     control_count
     control_eval_count
     control_eval_times
@@ -99,7 +115,7 @@ class GrapeState(ProgramState):
     """
 
     def __init__(self, complex_controls,
-                 control_count,
+                 control_basis, control_count,
                  control_eval_count, cost_eval_step, costs,
                  evolution_time, hamiltonian,
                  impose_control_conditions,
@@ -116,7 +132,13 @@ class GrapeState(ProgramState):
                          evolution_time, hamiltonian, interpolation_policy,
                          ProgramType.GRAPE,
                          save_file_path, system_eval_count,)
+        if control_basis is not None and control_basis.shape[0] != control_eval_count:
+            raise ValueError("The program expected that the control_basis had "
+                             "control_eval_count={} rows, but the program found "
+                             "a control_basis of shape {}."
+                             "".format(control_eval_count, control_basis.shape))
         self.complex_controls = complex_controls
+        self.control_basis = control_basis
         self.control_count = control_count
         self.controls_shape = (control_eval_count, control_count)
         self.final_iteration = iteration_count - 1
@@ -131,3 +153,107 @@ class GrapeState(ProgramState):
         self.should_log = log_iteration_step != 0
         self.should_save = ((save_iteration_step != 0)
                             and (not (save_file_path is None)))
+
+
+    def save_checkpoint(self, controls, iteration, result):
+        """
+        If necessary, save everything that is needed to resume the optimization
+        at `iteration` to the "checkpoint" group of the save file.
+        The checkpoint replaces the previous checkpoint. It is saved
+        before `iteration` is evaluated, so it holds the best result
+        of the preceding iterations.
+
+        Arguments:
+        controls :: ndarray - the controls in optimizer format that
+            the optimizer is evaluating at `iteration`
+        iteration :: int - the optimization iteration
+        result :: any - the result of the program, whose fields
+            that are not None are saved
+
+        Returns: none
+        """
+        if (not self.should_save
+            or iteration > self.final_iteration
+            or np.mod(iteration, self.save_iteration_step) != 0):
+            return
+
+        # Optimizers that expose their internal state may continue exactly
+        # where they left off, others restart from the saved controls.
+        if hasattr(self.optimizer, "get_state"):
+            optimizer_state = self.optimizer.get_state()
+        else:
+            optimizer_state = dict()
+        _, rng_keys, rng_position, rng_has_gauss, rng_cached_gaussian = np.random.get_state()
+        try:
+            with FileLock(self.save_file_lock_path):
+                with h5py.File(self.save_file_path, "a") as save_file:
+                    # Write the new checkpoint completely before the old one is removed.
+                    if _CHECKPOINT_NEXT in save_file:
+                        del save_file[_CHECKPOINT_NEXT]
+                    checkpoint = save_file.create_group(_CHECKPOINT_NEXT)
+                    checkpoint["controls"] = controls
+                    checkpoint["iteration"] = iteration
+                    checkpoint_optimizer = checkpoint.create_group("optimizer")
+                    for name, value in optimizer_state.items():
+                        checkpoint_optimizer[name] = value
+                    #ENDFOR
+                    checkpoint_result = checkpoint.create_group("result")
+                    for name, value in vars(result).items():
+                        if value is not None:
+                            checkpoint_result[name] = value
+                    #ENDFOR
+                    checkpoint["rng_cached_gaussian"] = rng_cached_gaussian
+                    checkpoint["rng_has_gauss"] = rng_has_gauss
+                    checkpoint["rng_keys"] = rng_keys
+                    checkpoint["rng_position"] = rng_position
+                    if _CHECKPOINT in save_file:
+                        del save_file[_CHECKPOINT]
+                    save_file.move(_CHECKPOINT_NEXT, _CHECKPOINT)
+                #ENDWITH
+            #ENDWITH
+        except Timeout:
+            print("Timeout while locking {} to save a checkpoint before iteration {}."
+                  "".format(self.save_file_lock_path, iteration))
+
+
+_CHECKPOINT = "checkpoint"
+_CHECKPOINT_NEXT = "checkpoint_next"
+
+
+def load_checkpoint(file_path):
+    """
+    Load the checkpoint of an optimization from its save file.
+
+    Arguments:
+    file_path :: str - the save file of the optimization to resume
+
+    Returns:
+    checkpoint :: qoc.models.dummy.Dummy - an object with the fields
+        `controls`, the controls in optimizer format at `iteration`,
+        `iteration`, the optimization iteration to resume at,
+        `optimizer_state`, the internal state of the optimizer,
+        `result`, a dict of the fields of the result at `iteration`, and
+        `rng_state`, the state of numpy's global random number generator
+    """
+    with h5py.File(file_path, "r") as save_file:
+        if _CHECKPOINT not in save_file:
+            raise ValueError("The program expected that the save file {} "
+                             "contained a checkpoint, but the program did not "
+                             "find one. Checkpoints are saved every "
+                             "save_iteration_step iterations."
+                             "".format(file_path))
+        saved_checkpoint = save_file[_CHECKPOINT]
+        checkpoint = Dummy()
+        checkpoint.controls = saved_checkpoint["controls"][()]
+        checkpoint.iteration = int(saved_checkpoint["iteration"][()])
+        checkpoint.optimizer_state = {name: value[()] for name, value
+                                      in saved_checkpoint["optimizer"].items()}
+        checkpoint.result = {name: value[()] for name, value
+                             in saved_checkpoint["result"].items()}
+        checkpoint.rng_state = ("MT19937", saved_checkpoint["rng_keys"][()],
+                                int(saved_checkpoint["rng_position"][()]),
+                                int(saved_checkpoint["rng_has_gauss"][()]),
+                                float(saved_checkpoint["rng_cached_gaussian"][()]))
+    #ENDWITH
+
+    return checkpoint
@@ -19,6 +19,8 @@ class EvolveSchroedingerDiscreteState(ProgramState):
     program.
     
     Fields:
+    control_cost_indices
+    control_costs
     control_eval_count
     control_eval_times
     cost_eval_step
@@ -138,7 +140,11 @@ class GrapeSchroedingerDiscreteState(GrapeState):
     program.
 
     Fields:
+    batch_size
     complex_controls
+    control_basis
+    control_cost_indices
+    control_costs
     control_count
     control_eval_count
     control_eval_times
@@ -172,10 +178,11 @@ class GrapeSchroedingerDiscreteState(GrapeState):
     step_cost_indices
     step_costs
     system_eval_count
+    variance_reduction_step
     """
     method = "grape_schroedinger_discrete"
 
-    def __init__(self, complex_controls, control_count,
+    def __init__(self, batch_size, complex_controls, control_basis, control_count,
                  control_eval_count, cost_eval_step, costs,
                  evolution_time, hamiltonian,
                  impose_control_conditions,
@@ -185,11 +192,11 @@ class GrapeSchroedingerDiscreteState(GrapeState):
                  magnus_policy, min_error, optimizer,
                  save_file_path, save_intermediate_states_,
                  save_iteration_step,
-                 system_eval_count,):
+                 system_eval_count, variance_reduction_step,):
         """
         See class fields for arguments not listed here.
         """
-        super().__init__(complex_controls, control_count,
+        super().__init__(complex_controls, control_basis, control_count,
                          control_eval_count, cost_eval_step, costs,
                          evolution_time, hamiltonian,
                          impose_control_conditions,
@@ -199,11 +206,19 @@ class GrapeSchroedingerDiscreteState(GrapeState):
                          min_error, optimizer,
                          save_file_path, save_iteration_step,
                          system_eval_count,)
+        state_count = initial_states.shape[0]
+        if batch_size is not None and not (1 <= batch_size <= state_count):
+            raise ValueError("The program expected that the batch_size was "
+                             "between 1 and the number of initial_states, but "
+                             "the program found batch_size={} and {} initial_states."
+                             "".format(batch_size, state_count))
+        self.batch_size = batch_size
         self.hilbert_size = initial_states[0].shape[0]
         self.initial_states = initial_states
         self.magnus_policy = magnus_policy
         self.save_intermediate_states_ = (self.should_save
                                           and save_intermediate_states_)
+        self.variance_reduction_step = variance_reduction_step
 
 
     def log_and_save(self, controls, error, final_states, grads, iteration,):
@@ -255,11 +270,19 @@ class GrapeSchroedingerDiscreteState(GrapeState):
                       "".format(self.save_file_lock_path, iteration))
 
 
-    def log_and_save_initial(self):
+    def log_and_save_initial(self, resume=False):
         """
         Perform the initial log and save.
+
+        Arguments:
+        resume :: bool - whether or not the optimization run is resuming
+            from a checkpoint in the save file, in which case the save file
+            is continued rather than overwritten
         """
-        if self.should_save:
+        if self.should_save and resume:
+            print("QOC is resuming this optimization run in {}."
+                  "".format(self.save_file_path))
+        elif self.should_save:
             # Notify the user where the file is being saved.
             print("QOC is saving this optimization run to {}."
                   "".format(self.save_file_path))
@@ -344,6 +367,115 @@ class GrapeSchroedingerDiscreteState(GrapeState):
         #ENDIF
 
 
+class KrotovSchroedingerDiscreteState(GrapeSchroedingerDiscreteState):
+    """
+    This class encapsulates the data fields used by the
+    qoc.core.schroedingerdiscrete.krotov_schroedinger_discrete
+    program.
+
+    Fields:
+    complex_controls
+    control_cost_indices
+    control_costs
+    control_count
+    control_eval_count
+    control_eval_times
+    control_update_steps
+    controls_shape
+    cost_eval_step
+    costs
+    dt
+    evolution_time
+    final_iteration
+    final_system_eval_step
+    hamiltonian
+    hilbert_size
+    initial_controls
+    initial_states
+    interpolation_policy
+    iteration_count
+    lambda_a
+    log_iteration_step
+    max_control_norms
+    magnus_policy
+    method
+    min_error
+    program_type
+    save_file_lock_path
+    save_file_path
+    save_iteration_step
+    should_log
+    should_save
+    step_cost_indices
+    step_costs
+    system_eval_count
+    update_shape
+    """
+    method = "krotov_schroedinger_discrete"
+
+    def __init__(self, complex_controls, control_count,
+                 control_eval_count, costs,
+                 evolution_time, hamiltonian,
+                 initial_controls,
+                 initial_states, interpolation_policy, iteration_count,
+                 lambda_a, log_iteration_step, max_control_norms,
+                 magnus_policy, min_error,
+                 save_file_path, save_iteration_step,
+                 system_eval_count, update_shape,):
+        """
+        See class fields for arguments not listed here.
+        """
+        super().__init__(None, complex_controls, None, control_count,
+                         control_eval_count, 1, costs,
+                         evolution_time, hamiltonian,
+                         None, initial_controls,
+                         initial_states, interpolation_policy, iteration_count,
+                         log_iteration_step, max_control_norms,
+                         magnus_policy, min_error, None,
+                         save_file_path, False,
+                         save_iteration_step,
+                         system_eval_count, 0,)
+        for cost in costs:
+            if cost.requires_step_evaluation or not cost.requires_states:
+                raise ValueError("The program expected that all costs depend only on "
+                                 "the final states, but the program found the cost {}."
+                                 "".format(cost))
+        #ENDFOR
+        # Each control is updated at the first system step whose evolution
+        # depends on it. A linearly interpolated control affects the
+        # interval between its neighbors.
+        system_eval_times = np.linspace(0, evolution_time, system_eval_count)
+        control_update_steps = np.searchsorted(system_eval_times[1:],
+                                               self.control_eval_times[:-1],
+                                               side="right")
+        self.control_update_steps = np.concatenate(([0], control_update_steps))
+        self.lambda_a = lambda_a
+        self.update_shape = np.broadcast_to(update_shape, self.controls_shape)
+
+
+    def log_and_save_initial(self, resume=False):
+        """
+        Perform the initial log and save.
+
+        Arguments:
+        resume :: bool - whether or not the save file is continued
+            rather than overwritten
+        """
+        super().log_and_save_initial(resume=resume)
+        if self.should_save and not resume:
+            try:
+                with FileLock(self.save_file_lock_path):
+                    with h5py.File(self.save_file_path, "a") as save_file:
+                        save_file["lambda_a"] = self.lambda_a
+                        save_file["update_shape"] = self.update_shape
+                    #ENDWITH
+                #ENDWITH
+            except Timeout:
+                print("Timeout while locking {}, could not perform initial save."
+                      "".format(self.save_file_lock_path))
+        #ENDIF
+
+
 class GrapeSchroedingerResult(object):
     """
     This class encapsulates the result of the
@@ -368,3 +500,265 @@ class GrapeSchroedingerResult(object):
         self.best_error = best_error
         self.best_final_states = best_final_states
         self.best_iteration = best_iteration
+
+
+class GoatSchroedingerDiscreteState(ProgramState):
+    """
+    This class encapsulates the data fields used by the
+    qoc.core.schroedingerdiscrete.goat_schroedinger_discrete
+    program.
+
+    Fields:
+    control_count
+    costs
+    dt
+    evolution_time
+    final_iteration
+    final_system_eval_step
+    hamiltonian
+    hilbert_size
+    initial_params
+    initial_states
+    iteration_count
+    log_iteration_step
+    magnus_policy
+    method
+    min_error
+    optimizer
+    param_bounds
+    param_count
+    program_type
+    pulse
+    save_file_lock_path
+    save_file_path
+    save_iteration_step
+    should_log
+    should_save
+    system_eval_count
+    system_eval_times
+    """
+    method = "goat_schroedinger_discrete"
+
+    def __init__(self, costs, evolution_time, hamiltonian,
+                 initial_params, initial_states, iteration_count,
+                 log_iteration_step, magnus_policy, min_error,
+                 optimizer, param_bounds, pulse,
+                 save_file_path, save_iteration_step,
+                 system_eval_count,):
+        """
+        See class fields for arguments not listed here.
+        """
+        super().__init__(system_eval_count, 1, costs,
+                         evolution_time, hamiltonian, None,
+                         ProgramType.GRAPE,
+                         save_file_path, system_eval_count,)
+        for cost in costs:
+            if cost.requires_step_evaluation or not cost.requires_states:
+                raise ValueError("The program expected that all costs depend only on "
+                                 "the final states, but the program found the cost {}."
+                                 "".format(cost))
+        #ENDFOR
+        self.control_count = np.size(pulse(initial_params, 0.))
+        self.final_iteration = iteration_count - 1
+        self.hilbert_size = initial_states[0].shape[0]
+        self.initial_params = initial_params
+        self.initial_states = initial_states
+        self.iteration_count = iteration_count
+        self.log_iteration_step = log_iteration_step
+        self.magnus_policy = magnus_policy
+        self.min_error = min_error
+        self.optimizer = optimizer
+        self.param_bounds = param_bounds
+        self.param_count = np.size(initial_params)
+        self.pulse = pulse
+        self.save_iteration_step = save_iteration_step
+        self.should_log = log_iteration_step != 0
+        self.should_save = ((save_iteration_step != 0)
+                            and (not (save_file_path is None)))
+        self.system_eval_times = np.linspace(0, evolution_time, system_eval_count)
+
+
+    def log_and_save(self, error, final_states, grads, iteration, params,):
+        """
+        If necessary, log to stdout and save to the save file.
+
+        Arguments:
+        error :: ndarray - the total error at the last time step
+            of evolution
+        final_states :: ndarray - the states at the last time step
+            of evolution
+        grads :: ndarray - the current gradients of the cost function
+            with resepct to params
+        iteration :: int - the optimization iteration
+        params :: ndarray - the optimization parameters
+
+        Returns: none
+        """
+        # Don't log if the iteration number is invalid.
+        if iteration > self.final_iteration:
+            return
+
+        # Determine decision parameters.
+        is_final_iteration = iteration == self.final_iteration
+
+        if (self.should_log
+            and ((np.mod(iteration, self.log_iteration_step) == 0)
+                 or is_final_iteration)):
+            grads_norm = np.linalg.norm(grads)
+            print("{:^6d} | {:^1.8e} | {:^1.8e}"
+                  "".format(iteration, error,
+                            grads_norm))
+
+        if (self.should_save
+            and ((np.mod(iteration, self.save_iteration_step) == 0)
+                 or is_final_iteration)):
+            save_step, _ = np.divmod(iteration, self.save_iteration_step)
+            controls = np.stack([self.pulse(params, time)
+                                 for time in self.system_eval_times]).astype(np.complex128)
+            try:
+                with FileLock(self.save_file_lock_path):
+                    with h5py.File(self.save_file_path, "a") as save_file:
+                        save_file["controls"][save_step,] = controls
+                        save_file["error"][save_step,] = error
+                        save_file["final_states"][save_step,] = final_states
+                        save_file["grads"][save_step,] = grads
+                        save_file["params"][save_step,] = params
+                    #ENDWITH
+                #ENDWITH
+            except Timeout:
+                print("Timeout while locking {} to save after iteration {}."
+                      "".format(self.save_file_lock_path, iteration))
+
+
+    def log_and_save_initial(self):
+        """
+        Perform the initial log and save.
+        """
+        if self.should_save:
+            # Notify the user where the file is being saved.
+            print("QOC is saving this optimization run to {}."
+                  "".format(self.save_file_path))
+
+            save_count, save_count_remainder = np.divmod(self.iteration_count,
+                                                         self.save_iteration_step)
+            state_count = len(self.initial_states)
+            # If the final iteration doesn't fall on a save step, add a save step.
+            if save_count_remainder != 0:
+                save_count += 1
+
+            try:
+                with FileLock(self.save_file_lock_path):
+                    with h5py.File(self.save_file_path, "w") as save_file:
+                        save_file["control_count"] = self.control_count
+                        save_file["control_eval_count"] = self.system_eval_count
+                        # The controls are the pulse evaluated at the system eval times.
+                        save_file["controls"] = np.zeros((save_count, self.system_eval_count,
+                                                          self.control_count,),
+                                                         dtype=np.complex128)
+                        save_file["cost_names"] = np.array([np.string_("{}".format(cost))
+                                                            for cost in self.costs])
+                        save_file["error"] = np.repeat(np.finfo(np.float64).max, save_count)
+                        save_file["evolution_time"]= self.evolution_time
+                        save_file["final_states"] = np.zeros((save_count, state_count,
+                                                              self.hilbert_size, 1),
+                                                             dtype=np.complex128)
+                        save_file["grads"] = np.zeros((save_count, self.param_count))
+                        save_file["initial_params"] = self.initial_params
+                        save_file["initial_states"] = self.initial_states
+                        save_file["iteration_count"] = self.iteration_count
+                        save_file["magnus_policy"] = "{}".format(self.magnus_policy)
+                        save_file["method"] = self.method
+                        save_file["optimizer"] = "{}".format(self.optimizer)
+                        save_file["params"] = np.zeros((save_count, self.param_count))
+                        save_file["program_type"] = self.program_type.value
+                        save_file["system_eval_count"] = self.system_eval_count
+                    #ENDWITH
+                #ENDWITH
+            except Timeout:
+                print("Timeout while locking {}, could not perform initial save."
+                      "".format(self.save_file_lock_path))
+        #ENDIF
+
+        if self.should_log:
+            print("iter   |   total error  |    grads_l2   \n"
+                  "=========================================")
+
+
+class GoatSchroedingerResult(object):
+    """
+    This class encapsulates the result of the
+    qoc.core.schroedingerdiscrete.goat_schroedinger_discrete
+    program.
+
+    Fields:
+    best_error
+    best_final_states
+    best_iteration
+    best_params
+    """
+    def __init__(self, best_error=np.finfo(np.float64).max,
+                 best_final_states=None,
+                 best_iteration=None,
+                 best_params=None,):
+        """
+        See class fields for arguments not listed here.
+        """
+        super().__init__()
+        self.best_error = best_error
+        self.best_final_states = best_final_states
+        self.best_iteration = best_iteration
+        self.best_params = best_params
+
+
+class MinTimeSchroedingerResult(object):
+    """
+    This class encapsulates the result of the
+    qoc.core.schroedingerdiscrete.min_time_schroedinger_discrete
+    program.
+
+    Fields:
+    best_evolution_time :: float - the shortest evolution time at which
+        the error reached `min_error`, None if it was never reached
+    best_result :: qoc.models.schroedingermodels.GrapeSchroedingerResult
+        - the result of the optimization at `best_evolution_time`
+    errors :: list(float) - the best error of each optimization
+    evolution_times :: list(float) - the evolution time of each optimization
+    save_file_paths :: list(str) - the save file of each optimization,
+        None if no save file was specified
+    """
+    def __init__(self, best_evolution_time=None,
+                 best_result=None,
+                 errors=None,
+                 evolution_times=None,
+                 save_file_paths=None,):
+        """
+        See class fields for arguments not listed here.
+        """
+        super().__init__()
+        self.best_evolution_time = best_evolution_time
+        self.best_result = best_result
+        self.errors = list() if errors is None else errors
+        self.evolution_times = list() if evolution_times is None else evolution_times
+        self.save_file_paths = list() if save_file_paths is None else save_file_paths
+
+
+class MultiresolutionSchroedingerResult(object):
+    """
+    This class encapsulates the result of the
+    qoc.core.schroedingerdiscrete.multiresolution_schroedinger_discrete
+    program.
+
+    Fields:
+    best_result :: qoc.models.schroedingermodels.GrapeSchroedingerResult
+        - the result of the optimization at the finest resolution
+    results :: list(qoc.models.schroedingermodels.GrapeSchroedingerResult)
+        - the result of the optimization at each resolution
+    """
+    def __init__(self, best_result=None,
+                 results=None,):
+        """
+        See class fields for arguments not listed here.
+        """
+        super().__init__()
+        self.best_result = best_result
+        self.results = list() if results is None else results
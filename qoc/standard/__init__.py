@@ -19,12 +19,16 @@ from .costs import (ControlArea,
                     TargetStateInfidelityTime,)
 
 from .functions import (commutator, conjugate_transpose,
-                        expm, krons, matmuls,
-                        rms_norm,
+                        expm, expm_multiply, factor_inner_products,
+                        get_chebyshev_basis, get_crab_basis,
+                        get_fourier_basis, get_slepian_basis,
+                        inner_products, krons, matmuls,
+                        pack_hermitian, pack_hermitian_superoperator,
+                        rms_norm, traces, unpack_hermitian,
                         column_vector_list_to_matrix,
                         matrix_to_column_vector_list,)
 
-from .optimizers import (Adam, LBFGSB, SGD,)
+from .optimizers import (Adadelta, Adafactor, Adam, LBFGSB, SGD, TrustNCG,)
 
 from .plot import (plot_controls, plot_density_population,
                    plot_state_population,)
@@ -40,10 +44,13 @@ __all__ = [
     "ForbidStates",
     "TargetDensityInfidelity", "TargetDensityInfidelityTime",
     "TargetStateInfidelity", "TargetStateInfidelityTime",
-    "commutator", "conjugate_transpose", "expm", "krons",
-    "rms_norm",
+    "commutator", "conjugate_transpose", "expm", "expm_multiply",
+    "factor_inner_products", "get_chebyshev_basis", "get_crab_basis",
+    "get_fourier_basis", "get_slepian_basis", "inner_products",
+    "krons", "pack_hermitian", "pack_hermitian_superoperator",
+    "rms_norm", "traces", "unpack_hermitian",
     "matmuls", "column_vector_list_to_matrix", "matrix_to_column_vector_list",
-    "Adam", "LBFGSB", "SGD",
+    "Adadelta", "Adafactor", "Adam", "LBFGSB", "SGD", "TrustNCG",
     "plot_controls", "plot_density_population", "plot_state_population",
     "ans_jacobian", "generate_save_file_path", "CustomJSONEncoder",
 ]
@@ -19,9 +19,11 @@ class ControlArea(Cost):
     cost_multiplier
     max_control_norms
     name
+    requires_states
     requires_step_evaluation
     """
     name = "control_area"
+    requires_states = False
     requires_step_evaluation = False
 
     def __init__(self, control_count,
@@ -55,7 +57,7 @@ class ControlArea(Cost):
         if self.max_control_norms is not None:
             normalized_controls = controls / self.max_control_norms
         else:
-            normalized_control = controls
+            normalized_controls = controls
 
         # The cost is the discrete integral of each normalized control parameter
         # over the evolution time.
@@ -65,3 +67,36 @@ class ControlArea(Cost):
         cost_normalized = cost / self.control_size
 
         return cost_normalized * self.cost_multiplier
+
+
+    def cost_and_grad(self, controls, states, system_eval_step):
+        """
+        Compute the penalty and its gradients.
+
+        Arguments:
+        controls
+        states
+        system_eval_step
+
+        Returns:
+        cost
+        dcost_dcontrols
+        dcost_dstates
+        """
+        if self.max_control_norms is not None:
+            normalized_controls = controls / self.max_control_norms
+            scale = self.cost_multiplier / (self.control_size * self.max_control_norms)
+        else:
+            normalized_controls = controls
+            scale = self.cost_multiplier / self.control_size
+
+        areas = np.sum(normalized_controls, axis=0)
+        area_norms = np.abs(areas)
+        cost = np.sum(area_norms) * self.cost_multiplier / self.control_size
+        # d|a|/da is conj(a) / |a|, which is taken to be zero where a is zero.
+        area_grads = np.divide(np.conjugate(areas), area_norms,
+                               out=np.zeros_like(areas),
+                               where=area_norms != 0)
+        dcost_dcontrols = np.broadcast_to(area_grads * scale, controls.shape).copy()
+
+        return cost, dcost_dcontrols, None
@@ -16,7 +16,14 @@ class ControlBandwidthMax(Cost):
     max_bandwidths :: ndarray (CONTROL_COUNT) - This array contains the maximum allowed bandwidth of each control.
     control_count
     freqs :: ndarray (CONTROL_EVAL_COUNT) - This array contains the frequencies of each of the controls.
+    penalty_counts :: ndarray (CONTROL_COUNT) - the number of penalized frequencies of each control
+    penalty_mask :: ndarray (CONTROL_EVAL_COUNT x CONTROL_COUNT) - True where the frequency of
+        `freqs` exceeds the maximum bandwidth of the control
+    rfft_penalty_mask :: ndarray (CONTROL_EVAL_COUNT // 2 + 1 x CONTROL_COUNT) - `penalty_mask`
+        restricted to the nonnegative frequencies of a real fft
     name
+    requires_evolution_time
+    requires_states
     requires_step_evaluation
     
     Example Usage:
@@ -29,6 +36,8 @@ class ControlBandwidthMax(Cost):
                                  EVOLUTION_TIME, MAX_BANDWIDTHS)]
     """
     name = "control_bandwidth_max"
+    requires_evolution_time = True
+    requires_states = False
     requires_step_evaluation = False
 
     def __init__(self, control_count,
@@ -48,6 +57,13 @@ class ControlBandwidthMax(Cost):
         self.control_count = control_count
         dt = evolution_time / (control_eval_count - 1)
         self.freqs = np.fft.fftfreq(control_eval_count, d=dt)
+        self.penalty_mask = self.freqs[:, None] >= np.asarray(max_bandwidths)[None, :]
+        self.penalty_counts = np.count_nonzero(self.penalty_mask, axis=0)
+        # Only the positive frequencies can be penalized, and for real controls
+        # these are the first `control_eval_count // 2 + 1` entries of the fft.
+        self.rfft_penalty_mask = self.penalty_mask[:control_eval_count // 2 + 1]
+        # Autograd only differentiates the rfft of an even number of samples.
+        self._use_rfft = control_eval_count % 2 == 0
         
     def cost(self, controls, states, system_eval_step):
         """
@@ -61,17 +77,18 @@ class ControlBandwidthMax(Cost):
         Returns:
         cost
         """
-        cost = 0
-        # Iterate over the controls, penalize each control that has
+        # Take the fft of every control at once, penalize each control that has
         # frequencies greater than its maximum frequency.
-        for i, max_bandwidth in enumerate(self.max_bandwidths):
-            control_fft = anp.fft.fft(controls[:, i])
-            control_fft_sq  = anp.abs(control_fft)
-            penalty_freq_indices = anp.nonzero(self.freqs >= max_bandwidth)[0]
-            penalized_ffts = control_fft_sq[penalty_freq_indices]
-            penalty = anp.sum(penalized_ffts)
-            penalty_normalized = penalty / (penalty_freq_indices.shape[0] * anp.max(penalized_ffts))
-            cost = cost + penalty_normalized
-        cost_normalized =  cost / self.control_count
+        if self._use_rfft and not anp.iscomplexobj(controls):
+            controls_fft = anp.fft.rfft(controls, axis=0)
+            penalty_mask = self.rfft_penalty_mask
+        else:
+            controls_fft = anp.fft.fft(controls, axis=0)
+            penalty_mask = self.penalty_mask
+        penalized_ffts = anp.where(penalty_mask, anp.abs(controls_fft), 0)
+        penalties = anp.sum(penalized_ffts, axis=0)
+        penalties_normalized = penalties / (self.penalty_counts
+                                            * anp.max(penalized_ffts, axis=0))
+        cost_normalized = anp.sum(penalties_normalized) / self.control_count
                        
         return cost_normalized * self.cost_multiplier
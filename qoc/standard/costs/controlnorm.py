@@ -22,9 +22,11 @@ class ControlNorm(Cost):
     cost_multiplier
     max_control_norms
     name
+    requires_states
     requires_step_evaluation
     """
     name = "control_norm"
+    requires_states = False
     requires_step_evaluation = False
 
     def __init__(self, control_count,
@@ -71,3 +73,34 @@ class ControlNorm(Cost):
         cost_normalized = cost / self.controls_size
         
         return cost_normalized * self.cost_multiplier
+
+
+    def cost_and_grad(self, controls, states, system_eval_step):
+        """
+        Compute the penalty and its gradients.
+
+        Arguments:
+        controls
+        states
+        system_eval_step
+
+        Returns:
+        cost
+        dcost_dcontrols
+        dcost_dstates
+        """
+        # The cost is linear in the normalized, weighted controls,
+        # so the controls pick up the same scale factor in the gradient.
+        scale = 1
+        if self.max_control_norms is not None:
+            scale = scale / self.max_control_norms
+        if self.control_weights is not None:
+            scale = scale * self.control_weights
+        scaled_controls = controls * scale
+
+        cost = (np.sum(np.real(scaled_controls * np.conjugate(scaled_controls)))
+                * self.cost_multiplier / self.controls_size)
+        dcost_dcontrols = (2 * np.conjugate(scaled_controls) * scale
+                           * self.cost_multiplier / self.controls_size)
+
+        return cost, dcost_dcontrols, None
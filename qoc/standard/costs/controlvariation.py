@@ -20,9 +20,11 @@ class ControlVariation(Cost):
     max_control_norms
     name
     order
+    requires_states
     requires_step_evaluation
     """
     name = "control_variation"
+    requires_states = False
     requires_step_evaluation = False
 
     def __init__(self, control_count,
@@ -56,7 +58,7 @@ class ControlVariation(Cost):
         Returns:
         cost
         """
-        if self.max_control_norms is None:
+        if self.max_control_norms is not None:
             normalized_controls = controls / self.max_control_norms
         else:
             normalized_controls = controls
@@ -73,3 +75,54 @@ class ControlVariation(Cost):
         cost_normalized = cost / self.cost_normalization_constant
 
         return cost_normalized * self.cost_multiplier
+
+
+    def cost_and_grad(self, controls, states, system_eval_step):
+        """
+        Compute the penalty and its gradients.
+
+        Arguments:
+        controls
+        states
+        system_eval_step
+
+        Returns:
+        cost
+        dcost_dcontrols
+        dcost_dstates
+        """
+        if self.max_control_norms is not None:
+            normalized_controls = controls / self.max_control_norms
+        else:
+            normalized_controls = controls
+
+        diffs = np.diff(normalized_controls, axis=0, n=self.order)
+        cost = (np.sum(np.real(diffs * np.conjugate(diffs)))
+                * self.cost_multiplier / self.cost_normalization_constant)
+        # Apply the adjoint of the difference operator `order` times.
+        dcost_dcontrols = 2 * np.conjugate(diffs)
+        for _ in range(self.order):
+            dcost_dcontrols = _diff_adjoint(dcost_dcontrols)
+        dcost_dcontrols = (dcost_dcontrols * self.cost_multiplier
+                           / self.cost_normalization_constant)
+        if self.max_control_norms is not None:
+            dcost_dcontrols = dcost_dcontrols / self.max_control_norms
+
+        return cost, dcost_dcontrols, None
+
+
+def _diff_adjoint(diffs):
+    """
+    Apply the adjoint of numpy.diff(_, axis=0) to `diffs`.
+
+    Arguments:
+    diffs :: ndarray (N - 1 x ...) - the array to apply the adjoint to
+
+    Returns:
+    array :: ndarray (N x ...) - the result
+    """
+    pad_shape = (1, *diffs.shape[1:])
+    pad = np.zeros(pad_shape, dtype=diffs.dtype)
+    padded_diffs = np.concatenate((pad, diffs, pad))
+
+    return -np.diff(padded_diffs, axis=0)
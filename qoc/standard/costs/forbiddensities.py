@@ -3,11 +3,14 @@ forbiddensities.py - This module defines a cost function
 that penalizes the occupation of a set of forbidden densities.
 """
 
+from copy import copy
+
 import autograd.numpy as anp
 import numpy as np
 
 from qoc.models.cost import Cost
-from qoc.standard.functions.convenience import conjugate_transpose
+from qoc.standard.functions.convenience import (factor_inner_products,
+                                                inner_products,)
 
 class ForbidDensities(Cost):
     """
@@ -16,8 +19,8 @@ class ForbidDensities(Cost):
     Fields:
     cost_multiplier
     cost_normalization_constant
+    forbidden_densities
     forbidden_densities_count
-    forbidden_densities_dagger
     hilbert_size
     name
     requires_step_evaluation
@@ -46,7 +49,7 @@ class ForbidDensities(Cost):
         self.forbidden_densities_count = np.array([forbidden_densities_.shape[0]
                                                    for forbidden_densities_
                                                    in forbidden_densities])
-        self.forbidden_densities_dagger = conjugate_transpose(forbidden_densities)
+        self.forbidden_densities = forbidden_densities
         self.hilbert_size = forbidden_densities.shape[3]
 
 
@@ -64,22 +67,89 @@ class ForbidDensities(Cost):
         """
         # The cost is the overlap (fidelity) of the evolved density and each
         # forbidden density.
-        cost = 0
-        for i, forbidden_densities_dagger_ in enumerate(self.forbidden_densities_dagger):
-            density = densities[i]
-            density_cost = 0
-            for forbidden_density_dagger in forbidden_densities_dagger_:
-                inner_product = (anp.trace(anp.matmul(forbidden_density_dagger,
-                                                      density)) / self.hilbert_size)
-                fidelity = anp.real(inner_product * anp.conjugate(inner_product))
-                density_cost = density_cost + fidelity
-            #ENDFOR
-            density_cost_normalized = density_cost / self.forbidden_densities_count[i]
-            cost = cost + density_cost_normalized
-        #ENDFOR
+        inner_products_ = (inner_products(self.forbidden_densities,
+                                          densities[:, None, :, :])
+                           / self.hilbert_size)
+        fidelities = anp.real(inner_products_ * anp.conjugate(inner_products_))
+        density_costs = anp.sum(fidelities, axis=1) / self.forbidden_densities_count
+        cost = anp.sum(density_costs)
         
         # Normalize the cost for the number of evolving densities
         # and the number of times the cost is computed.
         cost_normalized = cost / self.cost_normalization_constant
         
         return cost_normalized * self.cost_multiplier
+
+
+    def cost_and_grad(self, controls, densities, system_eval_step):
+        """
+        Compute the penalty and its gradients.
+
+        Arguments:
+        controls
+        densities
+        system_eval_step
+
+        Returns:
+        cost
+        dcost_dcontrols
+        dcost_ddensities
+        """
+        # inner_products_ has shape (density_count x forbidden_density_count).
+        inner_products_ = (inner_products(self.forbidden_densities,
+                                          densities[:, None, :, :])
+                           / self.hilbert_size)
+        fidelities = np.real(inner_products_ * np.conjugate(inner_products_))
+        weights = (self.cost_multiplier
+                   / (self.forbidden_densities_count * self.cost_normalization_constant))
+        cost = np.sum(np.sum(fidelities, axis=1) * weights)
+        # d|Tr(f^dagger p)|^2/dp is 2 * conj(Tr(f^dagger p)) * conj(f).
+        dcost_ddensities = (np.sum(2 * np.conjugate(inner_products_)[:, :, None, None]
+                                   * np.conjugate(self.forbidden_densities),
+                                   axis=1)
+                            * (weights / self.hilbert_size)[:, None, None])
+
+        return cost, None, dcost_ddensities
+
+
+    def cost_low_rank(self, controls, density_factors, system_eval_step):
+        """
+        Compute the penalty from the factors of the densities.
+
+        Arguments:
+        controls
+        density_factors
+        system_eval_step
+
+        Returns:
+        cost
+        """
+        inner_products_ = (factor_inner_products(self.forbidden_densities,
+                                                 density_factors[:, None, :, :])
+                           / self.hilbert_size)
+        fidelities = anp.real(inner_products_ * anp.conjugate(inner_products_))
+        density_costs = anp.sum(fidelities, axis=1) / self.forbidden_densities_count
+        cost = anp.sum(density_costs)
+        cost_normalized = cost / self.cost_normalization_constant
+
+        return cost_normalized * self.cost_multiplier
+
+
+    def subset(self, indices):
+        """
+        Get this cost for a subset of the evolving densities.
+
+        Arguments:
+        indices
+
+        Returns:
+        subset_cost
+        """
+        density_count = self.forbidden_densities.shape[0]
+        subset_cost = copy(self)
+        subset_cost.cost_normalization_constant = (self.cost_normalization_constant
+                                                   * len(indices) / density_count)
+        subset_cost.forbidden_densities_count = self.forbidden_densities_count[indices]
+        subset_cost.forbidden_densities = self.forbidden_densities[indices]
+
+        return subset_cost
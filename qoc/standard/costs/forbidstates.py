@@ -3,6 +3,8 @@ forbidstates.py - This module defines a cost function that penalizes
 the occupation of a set of forbidden states.
 """
 
+from copy import copy
+
 import autograd.numpy as anp
 import numpy as np
 
@@ -79,3 +81,52 @@ class ForbidStates(Cost):
         cost_normalized = cost / self.cost_normalization_constant
         
         return cost_normalized * self.cost_multiplier
+
+
+    def cost_and_grad(self, controls, states, system_eval_step):
+        """
+        Compute the penalty and its gradients.
+
+        Arguments:
+        controls
+        states
+        system_eval_step
+
+        Returns:
+        cost
+        dcost_dcontrols
+        dcost_dstates
+        """
+        # inner_products has shape (state_count x forbidden_state_count).
+        inner_products = np.matmul(self.forbidden_states_dagger,
+                                   states[:, None, :, :])[:, :, 0, 0]
+        fidelities = np.real(inner_products * np.conjugate(inner_products))
+        weights = (self.cost_multiplier
+                   / (self.forbidden_states_count * self.cost_normalization_constant))
+        cost = np.sum(np.sum(fidelities, axis=1) * weights)
+        # d|<f|s>|^2/ds is 2 * conj(<f|s>) * conj(|f>).
+        dcost_dstates = np.sum(2 * np.conjugate(inner_products)[:, :, None, None]
+                               * np.swapaxes(self.forbidden_states_dagger, -1, -2),
+                               axis=1) * weights[:, None, None]
+
+        return cost, None, dcost_dstates
+
+
+    def subset(self, indices):
+        """
+        Get this cost for a subset of the evolving states.
+
+        Arguments:
+        indices
+
+        Returns:
+        subset_cost
+        """
+        state_count = self.forbidden_states_dagger.shape[0]
+        subset_cost = copy(self)
+        subset_cost.cost_normalization_constant = (self.cost_normalization_constant
+                                                   * len(indices) / state_count)
+        subset_cost.forbidden_states_count = self.forbidden_states_count[indices]
+        subset_cost.forbidden_states_dagger = self.forbidden_states_dagger[indices]
+
+        return subset_cost
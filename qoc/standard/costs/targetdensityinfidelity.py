@@ -3,11 +3,13 @@ targetdensityinfidelity.py - This module defines a cost function that
 penalizes the infidelity of an evolved density and a target density.
 """
 
+from copy import copy
+
 import autograd.numpy as anp
 import numpy as np
 
 from qoc.models import Cost
-from qoc.standard.functions import conjugate_transpose
+from qoc.standard.functions import factor_inner_products, inner_products
 
 class TargetDensityInfidelity(Cost):
     """
@@ -20,7 +22,7 @@ class TargetDensityInfidelity(Cost):
     hilbert_size
     name
     requires_step_evaluation
-    target_densities_dagger
+    target_densities
     """
     name = "target_density_infidelity"
     requires_step_evaluation = False
@@ -35,7 +37,7 @@ class TargetDensityInfidelity(Cost):
         super().__init__(cost_multiplier=cost_multiplier)
         self.density_count = target_densities.shape[0]
         self.hilbert_size = target_densities.shape[1]
-        self.target_densities_dagger = conjugate_transpose(target_densities)
+        self.target_densities = target_densities
 
 
     def cost(self, controls, densities, sytem_eval_step):
@@ -50,20 +52,80 @@ class TargetDensityInfidelity(Cost):
         Returns:
         cost
         """
-        # The cost is the infidelity of each evolved state and its target state.
-        # NOTE: Autograd doesn't support vjps of anp.trace with axis arguments.
-        # Nor does it support the vjp of anp.einsum(...ii->..., a).
-        # Therefore, we must use a for loop to index the traces.
-        # The following computations are equivalent to:
-        # inner_products = (anp.trace(anp.matmul(self.target_densities_dagger, densities),
-        #                             axis1=-1, axis2=-2) / self.hilbert_size)
-        prods = anp.matmul(self.target_densities_dagger, densities)
-        fidelity_sum = 0
-        for i, prod in enumerate(prods):
-            inner_prod = anp.trace(prod)
-            fidelity = anp.abs(inner_prod)
-            fidelity_sum = fidelity_sum + fidelity
+        # The cost is the infidelity of each evolved density and its target density.
+        inner_products_ = inner_products(self.target_densities, densities)
+        fidelities = anp.abs(inner_products_)
+        fidelity_sum = anp.sum(fidelities)
+        fidelity_normalized = fidelity_sum / (self.density_count * self.hilbert_size)
+        infidelity = 1 - fidelity_normalized
+
+        return infidelity * self.cost_multiplier
+
+
+    def cost_and_grad(self, controls, densities, system_eval_step):
+        """
+        Compute the penalty and its gradients.
+
+        Arguments:
+        controls
+        densities
+        system_eval_step
+
+        Returns:
+        cost
+        dcost_dcontrols
+        dcost_ddensities
+        """
+        inner_products_ = inner_products(self.target_densities, densities)
+        fidelities = np.abs(inner_products_)
+        scale = self.cost_multiplier
+        normalization_constant = self.density_count * self.hilbert_size
+        cost = (1 - np.sum(fidelities) / normalization_constant) * scale
+        # d|Tr(t^dagger p)|/dp is conj(Tr(t^dagger p)) / |Tr(t^dagger p)| * conj(t),
+        # which is taken to be zero where the inner product is zero.
+        phases = np.divide(np.conjugate(inner_products_), fidelities,
+                           out=np.zeros_like(inner_products_),
+                           where=fidelities != 0)
+        dcost_ddensities = ((-scale / normalization_constant)
+                            * phases[:, None, None]
+                            * np.conjugate(self.target_densities))
+
+        return cost, None, dcost_ddensities
+
+
+    def cost_low_rank(self, controls, density_factors, system_eval_step):
+        """
+        Compute the penalty from the factors of the densities.
+
+        Arguments:
+        controls
+        density_factors
+        system_eval_step
+
+        Returns:
+        cost
+        """
+        inner_products_ = factor_inner_products(self.target_densities, density_factors)
+        fidelities = anp.abs(inner_products_)
+        fidelity_sum = anp.sum(fidelities)
         fidelity_normalized = fidelity_sum / (self.density_count * self.hilbert_size)
         infidelity = 1 - fidelity_normalized
 
         return infidelity * self.cost_multiplier
+
+
+    def subset(self, indices):
+        """
+        Get this cost for a subset of the evolving densities.
+
+        Arguments:
+        indices
+
+        Returns:
+        subset_cost
+        """
+        subset_cost = copy(self)
+        subset_cost.density_count = len(indices)
+        subset_cost.target_densities = self.target_densities[indices]
+
+        return subset_cost
@@ -4,11 +4,13 @@ that penalizes the infidelity of evolved densities and their
 respective target densities at each cost evaluation step.
 """
 
+from copy import copy
+
 import autograd.numpy as anp
 import numpy as np
 
 from qoc.models import Cost
-from qoc.standard.functions import conjugate_transpose
+from qoc.standard.functions import factor_inner_products, inner_products
 
 class TargetDensityInfidelityTime(Cost):
     """
@@ -24,7 +26,7 @@ class TargetDensityInfidelityTime(Cost):
     hilbert_size
     name
     requires_step_evaluation
-    target_densities_dagger
+    target_densities
     """
     name = "target_density_infidelity_time"
     requires_step_evaluation = False
@@ -41,7 +43,7 @@ class TargetDensityInfidelityTime(Cost):
         self.cost_eval_count, _ = np.divmod(system_eval_count - 1, cost_eval_step)
         self.density_count = target_densities.shape[0]
         self.hilbert_size = target_densities.shape[1]
-        self.target_densities_dagger = conjugate_transpose(np.stack(target_densities))
+        self.target_densities = np.stack(target_densities)
 
 
     def cost(self, controls, densities, sytem_eval_step):
@@ -57,20 +59,81 @@ class TargetDensityInfidelityTime(Cost):
         cost
         """
         # The cost is the infidelity of each evolved density and its target density.
-        # NOTE: Autograd doesn't support vjps of anp.trace with axis arguments.
-        # Nor does it support the vjp of anp.einsum(...ii->..., a).
-        # Therefore, we must use a for loop to index the traces.
-        # The following computations are equivalent to:
-        # inner_products = (anp.trace(anp.matmul(self.target_densities_dagger, densities),
-        #                             axis1=-1, axis2=-2) / self.hilbert_size)
-        prods = anp.matmul(self.target_densities_dagger, densities)
-        fidelity_sum = 0
-        for i, prod in enumerate(prods):
-            inner_prod = anp.trace(prod)
-            fidelity = anp.abs(inner_prod)
-            fidelity_sum = fidelity_sum + fidelity
+        inner_products_ = inner_products(self.target_densities, densities)
+        fidelities = anp.abs(inner_products_)
+        fidelity_sum = anp.sum(fidelities)
         fidelity_normalized = fidelity_sum / (self.density_count * self.hilbert_size)
         infidelity = 1 - fidelity_normalized
         cost_normalized = infidelity / self.cost_eval_count
 
         return cost_normalized * self.cost_multiplier
+
+
+    def cost_and_grad(self, controls, densities, system_eval_step):
+        """
+        Compute the penalty and its gradients.
+
+        Arguments:
+        controls
+        densities
+        system_eval_step
+
+        Returns:
+        cost
+        dcost_dcontrols
+        dcost_ddensities
+        """
+        inner_products_ = inner_products(self.target_densities, densities)
+        fidelities = np.abs(inner_products_)
+        scale = self.cost_multiplier / self.cost_eval_count
+        normalization_constant = self.density_count * self.hilbert_size
+        cost = (1 - np.sum(fidelities) / normalization_constant) * scale
+        # d|Tr(t^dagger p)|/dp is conj(Tr(t^dagger p)) / |Tr(t^dagger p)| * conj(t),
+        # which is taken to be zero where the inner product is zero.
+        phases = np.divide(np.conjugate(inner_products_), fidelities,
+                           out=np.zeros_like(inner_products_),
+                           where=fidelities != 0)
+        dcost_ddensities = ((-scale / normalization_constant)
+                            * phases[:, None, None]
+                            * np.conjugate(self.target_densities))
+
+        return cost, None, dcost_ddensities
+
+
+    def cost_low_rank(self, controls, density_factors, system_eval_step):
+        """
+        Compute the penalty from the factors of the densities.
+
+        Arguments:
+        controls
+        density_factors
+        system_eval_step
+
+        Returns:
+        cost
+        """
+        inner_products_ = factor_inner_products(self.target_densities, density_factors)
+        fidelities = anp.abs(inner_products_)
+        fidelity_sum = anp.sum(fidelities)
+        fidelity_normalized = fidelity_sum / (self.density_count * self.hilbert_size)
+        infidelity = 1 - fidelity_normalized
+        cost_normalized = infidelity / self.cost_eval_count
+
+        return cost_normalized * self.cost_multiplier
+
+
+    def subset(self, indices):
+        """
+        Get this cost for a subset of the evolving densities.
+
+        Arguments:
+        indices
+
+        Returns:
+        subset_cost
+        """
+        subset_cost = copy(self)
+        subset_cost.density_count = len(indices)
+        subset_cost.target_densities = self.target_densities[indices]
+
+        return subset_cost
@@ -3,6 +3,8 @@ targetstateinfidelity.py - This module defines a cost function that
 penalizes the infidelity of an evolved state and a target state.
 """
 
+from copy import copy
+
 import autograd.numpy as anp
 import numpy as np
 
@@ -55,3 +57,46 @@ class TargetStateInfidelity(Cost):
         infidelity = 1 - fidelity_normalized
         
         return infidelity * self.cost_multiplier
+
+
+    def cost_and_grad(self, controls, states, system_eval_step):
+        """
+        Compute the penalty and its gradients.
+
+        Arguments:
+        controls
+        states
+        system_eval_step
+
+        Returns:
+        cost
+        dcost_dcontrols
+        dcost_dstates
+        """
+        inner_products = np.matmul(self.target_states_dagger, states)[:, 0, 0]
+        fidelities = np.real(inner_products * np.conjugate(inner_products))
+        scale = self.cost_multiplier
+        cost = (1 - np.sum(fidelities) / self.state_count) * scale
+        # d|<t|s>|^2/ds is 2 * conj(<t|s>) * conj(|t>).
+        dcost_dstates = ((-2 * scale / self.state_count)
+                         * np.conjugate(inner_products)[:, None, None]
+                         * np.swapaxes(self.target_states_dagger, -1, -2))
+
+        return cost, None, dcost_dstates
+
+
+    def subset(self, indices):
+        """
+        Get this cost for a subset of the evolving states.
+
+        Arguments:
+        indices
+
+        Returns:
+        subset_cost
+        """
+        subset_cost = copy(self)
+        subset_cost.state_count = len(indices)
+        subset_cost.target_states_dagger = self.target_states_dagger[indices]
+
+        return subset_cost
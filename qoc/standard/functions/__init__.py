@@ -4,16 +4,28 @@ functions - a directory for exposing common operations
 
 from qoc.standard.functions.convenience import (commutator,
                                                 conjugate_transpose,
+                                                factor_inner_products,
+                                                inner_products,
                                                 krons,
                                                 matmuls,
+                                                pack_hermitian,
+                                                pack_hermitian_superoperator,
                                                 rms_norm,
+                                                traces,
+                                                unpack_hermitian,
                                                 column_vector_list_to_matrix,
                                                 matrix_to_column_vector_list,)
-from qoc.standard.functions.expm import expm
+from qoc.standard.functions.controlbasis import (get_chebyshev_basis,
+                                                  get_crab_basis,
+                                                  get_fourier_basis,
+                                                  get_slepian_basis,)
+from qoc.standard.functions.expm import expm, expm_multiply
 
 __all__ = [
-    "commutator", "conjugate_transpose", "krons", "matmuls",
-    "rms_norm",
+    "commutator", "conjugate_transpose", "factor_inner_products", "inner_products",
+    "krons", "matmuls", "pack_hermitian", "pack_hermitian_superoperator",
+    "rms_norm", "traces", "unpack_hermitian",
     "column_vector_list_to_matrix", "matrix_to_column_vector_list",
-    "expm",
+    "get_chebyshev_basis", "get_crab_basis", "get_fourier_basis", "get_slepian_basis",
+    "expm", "expm_multiply",
 ]
@@ -0,0 +1,117 @@
+"""
+controlbasis.py - definitions of bases that the controls may be expanded in
+Each basis is an array of shape (control_eval_count x basis_size)
+whose columns are the basis functions evaluated at the control eval times,
+so that a set of coefficients of shape (basis_size x control_count)
+is expanded to controls as `controls` = `control_basis` @ `coefficients`.
+The basis functions are bounded by one in norm.
+"""
+
+import numpy as np
+from scipy.signal.windows import dpss
+
+def get_chebyshev_basis(basis_size, control_eval_count):
+    """
+    Construct a basis of the chebyshev polynomials of the first kind
+    of degree 0 through `basis_size` - 1 over the evolution.
+
+    Arguments:
+    basis_size :: int - the number of basis functions
+    control_eval_count :: int - the number of control eval times
+
+    Returns:
+    control_basis :: ndarray (control_eval_count x basis_size) - the basis
+    """
+    x = np.linspace(-1, 1, control_eval_count)
+    control_basis = np.polynomial.chebyshev.chebvander(x, basis_size - 1)
+
+    return control_basis
+
+
+def get_crab_basis(basis_size, control_eval_count, randomization=0.5, seed=None):
+    """
+    Construct a basis of sines and cosines whose frequencies are randomized
+    about the harmonics of the evolution, as in the chopped random basis
+    (CRAB) method https://arxiv.org/abs/1103.0855.
+    The basis functions alternate between the cosine and the sine of each frequency.
+
+    Arguments:
+    basis_size :: int - the number of basis functions
+    control_eval_count :: int - the number of control eval times
+    randomization :: float - the k-th frequency is (k + r) / `evolution_time`
+        for r sampled uniformly from [-`randomization`, `randomization`]
+    seed :: int - the seed of the random number generator
+
+    Returns:
+    control_basis :: ndarray (control_eval_count x basis_size) - the basis
+    """
+    random = np.random.default_rng(seed)
+    frequency_count = (basis_size + 1) // 2
+    frequencies = (np.arange(1, frequency_count + 1)
+                   + random.uniform(-randomization, randomization, frequency_count))
+    control_basis = _get_sinusoid_basis(basis_size, control_eval_count, frequencies)
+
+    return control_basis
+
+
+def get_fourier_basis(basis_size, control_eval_count):
+    """
+    Construct a basis of the constant function and the sines and cosines
+    of the harmonics of the evolution, i.e. a truncated fourier series.
+    The basis functions are ordered by frequency, with the cosine of each
+    frequency before its sine, so the bandwidth of the controls
+    is at most (`basis_size` // 2) / `evolution_time`.
+
+    Arguments:
+    basis_size :: int - the number of basis functions
+    control_eval_count :: int - the number of control eval times
+
+    Returns:
+    control_basis :: ndarray (control_eval_count x basis_size) - the basis
+    """
+    frequencies = np.arange(1, basis_size // 2 + 1)
+    control_basis = np.hstack((np.ones((control_eval_count, 1)),
+                               _get_sinusoid_basis(basis_size - 1, control_eval_count,
+                                                   frequencies)))
+
+    return control_basis
+
+
+def get_slepian_basis(basis_size, control_eval_count, time_bandwidth=None):
+    """
+    Construct a basis of the discrete prolate spheroidal (slepian) sequences,
+    which are the sequences of `control_eval_count` points that are maximally
+    concentrated in the band of frequencies below
+    `time_bandwidth` / `evolution_time`.
+
+    Arguments:
+    basis_size :: int - the number of basis functions
+    control_eval_count :: int - the number of control eval times
+    time_bandwidth :: float - the product of the evolution time and the bandwidth,
+        the first 2 * `time_bandwidth` - 1 sequences are well concentrated in the band,
+        if not specified, it is chosen so that all `basis_size` sequences are
+
+    Returns:
+    control_basis :: ndarray (control_eval_count x basis_size) - the basis
+    """
+    if time_bandwidth is None:
+        time_bandwidth = (basis_size + 1) / 2
+    sequences = dpss(control_eval_count, time_bandwidth, Kmax=basis_size)
+    control_basis = np.transpose(sequences) / np.max(np.abs(sequences), axis=1)
+
+    return control_basis
+
+
+### HELPER METHODS ###
+
+def _get_sinusoid_basis(basis_size, control_eval_count, frequencies):
+    """
+    Construct a basis of the cosines and sines of `frequencies`,
+    which are in units of the inverse evolution time.
+    """
+    times = np.linspace(0, 1, control_eval_count)
+    phases = 2 * np.pi * times[:, None] * frequencies[None, :]
+    control_basis = np.stack((np.cos(phases), np.sin(phases)), axis=2)
+    control_basis = np.reshape(control_basis, (control_eval_count, 2 * len(frequencies)))
+
+    return control_basis[:, :basis_size]
@@ -4,10 +4,11 @@ All functions in this module that are exported,
 i.e. those that don't begin with '_', are autograd compatible.
 """
 
-from functools import reduce
+from functools import lru_cache, reduce
 
 from autograd.extend import defvjp, primitive
 import autograd.numpy as anp
+from autograd.numpy.numpy_vjps import unbroadcast_f
 import numpy as np
 import scipy.linalg as la
 
@@ -46,6 +47,59 @@ def conjugate_transpose(matrix):
     return conjugate_transpose_
 
 
+def factor_inner_products(a, factors):
+    """
+    Compute the Hilbert-Schmidt inner product Tr(a^dagger v v^dagger)
+    of each matrix in a stack of matrices and each matrix given by its
+    factor v in a (broadcastable) stack of factors. For factors of rank r,
+    this is O(N^2 r) rather than the O(N^3) of forming v v^dagger.
+
+    Arguments:
+    a :: numpy.ndarray (... x N x N) - the left matrices
+    factors :: numpy.ndarray (... x N x r) - the factors of the right matrices
+
+    Returns:
+    inner_products_ :: numpy.ndarray (...) - the inner product of each pair
+        of matrices
+    """
+    inner_products_ = anp.sum(anp.conjugate(anp.matmul(a, factors)) * factors,
+                              axis=(-1, -2))
+
+    return inner_products_
+
+
+@primitive
+def inner_products(a, b):
+    """
+    Compute the Hilbert-Schmidt inner product Tr(a^dagger b)
+    of each pair of matrices in two (broadcastable) stacks of matrices.
+    This is equivalent to, but cheaper than,
+    traces(matmuls(conjugate_transpose(a), b)).
+
+    Arguments:
+    a :: numpy.ndarray (... x N x N) - the left matrices
+    b :: numpy.ndarray (... x N x N) - the right matrices
+
+    Returns:
+    inner_products_ :: numpy.ndarray (...) - the inner product of each pair
+        of matrices
+    """
+    inner_products_ = np.sum(np.conjugate(a) * b, axis=(-1, -2))
+
+    return inner_products_
+
+
+def _inner_products_vjp_a(ans, a, b):
+    return unbroadcast_f(a, lambda g: anp.conjugate(g[..., None, None] * b))
+
+
+def _inner_products_vjp_b(ans, a, b):
+    return unbroadcast_f(b, lambda g: g[..., None, None] * anp.conjugate(a))
+
+
+defvjp(inner_products, _inner_products_vjp_a, _inner_products_vjp_b)
+
+
 def krons(*matrices):
     """
     Compute the kronecker product of a list of matrices.
@@ -91,6 +145,34 @@ def rms_norm(array):
     return rms_norm_
 
 
+@primitive
+def traces(matrices):
+    """
+    Compute the trace of each matrix in a stack of matrices.
+    Autograd does not support the vjp of anp.trace with axis arguments
+    or of anp.einsum("...ii->...", a), so this primitive
+    defines its own.
+
+    Arguments:
+    matrices :: numpy.ndarray (... x N x N) - the matrices to
+        compute the traces of
+
+    Returns:
+    traces_ :: numpy.ndarray (...) - the trace of each matrix
+    """
+    traces_ = np.trace(matrices, axis1=-2, axis2=-1)
+
+    return traces_
+
+
+def _traces_vjp(ans, matrices):
+    identity = np.eye(matrices.shape[-1])
+    return lambda g: g[..., None, None] * identity
+
+
+defvjp(traces, _traces_vjp)
+
+
 ### ISOMORPHISMS ###
 
 # A row vector is np.array([[0, 1, 2]])
@@ -102,3 +184,133 @@ column_vector_list_to_matrix = (lambda column_vector_list:
 matrix_to_column_vector_list = (lambda matrix:
                                 anp.stack([anp.vstack(matrix[:, i])
                                            for i in range(matrix.shape[1])]))
+
+
+@lru_cache(maxsize=None)
+def _get_hermitian_packing(hilbert_size):
+    """
+    Compute the indices and coefficients that map a row-major flattened
+    hermitian matrix to its packed representation and back.
+    The packed representation holds the real part of the diagonal,
+    the real part of the strict upper triangle, and the imaginary
+    part of the strict upper triangle, in that order.
+
+    Arguments:
+    hilbert_size :: int - the dimension of the matrices
+
+    Returns:
+    packing :: tuple - the packed element k is
+        real(pack_coefficients[0][k] * flat[pack_indices[0][k]]
+             + pack_coefficients[1][k] * flat[pack_indices[1][k]])
+        and the flat element f is
+        (unpack_coefficients[0][f] * packed[unpack_indices[0][f]]
+         + unpack_coefficients[1][f] * packed[unpack_indices[1][f]]),
+        and basis_coefficients weight the flat elements pack_indices[0][k]
+        and pack_indices[1][k] of the k-th packed basis matrix
+    """
+    rows, columns = np.triu_indices(hilbert_size, k=1)
+    off_diagonal_count = rows.shape[0]
+    diagonal = np.arange(hilbert_size) * (hilbert_size + 1)
+    upper = rows * hilbert_size + columns
+    lower = columns * hilbert_size + rows
+    pack_indices = (np.concatenate((diagonal, upper, upper)),
+                    np.concatenate((diagonal, lower, lower)))
+    half = np.repeat(0.5, off_diagonal_count)
+    pack_coefficients = (np.concatenate((np.repeat(0.5, hilbert_size), half, -1j * half)),
+                         np.concatenate((np.repeat(0.5, hilbert_size), half, 1j * half)))
+
+    # Each flat element is built from at most a real and an imaginary packed element.
+    packed_diagonal = np.arange(hilbert_size)
+    packed_real = hilbert_size + np.arange(off_diagonal_count)
+    packed_imag = packed_real + off_diagonal_count
+    unpack_indices = (np.zeros(hilbert_size ** 2, dtype=np.int64),
+                      np.zeros(hilbert_size ** 2, dtype=np.int64))
+    unpack_coefficients = (np.zeros(hilbert_size ** 2, dtype=np.complex128),
+                           np.zeros(hilbert_size ** 2, dtype=np.complex128))
+    unpack_indices[0][diagonal] = unpack_indices[1][diagonal] = packed_diagonal
+    unpack_coefficients[0][diagonal] = 1
+    unpack_indices[0][upper] = unpack_indices[0][lower] = packed_real
+    unpack_indices[1][upper] = unpack_indices[1][lower] = packed_imag
+    unpack_coefficients[0][upper] = unpack_coefficients[0][lower] = 1
+    unpack_coefficients[1][upper] = 1j
+    unpack_coefficients[1][lower] = -1j
+    basis_coefficients = (np.concatenate((np.repeat(0.5, hilbert_size),
+                                          np.repeat(1, off_diagonal_count),
+                                          np.repeat(1j, off_diagonal_count))),
+                          np.concatenate((np.repeat(0.5, hilbert_size),
+                                          np.repeat(1, off_diagonal_count),
+                                          np.repeat(-1j, off_diagonal_count))))
+
+    return (pack_indices, pack_coefficients, unpack_indices, unpack_coefficients,
+            basis_coefficients)
+
+
+def pack_hermitian(matrices):
+    """
+    Pack a stack of hermitian matrices into hilbert_size ** 2 reals each.
+    Only the upper triangle of each matrix is read.
+
+    Arguments:
+    matrices :: ndarray (... x hilbert_size x hilbert_size) - the hermitian matrices
+
+    Returns:
+    packed :: ndarray (... x hilbert_size ** 2) - the real part of the diagonal,
+        the real part of the strict upper triangle and the imaginary part
+        of the strict upper triangle of each matrix
+    """
+    hilbert_size = matrices.shape[-1]
+    pack_indices, pack_coefficients, _, _, _ = _get_hermitian_packing(hilbert_size)
+    flat = anp.reshape(matrices, matrices.shape[:-2] + (hilbert_size ** 2,))
+    packed = anp.real(flat[..., pack_indices[0]] * pack_coefficients[0]
+                      + flat[..., pack_indices[1]] * pack_coefficients[1])
+
+    return packed
+
+
+def unpack_hermitian(packed):
+    """
+    Recover a stack of hermitian matrices from their packed representation.
+
+    Arguments:
+    packed :: ndarray (... x hilbert_size ** 2) - matrices packed by `pack_hermitian`
+
+    Returns:
+    matrices :: ndarray (... x hilbert_size x hilbert_size) - the hermitian matrices
+    """
+    hilbert_size = int(np.sqrt(packed.shape[-1]))
+    _, _, unpack_indices, unpack_coefficients, _ = _get_hermitian_packing(hilbert_size)
+    flat = (packed[..., unpack_indices[0]] * unpack_coefficients[0]
+            + packed[..., unpack_indices[1]] * unpack_coefficients[1])
+    matrices = anp.reshape(flat, packed.shape[:-1] + (hilbert_size, hilbert_size))
+
+    return matrices
+
+
+def pack_hermitian_superoperator(superoperator):
+    """
+    Transform a superoperator that acts on row-major vectorized matrices, and
+    maps hermitian matrices to hermitian matrices, into the real superoperator
+    that acts on packed matrices, i.e.
+    pack_hermitian(S vec(p)) = pack_hermitian_superoperator(S) pack_hermitian(p).
+
+    Arguments:
+    superoperator :: ndarray (hilbert_size ** 2 x hilbert_size ** 2)
+        - a hermiticity preserving superoperator
+
+    Returns:
+    packed_superoperator :: ndarray (hilbert_size ** 2 x hilbert_size ** 2)
+        - the real superoperator on packed matrices
+    """
+    hilbert_size = int(np.sqrt(superoperator.shape[-1]))
+    (pack_indices, pack_coefficients,
+     _, _, basis_coefficients) = _get_hermitian_packing(hilbert_size)
+    # The packed basis matrices e_ii, e_ij + e_ji and i (e_ij - e_ji)
+    # are the columns of the unpacking map.
+    unpacked_columns = (superoperator[:, pack_indices[0]] * basis_coefficients[0]
+                        + superoperator[:, pack_indices[1]] * basis_coefficients[1])
+    packed_superoperator = anp.real(unpacked_columns[pack_indices[0], :]
+                                    * pack_coefficients[0][:, None]
+                                    + unpacked_columns[pack_indices[1], :]
+                                    * pack_coefficients[1][:, None])
+
+    return packed_superoperator
@@ -5,6 +5,7 @@ expm.py - a module for all things e^M
 from autograd.extend import (defvjp as autograd_defvjp,
                              primitive as autograd_primitive)
 import autograd.numpy as anp
+from autograd.tracer import getval
 import numpy as np
 import scipy.linalg as la
 from numba import jit
@@ -270,6 +271,48 @@ def expm_eigh(h):
     return anp.matmul(p *d, p_dagger)
 
 
+### EXPM ACTION VIA TRUNCATED TAYLOR SERIES ###
+
+_EXPM_MULTIPLY_TOLERANCE = 2 ** -53
+_EXPM_MULTIPLY_MAX_ORDER = 55
+
+def expm_multiply(a, b):
+    """
+    Compute the action of the matrix exponential on a stack of matrices,
+    expm(a) @ b, without forming expm(a). The exponential is split into
+    s = ceil(|a|_1) factors, each of which is applied as a taylor series
+    that is truncated once its terms are below the unit roundoff. This costs
+    O(N^2 M) per term rather than the O(N^3) of expm.
+
+    References:
+    [0] https://eprints.maths.manchester.ac.uk/1591/1/alhi11m.pdf
+
+    Arguments:
+    a :: ndarray(N x N) - The matrix to exponentiate.
+    b :: ndarray(... x N x M) - The matrices to act on.
+
+    Returns:
+    expm_a_b :: ndarray(... x N x M) - expm(a) @ b
+    """
+    scale = max(1, int(np.ceil(getval(one_norm(a)))))
+    a = a / scale
+    for _ in range(scale):
+        term = b
+        b_norm = term_norm = np.max(np.abs(getval(b)))
+        for order in range(1, _EXPM_MULTIPLY_MAX_ORDER + 1):
+            term = anp.matmul(a, term) / order
+            b = b + term
+            # Stop once two consecutive terms are negligible.
+            previous_term_norm = term_norm
+            term_norm = np.max(np.abs(getval(term)))
+            if term_norm + previous_term_norm <= _EXPM_MULTIPLY_TOLERANCE * b_norm:
+                break
+        #ENDFOR
+    #ENDFOR
+
+    return b
+
+
 ### EXPORT ###
 
 expm = expm_pade
@@ -2,10 +2,13 @@
 optimizers - a module for optimization optimizers
 """
 
+from .adadelta import Adadelta
+from .adafactor import Adafactor
 from .adam import Adam
 from .lbfgsb import LBFGSB
 from .sgd import SGD
+from .trustncg import TrustNCG
 
 __all__ = [
-    "Adam", "LBFGSB", "SGD",
+    "Adadelta", "Adafactor", "Adam", "LBFGSB", "SGD", "TrustNCG",
 ]
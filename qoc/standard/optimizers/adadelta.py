@@ -0,0 +1,163 @@
+"""
+adadelta.py - a module for defining the Adadelta optimizer
+"""
+
+import numpy as np
+
+class Adadelta(object):
+    """
+    a class to define the Adadelta optimizer
+    This implementation follows the original algorithm
+    https://arxiv.org/abs/1212.5701.
+    The params are updated in place, and the only arrays kept
+    between iterations are the two running averages.
+
+    Fields:
+    box_bounds :: bool - this optimizer respects box bounds on the params,
+        so programs should supply them
+    epsilon :: float - fuzz factor
+    gradient_square_moment :: numpy.ndarray - running average of the
+        squared gradients
+    iteration_count :: int - the current count of iterations performed
+    learning_rate :: float - a factor that scales each update,
+        the original algorithm uses 1
+    name :: str - identifier for the optimizer
+    rho :: float - the decay rate of the running averages
+    update_square_moment :: numpy.ndarray - running average of the
+        squared updates
+    """
+    name = "adadelta"
+    box_bounds = True
+
+    def __init__(self, epsilon=1e-6, learning_rate=1., rho=0.95):
+        """
+        See class definition for argument specifications.
+        Default values are chosen in accordance to those proposed
+        in the paper.
+        """
+        super().__init__()
+        self.epsilon = epsilon
+        self.gradient_square_moment = None
+        self.iteration_count = 0
+        self.learning_rate = learning_rate
+        self.rho = rho
+        self.update_square_moment = None
+
+
+    def __str__(self):
+        return ("{}, rho: {}, epsilon: {}, lr: {}"
+                "".format(self.name, self.rho, self.epsilon,
+                          self.learning_rate))
+
+
+    def run(self, function, iteration_count,
+            initial_params, jacobian, args=(), bounds=None,
+            initial_state=None):
+        """
+        Run an Adadelta optimization series.
+        Args:
+        args :: any - a tuple of arguments to pass to the function
+            and jacobian
+        bounds :: tuple(numpy.ndarray) - the lower and upper bounds
+            on the params, if specified, the params are projected onto
+            the bounds after each update
+        function :: any -> float
+            - the function to minimize
+        iteration_count :: int - how many iterations to perform
+        initial_params :: numpy.ndarray - the initial optimization values
+        initial_state :: dict - the internal state of the optimizer
+            returned by `get_state`, if specified, the optimization continues
+            from this state rather than starting anew
+        jacobian :: numpy.ndarray - the jacobian of the function
+            with respect to the params
+        Returns: none
+        """
+        if initial_state is None:
+            self.iteration_count = 0
+            self.gradient_square_moment = np.zeros_like(initial_params)
+            self.update_square_moment = np.zeros_like(initial_params)
+        else:
+            self.set_state(initial_state)
+
+        # The params are updated in place, so the caller's array is copied once.
+        params = np.copy(initial_params)
+        for i in range(iteration_count):
+            grads, terminate = jacobian(params, *args)
+            if terminate:
+                break
+            self.update(grads, params)
+            # Project the params onto the bounds.
+            if bounds is not None:
+                np.clip(params, bounds[0], bounds[1], out=params)
+
+
+    def get_state(self):
+        """
+        Get the internal state of the optimizer, which is sufficient
+        to continue an optimization series with `run`.
+
+        Returns:
+        state :: dict - the internal state of the optimizer
+        """
+        return {
+            "gradient_square_moment": np.copy(self.gradient_square_moment),
+            "update_square_moment": np.copy(self.update_square_moment),
+            "iteration_count": self.iteration_count,
+        }
+
+
+    def set_state(self, state):
+        """
+        Set the internal state of the optimizer.
+
+        Arguments:
+        state :: dict - the internal state of the optimizer
+            returned by `get_state`
+
+        Returns: none
+        """
+        self.gradient_square_moment = np.copy(state["gradient_square_moment"])
+        self.update_square_moment = np.copy(state["update_square_moment"])
+        self.iteration_count = int(state["iteration_count"])
+
+
+    def update(self, grads, params):
+        """Update the learning parameters for the current iteration in place.
+        The running averages must be initialized by `run`, or be
+        arrays of the same shape as the params.
+
+        Args:
+        grads :: numpy.ndarray - the gradients of the cost function with
+            respect to each learning parameter for the current iteration
+        params :: numpy.ndarray - the learning parameters for the
+            current iteration, which are overwritten
+
+        Returns:
+        params :: numpy.ndarray - the learning parameters to be used
+            for the next iteration
+        """
+        self.iteration_count += 1
+        rho = self.rho
+        epsilon = self.epsilon
+        gradient_square_moment = self.gradient_square_moment
+        update_square_moment = self.update_square_moment
+
+        # E[g^2] = rho * E[g^2] + (1 - rho) * g^2
+        step = np.square(grads)
+        step *= 1 - rho
+        gradient_square_moment *= rho
+        gradient_square_moment += step
+
+        # dx = -sqrt(E[dx^2] + epsilon) / sqrt(E[g^2] + epsilon) * g
+        np.add(update_square_moment, epsilon, out=step)
+        np.sqrt(step, out=step)
+        step /= np.sqrt(gradient_square_moment + epsilon)
+        step *= grads
+
+        # E[dx^2] = rho * E[dx^2] + (1 - rho) * dx^2
+        update_square_moment *= rho
+        update_square_moment += (1 - rho) * np.square(step)
+        step *= self.learning_rate
+        params -= step
+
+        return params
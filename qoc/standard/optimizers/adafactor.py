@@ -0,0 +1,198 @@
+"""
+adafactor.py - a module for defining the Adafactor optimizer
+"""
+
+import numpy as np
+
+class Adafactor(object):
+    """
+    a class to define the Adafactor optimizer
+    This implementation follows the algorithm without momentum
+    https://arxiv.org/abs/1804.04235.
+    The params are viewed as a matrix, and the running average of the
+    squared gradients is stored as the outer product of its row and column
+    sums. For a set of controls in optimizer format with `column_count` set to
+    `control_count`, the rows correspond to the control evaluation steps
+    (real parts then imaginary parts for complex controls) and the columns
+    correspond to the controls, so the optimizer keeps
+    O(control_eval_count + control_count) values between iterations.
+    The params are updated in place.
+
+    Fields:
+    box_bounds :: bool - this optimizer respects box bounds on the params,
+        so programs should supply them
+    clip_threshold :: float - the maximum root mean square of each update
+    column_count :: int - the number of columns of the matrix that the params
+        are viewed as, if not set, the params are viewed as a column vector
+        and the second moment is not factored
+    column_square_moment :: numpy.ndarray - running average of the column sums
+        of the squared gradients
+    decay_rate :: float - the running averages decay with
+        beta_2 = 1 - iteration_count ^ -decay_rate
+    epsilon :: float - fuzz factor added to the squared gradients
+    iteration_count :: int - the current count of iterations performed
+    learning_rate :: float - the step size
+    name :: str - identifier for the optimizer
+    row_square_moment :: numpy.ndarray - running average of the row sums
+        of the squared gradients
+    """
+    name = "adafactor"
+    box_bounds = True
+
+    def __init__(self, clip_threshold=1., column_count=None,
+                 decay_rate=0.8, epsilon=1e-30, learning_rate=1e-2):
+        """
+        See class definition for argument specifications.
+        Default values are chosen in accordance to those proposed
+        in the paper.
+        """
+        super().__init__()
+        self.clip_threshold = clip_threshold
+        self.column_count = column_count
+        self.column_square_moment = None
+        self.decay_rate = decay_rate
+        self.epsilon = epsilon
+        self.iteration_count = 0
+        self.learning_rate = learning_rate
+        self.row_square_moment = None
+
+
+    def __str__(self):
+        return ("{}, lr: {}, decay_rate: {}, epsilon: {}, clip_threshold: {}, "
+                "column_count: {}"
+                "".format(self.name, self.learning_rate, self.decay_rate,
+                          self.epsilon, self.clip_threshold, self.column_count))
+
+
+    def run(self, function, iteration_count,
+            initial_params, jacobian, args=(), bounds=None,
+            initial_state=None):
+        """
+        Run an Adafactor optimization series.
+        Args:
+        args :: any - a tuple of arguments to pass to the function
+            and jacobian
+        bounds :: tuple(numpy.ndarray) - the lower and upper bounds
+            on the params, if specified, the params are projected onto
+            the bounds after each update
+        function :: any -> float
+            - the function to minimize
+        iteration_count :: int - how many iterations to perform
+        initial_params :: numpy.ndarray - the initial optimization values
+        initial_state :: dict - the internal state of the optimizer
+            returned by `get_state`, if specified, the optimization continues
+            from this state rather than starting anew
+        jacobian :: numpy.ndarray - the jacobian of the function
+            with respect to the params
+        Returns: none
+        """
+        if initial_state is None:
+            self.iteration_count = 0
+            row_count, column_count = self._get_matrix_shape(initial_params)
+            self.row_square_moment = np.zeros(row_count)
+            self.column_square_moment = np.zeros(column_count)
+        else:
+            self.set_state(initial_state)
+
+        # The params are updated in place, so the caller's array is copied once.
+        params = np.copy(initial_params)
+        for i in range(iteration_count):
+            grads, terminate = jacobian(params, *args)
+            if terminate:
+                break
+            self.update(grads, params)
+            # Project the params onto the bounds.
+            if bounds is not None:
+                np.clip(params, bounds[0], bounds[1], out=params)
+
+
+    def get_state(self):
+        """
+        Get the internal state of the optimizer, which is sufficient
+        to continue an optimization series with `run`.
+
+        Returns:
+        state :: dict - the internal state of the optimizer
+        """
+        return {
+            "column_square_moment": np.copy(self.column_square_moment),
+            "row_square_moment": np.copy(self.row_square_moment),
+            "iteration_count": self.iteration_count,
+        }
+
+
+    def set_state(self, state):
+        """
+        Set the internal state of the optimizer.
+
+        Arguments:
+        state :: dict - the internal state of the optimizer
+            returned by `get_state`
+
+        Returns: none
+        """
+        self.column_square_moment = np.copy(state["column_square_moment"])
+        self.row_square_moment = np.copy(state["row_square_moment"])
+        self.iteration_count = int(state["iteration_count"])
+
+
+    def update(self, grads, params):
+        """Update the learning parameters for the current iteration in place.
+        The running averages must be initialized by `run`.
+
+        Args:
+        grads :: numpy.ndarray - the gradients of the cost function with
+            respect to each learning parameter for the current iteration
+        params :: numpy.ndarray - the learning parameters for the
+            current iteration, which are overwritten
+
+        Returns:
+        params :: numpy.ndarray - the learning parameters to be used
+            for the next iteration
+        """
+        self.iteration_count += 1
+        beta_2 = 1 - np.power(self.iteration_count, -self.decay_rate)
+        matrix_shape = self._get_matrix_shape(params)
+        grads = np.reshape(grads, matrix_shape)
+        row_square_moment = self.row_square_moment
+        column_square_moment = self.column_square_moment
+
+        # Accumulate the row and column sums of the squared gradients.
+        step = np.square(grads)
+        step += self.epsilon
+        row_square_moment *= beta_2
+        row_square_moment += (1 - beta_2) * np.sum(step, axis=1)
+        column_square_moment *= beta_2
+        column_square_moment += (1 - beta_2) * np.sum(step, axis=0)
+
+        # The second moment is approximated by R C / sum(R).
+        np.multiply(row_square_moment[:, None], column_square_moment[None, :],
+                    out=step)
+        step /= np.sum(row_square_moment)
+        np.sqrt(step, out=step)
+        np.divide(grads, step, out=step)
+
+        # Clip the root mean square of the update.
+        step_rms = np.sqrt(np.mean(np.square(step)))
+        step *= self.learning_rate / max(1, step_rms / self.clip_threshold)
+        params -= np.reshape(step, np.shape(params))
+
+        return params
+
+
+    def _get_matrix_shape(self, params):
+        """
+        Get the shape of the matrix that the params are viewed as.
+        """
+        if self.column_count is None:
+            column_count = 1
+        else:
+            column_count = self.column_count
+        row_count, remainder = divmod(np.size(params), column_count)
+        if remainder != 0:
+            raise ValueError("The program expected that the params could be viewed "
+                             "as a matrix with column_count={} columns, but "
+                             "the program found {} params."
+                             "".format(column_count, np.size(params)))
+
+        return row_count, column_count
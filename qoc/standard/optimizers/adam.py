@@ -2,6 +2,7 @@
 adam.py - a module for defining the Adam optimizer
 """
 
+from numba import jit
 import numpy as np
 
 from qoc.models.operationpolicy import OperationPolicy
@@ -17,6 +18,8 @@ class Adam(object):
     apply_scale_grads :: bool - see scale_grads
     beta_1 :: float - gradient decay bias
     beta_2 :: float - gradient squared decay bias
+    box_bounds :: bool - this optimizer respects box bounds on the params,
+        so programs should supply them
     clip_grads :: float - the maximum absolute value at which the gradients
         should be element-wise clipped, if not set, the gradients will
         not be clipped
@@ -33,8 +36,11 @@ class Adam(object):
     name :: str - identifier for the optimizer
     scale_grads :: float - the value to scale the norm of the gradients to,
         if not set, the gradients will not be scaled
+    step_buffer :: numpy.ndarray - preallocated storage for the update,
+        so that `update` does not allocate temporaries
     """
     name = "adam"
+    box_bounds = True
 
     def __init__(self, beta_1=0.9, beta_2=0.999, clip_grads=None,
                  epsilon=1e-8, learning_rate=1e-3,
@@ -69,6 +75,7 @@ class Adam(object):
         self.learning_rate = learning_rate
         self.learning_rate_decay = learning_rate_decay
         self.scale_grads = scale_grads
+        self.step_buffer = None
 
 
     def __str__(self):
@@ -81,34 +88,81 @@ class Adam(object):
     
 
     def run(self, function, iteration_count,
-            initial_params, jacobian, args=()):
+            initial_params, jacobian, args=(), bounds=None,
+            initial_state=None):
         """
         Run an Adam optimization series.
         Args:
         args :: any - a tuple of arguments to pass to the function
             and jacobian
+        bounds :: tuple(numpy.ndarray) - the lower and upper bounds
+            on the params, if specified, the params are projected onto
+            the bounds after each update
         function :: any -> float
             - the function to minimize
         iteration_count :: int - how many iterations to perform
         initial_params :: ndarray - the initial optimization values
+        initial_state :: dict - the internal state of the optimizer
+            returned by `get_state`, if specified, the optimization continues
+            from this state rather than starting anew
         jacobian :: numpy.ndarray - the jacobian of the function
             with respect to the params
         Returns: none
         """
-        self.iteration_count = 0
-        self.gradient_moment = np.zeros_like(initial_params)
-        self.gradient_square_moment = np.zeros_like(initial_params)
+        if initial_state is None:
+            self.iteration_count = 0
+            self.gradient_moment = np.zeros_like(initial_params, dtype=np.float64)
+            self.gradient_square_moment = np.zeros_like(initial_params, dtype=np.float64)
+        else:
+            self.set_state(initial_state)
+        self.step_buffer = np.zeros_like(initial_params, dtype=np.float64)
 
-        params = initial_params
+        # The params are updated in place, so the caller's array is copied once.
+        params = np.copy(initial_params)
         for i in range(iteration_count):
             grads, terminate = jacobian(params, *args)
             if terminate:
                 break
-            params = self.update(grads, params)
+            self.update(grads, params, out=params)
+            # Project the params onto the bounds.
+            if bounds is not None:
+                np.clip(params, bounds[0], bounds[1], out=params)
+
+
+    def get_state(self):
+        """
+        Get the internal state of the optimizer, which is sufficient
+        to continue an optimization series with `run`.
+
+        Returns:
+        state :: dict - the internal state of the optimizer
+        """
+        return {
+            "gradient_moment": np.copy(self.gradient_moment),
+            "gradient_square_moment": np.copy(self.gradient_square_moment),
+            "iteration_count": self.iteration_count,
+        }
+
 
+    def set_state(self, state):
+        """
+        Set the internal state of the optimizer.
+
+        Arguments:
+        state :: dict - the internal state of the optimizer
+            returned by `get_state`
 
-    def update(self, grads, params):
+        Returns: none
+        """
+        self.gradient_moment = np.copy(state["gradient_moment"])
+        self.gradient_square_moment = np.copy(state["gradient_square_moment"])
+        self.iteration_count = int(state["iteration_count"])
+
+
+    def update(self, grads, params, out=None):
         """Update the learning parameters for the current iteration.
+        The moments and the update are computed in a single pass
+        in preallocated buffers.
         
         IMPLEMENTATION NOTE: I believe it is faster to check the modification
         conditionals each iteration than it would be to define seperate
@@ -123,11 +177,27 @@ class Adam(object):
             respect to each learning parameter for the current iteration
         params :: numpy.ndarray - the learning parameters for the
             current iteration
+        out :: numpy.ndarray - the array to write the new learning parameters to,
+            which may be `params`, if not specified, a new array is returned
 
         Returns:
         new_params :: numpy.ndarray - the learning parameters to be used
             for the next iteration
         """
+        # Allocate the buffers if `run` did not. The moments are kept
+        # if they were set by `set_state`.
+        params_shape = np.shape(params)
+        if self.gradient_moment is None or self.gradient_moment.shape != params_shape:
+            self.gradient_moment = np.zeros(params_shape)
+        if (self.gradient_square_moment is None
+            or self.gradient_square_moment.shape != params_shape):
+            self.gradient_square_moment = np.zeros(params_shape)
+        if self.step_buffer is None or self.step_buffer.shape != params_shape:
+            self.step_buffer = np.zeros(params_shape)
+        gradient_moment = self.gradient_moment
+        gradient_square_moment = self.gradient_square_moment
+        step = self.step_buffer
+        
         # Apply learning rate decay.
         if self.apply_learning_rate_decay:
             learning_rate = (self.initial_learning_rate
@@ -138,28 +208,44 @@ class Adam(object):
 
         # Apply gradient scaling (before clipping).
         if self.apply_scale_grads:
-            grads_norm = np.linalg.norm(grads)
-            grads = (grads / grads_norm) * self.scale_grads
+            grads_scale = self.scale_grads / np.linalg.norm(grads)
+        else:
+            grads_scale = 1.
 
         # Apply gradient clipping.
         if self.apply_clip_grads:
-            grads = np.clip(grads, -self.clip_grads, self.clip_grads)
-
+            clip_grads = self.clip_grads
+        else:
+            clip_grads = np.inf
 
         # Do the vanilla update procedure.
         self.iteration_count += 1
         beta_1 = self.beta_1
         beta_2 = self.beta_2
         iteration_count = self.iteration_count
-        self.gradient_moment = (beta_1 * self.gradient_moment
-                                + (1 - beta_1) * grads)
-        self.gradient_square_moment = (beta_2 * self.gradient_square_moment
-                                       + (1 - beta_2) * np.square(grads))
-        gradient_moment_hat = np.divide(self.gradient_moment,
-                                        1 - np.power(beta_1, iteration_count))
-        gradient_square_moment_hat = np.divide(self.gradient_square_moment,
-                                               1 - np.power(beta_2, iteration_count))
+        _update_moments(np.ravel(grads), np.ravel(gradient_moment),
+                        np.ravel(gradient_square_moment), np.ravel(step),
+                        beta_1, beta_2,
+                        1 - np.power(beta_1, iteration_count),
+                        1 - np.power(beta_2, iteration_count),
+                        clip_grads, self.epsilon, grads_scale, learning_rate)
         
-        return params - learning_rate * np.divide(gradient_moment_hat,
-                                                  np.sqrt(gradient_square_moment_hat)
-                                                  + self.epsilon)
+        return np.subtract(params, step, out=out)
+
+
+@jit(nopython=True)
+def _update_moments(grads, gradient_moment, gradient_square_moment, step,
+                    beta_1, beta_2, bias_correction_1, bias_correction_2,
+                    clip_grads, epsilon, grads_scale, learning_rate):
+    """
+    Update the moments in place and write the step to `step`
+    in a single pass over the flattened arrays.
+    """
+    for i in range(grads.shape[0]):
+        grad = min(max(grads[i] * grads_scale, -clip_grads), clip_grads)
+        gradient_moment[i] = beta_1 * gradient_moment[i] + (1 - beta_1) * grad
+        gradient_square_moment[i] = (beta_2 * gradient_square_moment[i]
+                                     + (1 - beta_2) * grad * grad)
+        step[i] = (learning_rate * (gradient_moment[i] / bias_correction_1)
+                   / (np.sqrt(gradient_square_moment[i] / bias_correction_2) + epsilon))
+    #ENDFOR
@@ -2,14 +2,17 @@
 lbfgsb.py - a module to expose the L-BFGS-B optimization algorithm
 """
 
-from scipy.optimize import minimize
+from scipy.optimize import Bounds, minimize, OptimizeResult
 
 class LBFGSB(object):
     """
     The L-BFGS-B optimizer.
 
-    Fields: none
+    Fields:
+    box_bounds :: bool - this optimizer respects box bounds on the params,
+        so programs should supply them
     """
+    box_bounds = True
 
     def __init__(self):
         """
@@ -19,13 +22,15 @@ class LBFGSB(object):
 
 
     def run(self, function, iteration_count, 
-            initial_params, jacobian, args=()):
+            initial_params, jacobian, args=(), bounds=None):
         """
         Run the L-BFGS-B method.
 
         Args:
         args :: any - a tuple of arguments to pass to the function
             and jacobian
+        bounds :: tuple(numpy.ndarray) - the lower and upper bounds
+            on the params, which L-BFGS-B respects natively
         function :: any -> float
             - the function to minimize
         iteration_count :: int - how many iterations to perform
@@ -36,14 +41,43 @@ class LBFGSB(object):
         Returns:
         result :: scipy.optimize.OptimizeResult
         """
-        # Disregard termination conditions.
-        function_ = lambda *args, **kwargs: function(*args, **kwargs)[0]
-        jacobian_ = lambda *args, **kwargs: jacobian(*args, **kwargs)[0]
-        # NOTE: min_error termination not implemented
+        # Scipy evaluates the function and its jacobian at the same points,
+        # so they are passed as one callable. The jacobian is evaluated first
+        # so that `function` may reuse the error it computed.
+        def function_and_jacobian(params, *args):
+            grads, jacobian_terminate = jacobian(params, *args)
+            error, terminate = function(params, *args)
+            if terminate or jacobian_terminate:
+                raise _TerminateOptimization(params, error, grads)
+
+            return error, grads
+        #ENDDEF
         options = {
             "maxiter": iteration_count,
         }
+        if bounds is not None:
+            bounds = Bounds(bounds[0], bounds[1])
+
+        try:
+            result = minimize(function_and_jacobian, initial_params, args=args,
+                              method="L-BFGS-B", jac=True,
+                              bounds=bounds, options=options)
+        except _TerminateOptimization as termination:
+            result = OptimizeResult(x=termination.params, fun=termination.error,
+                                    jac=termination.grads, success=True, status=0,
+                                    message="The error fell below the minimum error.")
+
+        return result
+
 
-        return minimize(function_, initial_params, args=args,
-                        method="L-BFGS-B", jac=jacobian_,
-                        options=options)
+class _TerminateOptimization(Exception):
+    """
+    This exception is raised to stop scipy's minimization
+    when the function reports that optimization should terminate.
+    """
+
+    def __init__(self, params, error, grads):
+        super().__init__()
+        self.error = error
+        self.grads = grads
+        self.params = params
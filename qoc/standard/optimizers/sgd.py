@@ -10,9 +10,12 @@ class SGD(object):
     This implementation follows intuition.
 
     Fields:
+    box_bounds :: bool - this optimizer respects box bounds on the params,
+        so programs should supply them
     learning_rate :: float - the initial step size
     """
     name = "sgd"
+    box_bounds = True
 
     def __init__(self, learning_rate=1e-3):
         """
@@ -23,16 +26,23 @@ class SGD(object):
 
 
     def run(self, function, iteration_count,
-            initial_params, jacobian, args=()):
+            initial_params, jacobian, args=(), bounds=None,
+            initial_state=None):
         """
         Run a SGD optimization series.
         Args:
         args :: any - a tuple of arguments to pass to the function
             and jacobian
+        bounds :: tuple(numpy.ndarray) - the lower and upper bounds
+            on the params, if specified, the params are projected onto
+            the bounds after each update
         function :: any -> float
             - the function to minimize
         iteration_count :: int - how many iterations to perform
         initial_params :: numpy.ndarray - the initial optimization values
+        initial_state :: dict - the internal state of the optimizer
+            returned by `get_state`, which is empty because this optimizer
+            does not carry state between iterations
         jacobian :: numpy.ndarray - the jacobian of the function
             with respect to the params
         Returns: none
@@ -43,6 +53,33 @@ class SGD(object):
             if terminate:
                 break
             params = self.update(grads, params)
+            # Project the params onto the bounds.
+            if bounds is not None:
+                params = np.clip(params, bounds[0], bounds[1])
+
+
+    def get_state(self):
+        """
+        Get the internal state of the optimizer, which is sufficient
+        to continue an optimization series with `run`.
+
+        Returns:
+        state :: dict - the internal state of the optimizer
+        """
+        return dict()
+
+
+    def set_state(self, state):
+        """
+        Set the internal state of the optimizer.
+
+        Arguments:
+        state :: dict - the internal state of the optimizer
+            returned by `get_state`
+
+        Returns: none
+        """
+        pass
 
 
     def update(self, grads, params):
@@ -0,0 +1,98 @@
+"""
+trustncg.py - a module to expose the trust-region Newton conjugate gradient
+optimization algorithm
+"""
+
+from scipy.optimize import Bounds, minimize, OptimizeResult
+
+from .lbfgsb import _TerminateOptimization
+
+class TrustNCG(object):
+    """
+    The trust-region Newton conjugate gradient optimizer.
+    Each iteration solves the trust-region subproblem with conjugate
+    gradient iterations, which only require products of the hessian
+    with vectors. The products must be supplied exactly. They are not
+    approximated by finite differences of the jacobian, because the jacobians
+    of the programs log, save and record every point they are evaluated at.
+
+    Fields:
+    box_bounds :: bool - this optimizer respects box bounds on the params,
+        so programs should supply them
+    hessian_vector_products :: bool - this optimizer consumes
+        hessian-vector products, so programs should supply them
+    """
+    name = "trust_ncg"
+    box_bounds = True
+    hessian_vector_products = True
+
+    def __init__(self):
+        """
+        See class docstring for argument information.
+        """
+        super().__init__()
+
+
+    def run(self, function, iteration_count,
+            initial_params, jacobian, args=(), bounds=None,
+            hessian_vector_product=None):
+        """
+        Run the trust-region Newton conjugate gradient method.
+        If `bounds` are specified, scipy's bound-constrained trust-region
+        method is used, which also solves its subproblems with
+        conjugate gradient iterations.
+
+        Args:
+        args :: any - a tuple of arguments to pass to the function,
+            jacobian and hessian-vector product
+        bounds :: tuple(numpy.ndarray) - the lower and upper bounds
+            on the params
+        function :: any -> float
+            - the function to minimize
+        hessian_vector_product :: (params :: numpy.ndarray, vector :: numpy.ndarray, any)
+            -> numpy.ndarray - a function that returns the product of the hessian
+            of `function` at `params` with `vector`
+        iteration_count :: int - how many iterations to perform
+        initial_params :: numpy.ndarray - the initial optimization values
+        jacobian :: any -> numpy.ndarray - a function that returns the jacobian
+            of `function`
+
+        Returns:
+        result :: scipy.optimize.OptimizeResult
+        """
+        if hessian_vector_product is None:
+            raise ValueError("The trust-region newton conjugate gradient optimizer "
+                             "requires a hessian_vector_product.")
+
+        # Scipy evaluates the function and its jacobian at the same points,
+        # so they are passed as one callable. The jacobian is evaluated first
+        # so that `function` may reuse the error it computed.
+        def function_and_jacobian(params, *args):
+            grads, jacobian_terminate = jacobian(params, *args)
+            error, terminate = function(params, *args)
+            if terminate or jacobian_terminate:
+                raise _TerminateOptimization(params, error, grads)
+
+            return error, grads
+        #ENDDEF
+
+        options = {
+            "maxiter": iteration_count,
+        }
+        if bounds is None:
+            method = "trust-ncg"
+        else:
+            bounds = Bounds(bounds[0], bounds[1])
+            method = "trust-constr"
+
+        try:
+            result = minimize(function_and_jacobian, initial_params, args=args,
+                              method=method, jac=True,
+                              hessp=hessian_vector_product,
+                              bounds=bounds, options=options)
+        except _TerminateOptimization as termination:
+            result = OptimizeResult(x=termination.params, fun=termination.error,
+                                    jac=termination.grads, success=True, status=0,
+                                    message="The error fell below the minimum error.")
+
+        return result
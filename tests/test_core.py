@@ -19,6 +19,23 @@ def test_clip_control_norms():
     assert(np.allclose(controls, expected_clipped_controls))
 
 
+def test_get_control_bounds():
+    import numpy as np
+    from qoc.core.common import get_control_bounds, strip_controls
+
+    # The bounds on real controls are the maximum norms.
+    max_control_norms = np.array((7, 8,))
+    lower_bounds, upper_bounds = get_control_bounds(False, (3, 2), max_control_norms)
+    assert(np.allclose(upper_bounds, np.tile(max_control_norms, 3)))
+    assert(np.allclose(lower_bounds, -upper_bounds))
+
+    # The bounds on complex controls apply to the real and imaginary parts.
+    lower_bounds, upper_bounds = get_control_bounds(True, (3, 2), max_control_norms)
+    assert(np.allclose(upper_bounds, np.tile(max_control_norms, 6)))
+    assert(np.allclose(lower_bounds, -upper_bounds))
+    assert(upper_bounds.shape == strip_controls(True, np.ones((3, 2), dtype=np.complex128)).shape)
+
+
 def test_strip_slap():
     import numpy as np
     from qoc.models.dummy import Dummy
@@ -60,6 +77,49 @@ def test_strip_slap():
     #ENDFOR
 
 
+def test_evaluate_control_costs():
+    import autograd
+    import numpy as np
+    from qoc.core import evolve_schroedinger_discrete
+    from qoc.core.common import evaluate_control_costs
+    from qoc.standard import (ControlNorm, ControlVariation, ForbidStates,
+                              SIGMA_X,)
+
+    # The control costs should agree with differentiating their sum directly.
+    control_count = 2
+    control_eval_count = 10
+    controls = np.random.rand(control_eval_count, control_count) + 0.5
+    max_control_norms = np.repeat(2, control_count)
+    control_costs = [ControlNorm(control_count, control_eval_count,
+                                 max_control_norms=max_control_norms),
+                     ControlVariation(control_count, control_eval_count,
+                                      max_control_norms=max_control_norms),]
+    total_cost = lambda controls_: sum(cost.cost(controls_, None, 0)
+                                       for cost in control_costs)
+    expected_error, expected_grads = autograd.value_and_grad(total_cost)(controls)
+    error, grads = evaluate_control_costs(control_costs, controls, 0)
+    assert(np.allclose(error, expected_error))
+    assert(np.allclose(grads, expected_grads))
+
+    # The evolution should report the control costs alongside the state costs.
+    evolution_time = 1
+    system_eval_count = 2
+    hamiltonian = lambda controls_, time: controls_[0] * SIGMA_X
+    initial_states = np.array([[[1], [0]]])
+    forbid_states = ForbidStates(np.array([[[[0], [1]]]]), system_eval_count)
+    control_norm = control_costs[0]
+    state_result = evolve_schroedinger_discrete(evolution_time, hamiltonian,
+                                                initial_states, system_eval_count,
+                                                controls=controls,
+                                                costs=[forbid_states],)
+    result = evolve_schroedinger_discrete(evolution_time, hamiltonian,
+                                          initial_states, system_eval_count,
+                                          controls=controls,
+                                          costs=[forbid_states, control_norm],)
+    assert(np.allclose(result.error,
+                       state_result.error + control_norm.cost(controls, None, 0)))
+
+
 ### qoc.core.lindbladdiscrete.py ###
 
 def test_evolve_lindblad_discrete():
@@ -244,6 +304,226 @@ def test_evolve_lindblad_discrete():
     #ENDFOR
 
 
+def test_evolve_lindblad_discrete_magnus():
+    """
+    Check that the magnus integration of the vectorized densities agrees
+    with the adaptive integration of the lindblad equation.
+    """
+    import numpy as np
+
+    from qoc.core.lindbladdiscrete import evolve_lindblad_discrete
+    from qoc.models import IntegrationPolicy, MagnusPolicy
+    from qoc.standard import (SIGMA_X, SIGMA_Z, SIGMA_MINUS,
+                              TargetDensityInfidelity,)
+
+    evolution_time = 2
+    system_eval_count = 21
+    controls = np.random.rand(5, 1)
+    hamiltonian = lambda controls, time: controls[0] * SIGMA_X + 0.3 * SIGMA_Z
+    lindblad_data = lambda time: (np.array((0.1,)), np.stack((SIGMA_MINUS,)))
+    initial_densities = np.array((((1, 0), (0, 0)), ((0.5, 0.5), (0.5, 0.5)),),
+                                 dtype=np.complex128)
+    costs = [TargetDensityInfidelity(initial_densities[::-1])]
+    result = evolve_lindblad_discrete(evolution_time, initial_densities,
+                                      system_eval_count, controls=controls,
+                                      costs=costs, hamiltonian=hamiltonian,
+                                      lindblad_data=lindblad_data,)
+    magnus_result = evolve_lindblad_discrete(evolution_time, initial_densities,
+                                             system_eval_count, controls=controls,
+                                             costs=costs, hamiltonian=hamiltonian,
+                                             integration_policy=IntegrationPolicy.MAGNUS,
+                                             lindblad_data=lindblad_data,
+                                             magnus_policy=MagnusPolicy.M4,)
+    assert(np.allclose(magnus_result.final_densities, result.final_densities,
+                       atol=1e-5))
+    assert(np.allclose(magnus_result.error, result.error, atol=1e-5))
+
+
+def test_evolve_lindblad_discrete_fixed_step():
+    """
+    Check that the fixed step integration policies converge to the
+    adaptive integration of the lindblad equation at their expected order.
+    """
+    import numpy as np
+
+    from qoc.core.lindbladdiscrete import evolve_lindblad_discrete
+    from qoc.models import IntegrationPolicy
+    from qoc.standard import SIGMA_X, SIGMA_Z, SIGMA_MINUS
+
+    evolution_time = 2
+    controls = np.random.rand(5, 1)
+    hamiltonian = lambda controls, time: controls[0] * SIGMA_X + 0.3 * SIGMA_Z
+    lindblad_data = (np.array((0.2, 0.1,)), np.stack((SIGMA_MINUS, SIGMA_Z,)))
+    initial_densities = np.array((((1, 0), (0, 0)), ((0.5, 0.5), (0.5, 0.5)),),
+                                 dtype=np.complex128)
+    evolve = lambda system_eval_count, integration_policy: (
+        evolve_lindblad_discrete(evolution_time, initial_densities,
+                                 system_eval_count, controls=controls,
+                                 hamiltonian=hamiltonian,
+                                 integration_policy=integration_policy,
+                                 lindblad_data=lindblad_data,).final_densities)
+    expected_densities = evolve(11, IntegrationPolicy.RKDP5)
+    for integration_policy, order in ((IntegrationPolicy.RK4, 4),
+                                      (IntegrationPolicy.EXPONENTIAL_EULER, 1),
+                                      (IntegrationPolicy.SDIRK2, 2),):
+        coarse_error = np.max(np.abs(evolve(51, integration_policy) - expected_densities))
+        fine_error = np.max(np.abs(evolve(101, integration_policy) - expected_densities))
+        # Halving the step should shrink the error by about 2 ** order.
+        assert(fine_error < coarse_error * 2 ** (1 - order))
+    #ENDFOR
+
+    # The implicit policy should remain stable with steps far beyond
+    # the explicit stability limit of a strongly dissipative system.
+    lindblad_data = (np.array((200., 0.1,)), np.stack((SIGMA_MINUS, SIGMA_Z,)))
+    expected_densities = evolve(11, IntegrationPolicy.RKDP5)
+    densities = evolve(11, IntegrationPolicy.SDIRK2)
+    assert(np.allclose(densities, expected_densities, atol=1e-6))
+
+
+def test_evolve_lindblad_discrete_constant():
+    """
+    Check that time-independent lindblad data may be given directly.
+    """
+    import numpy as np
+
+    from qoc.core.lindbladdiscrete import evolve_lindblad_discrete
+    from qoc.models import IntegrationPolicy
+    from qoc.standard import SIGMA_X, SIGMA_Z, SIGMA_MINUS
+
+    evolution_time = 1
+    system_eval_count = 11
+    controls = np.random.rand(5, 1)
+    hamiltonian = lambda controls, time: controls[0] * SIGMA_X + 0.3 * SIGMA_Z
+    dissipators = np.array((0.1, 0.2,))
+    operators = np.stack((SIGMA_MINUS, SIGMA_Z,))
+    initial_densities = np.array((((1, 0), (0, 0)), ((0.5, 0.5), (0.5, 0.5)),),
+                                 dtype=np.complex128)
+    for integration_policy in IntegrationPolicy:
+        result = evolve_lindblad_discrete(evolution_time, initial_densities,
+                                          system_eval_count, controls=controls,
+                                          hamiltonian=hamiltonian,
+                                          integration_policy=integration_policy,
+                                          lindblad_data=lambda time: (dissipators, operators),)
+        constant_result = evolve_lindblad_discrete(evolution_time, initial_densities,
+                                                   system_eval_count, controls=controls,
+                                                   hamiltonian=hamiltonian,
+                                                   integration_policy=integration_policy,
+                                                   lindblad_data=(dissipators, operators),)
+        assert(np.allclose(constant_result.final_densities, result.final_densities))
+    #ENDFOR
+
+
+def test_evolve_lindblad_discrete_packed():
+    """
+    Check that the densities are propagated and saved in their
+    hermitian packed representation.
+    """
+    import os
+    import tempfile
+
+    import h5py
+    import numpy as np
+
+    from qoc.core.lindbladdiscrete import evolve_lindblad_discrete
+    from qoc.models import DensityPolicy, IntegrationPolicy
+    from qoc.standard import (SIGMA_X, SIGMA_Z, SIGMA_MINUS,
+                              TargetDensityInfidelity,
+                              TargetDensityInfidelityTime,
+                              unpack_hermitian,)
+
+    evolution_time = 2
+    system_eval_count = 11
+    controls = np.random.rand(5, 1)
+    hamiltonian = lambda controls, time: controls[0] * SIGMA_X + 0.3 * SIGMA_Z
+    lindblad_data = (np.array((0.2, 0.1,)), np.stack((SIGMA_MINUS, SIGMA_Z,)))
+    initial_densities = np.array((((1, 0), (0, 0)), ((0.5, 0.5j), (-0.5j, 0.5)),),
+                                 dtype=np.complex128)
+    costs = [TargetDensityInfidelity(initial_densities[::-1]),
+             TargetDensityInfidelityTime(system_eval_count, initial_densities[::-1]),]
+    with tempfile.TemporaryDirectory() as save_dir:
+        for integration_policy in (IntegrationPolicy.MAGNUS, IntegrationPolicy.SDIRK2,
+                                   IntegrationPolicy.RK4,):
+            evolve = lambda density_policy, save_file_path: (
+                evolve_lindblad_discrete(evolution_time, initial_densities,
+                                         system_eval_count, controls=controls,
+                                         costs=costs, density_policy=density_policy,
+                                         hamiltonian=hamiltonian,
+                                         integration_policy=integration_policy,
+                                         lindblad_data=lindblad_data,
+                                         save_file_path=save_file_path,
+                                         save_intermediate_densities=True,))
+            full_save_file_path = os.path.join(save_dir, "full.h5")
+            packed_save_file_path = os.path.join(save_dir, "packed.h5")
+            result = evolve(DensityPolicy.FULL, full_save_file_path)
+            packed_result = evolve(DensityPolicy.HERMITIAN_PACKED, packed_save_file_path)
+            assert(np.allclose(packed_result.final_densities, result.final_densities))
+            assert(np.allclose(packed_result.error, result.error))
+            with h5py.File(full_save_file_path, "r") as full_save_file:
+                intermediate_densities = full_save_file["intermediate_densities"][()]
+            with h5py.File(packed_save_file_path, "r") as packed_save_file:
+                packed_intermediate_densities = packed_save_file["intermediate_densities"][()]
+            assert(packed_intermediate_densities.shape == (system_eval_count, 2, 4))
+            assert(packed_intermediate_densities.dtype == np.float64)
+            assert(np.allclose(unpack_hermitian(packed_intermediate_densities),
+                               intermediate_densities))
+        #ENDFOR
+
+
+def test_evolve_lindblad_discrete_low_rank():
+    """
+    Check that the evolution of the density factors agrees with the
+    exponential euler evolution of the full densities.
+    """
+    from autograd import grad
+    import numpy as np
+
+    from qoc.core.lindbladdiscrete import evolve_lindblad_discrete
+    from qoc.models import DensityPolicy, IntegrationPolicy
+    from qoc.standard import (get_annihilation_operator, get_creation_operator,
+                              ForbidDensities, TargetDensityInfidelity,
+                              TargetDensityInfidelityTime,)
+
+    hilbert_size = 8
+    evolution_time = 1
+    system_eval_count = 11
+    annihilation_operator = get_annihilation_operator(hilbert_size)
+    creation_operator = get_creation_operator(hilbert_size)
+    hamiltonian = lambda controls, time: (0.1 * np.matmul(creation_operator,
+                                                          annihilation_operator)
+                                          + controls[0] * (annihilation_operator
+                                                           + creation_operator))
+    lindblad_data = (np.array((0.05,)), np.stack((annihilation_operator,)))
+    initial_densities = np.zeros((2, hilbert_size, hilbert_size), dtype=np.complex128)
+    initial_densities[0, 0, 0] = initial_densities[1, 1, 1] = 1
+    costs = [ForbidDensities(initial_densities[:, None], system_eval_count),
+             TargetDensityInfidelity(initial_densities[::-1]),
+             TargetDensityInfidelityTime(system_eval_count, initial_densities[::-1]),]
+    controls = np.random.rand(5, 1)
+    evolve = lambda controls_, density_policy, integration_policy: (
+        evolve_lindblad_discrete(evolution_time, initial_densities,
+                                 system_eval_count, controls=controls_,
+                                 costs=costs, density_policy=density_policy,
+                                 hamiltonian=hamiltonian,
+                                 integration_policy=integration_policy,
+                                 lindblad_data=lindblad_data,))
+    policy = IntegrationPolicy.EXPONENTIAL_EULER
+    result = evolve(controls, DensityPolicy.FULL, policy)
+    low_rank_result = evolve(controls, DensityPolicy.LOW_RANK, policy)
+    assert(np.allclose(low_rank_result.final_densities, result.final_densities))
+    assert(np.allclose(low_rank_result.error, result.error))
+    grads = grad(lambda controls_: evolve(controls_, DensityPolicy.FULL, policy).error)(controls)
+    low_rank_grads = grad(lambda controls_: evolve(controls_, DensityPolicy.LOW_RANK,
+                                                   policy).error)(controls)
+    assert(np.allclose(low_rank_grads, grads))
+
+    # The density factors are only propagated by the exponential euler policy.
+    try:
+        evolve(controls, DensityPolicy.LOW_RANK, IntegrationPolicy.RK4)
+        assert(False)
+    except ValueError:
+        pass
+
+
 def test_grape_lindblad_discrete():
     """
     Run end-to-end test on the grape_lindblad_discrete function.
@@ -290,6 +570,162 @@ def test_grape_lindblad_discrete():
                              max_control_norms[i]).all())
 
 
+def test_evaluate_lindblad_discrete_rkdp5_grads():
+    """
+    Check that the gradients through the adaptive RKDP5 integration agree
+    with finite differences on a driven, damped three level system.
+    """
+    import autograd
+    import numpy as np
+
+    from qoc.core.lindbladdiscrete import evolve_lindblad_discrete
+    from qoc.models import IntegrationPolicy
+    from qoc.standard import (conjugate_transpose, get_annihilation_operator,
+                              TargetDensityInfidelity,)
+
+    hilbert_size = 3
+    annihilation_operator = get_annihilation_operator(hilbert_size)
+    creation_operator = conjugate_transpose(annihilation_operator)
+    number_operator = np.matmul(creation_operator, annihilation_operator)
+    initial_states = np.array([[[1], [0], [0]]])
+    target_states = np.array([[[0], [0], [1]]])
+    initial_densities = np.matmul(initial_states, conjugate_transpose(initial_states))
+    target_densities = np.matmul(target_states, conjugate_transpose(target_states))
+    costs = [TargetDensityInfidelity(target_densities)]
+    hamiltonian = lambda controls, time: (controls[0] * (annihilation_operator
+                                                         + creation_operator)
+                                          + controls[1] * number_operator)
+    lindblad_dissipators = np.array([1e-1])
+    lindblad_operators = np.array([annihilation_operator])
+    lindblad_data = lambda time: (lindblad_dissipators, lindblad_operators)
+    control_eval_count = system_eval_count = 10
+    evolution_time = 2
+    error = lambda controls: evolve_lindblad_discrete(evolution_time, initial_densities,
+                                                      system_eval_count,
+                                                      controls=controls, costs=costs,
+                                                      hamiltonian=hamiltonian,
+                                                      integration_policy=IntegrationPolicy.RKDP5,
+                                                      lindblad_data=lindblad_data,).error
+    random = np.random.default_rng(0)
+    controls = random.uniform(-1, 1, (control_eval_count, 2))
+    grads = np.real(autograd.grad(error)(controls))
+
+    # The adaptive mesh changes with the controls, so the finite difference
+    # step is chosen well above the integration tolerance.
+    step = 1e-4
+    for i in range(3):
+        direction = random.uniform(-1, 1, controls.shape)
+        derivative = np.sum(grads * direction)
+        derivative_fd = ((error(controls + step * direction)
+                          - error(controls - step * direction)) / (2 * step))
+        assert(np.allclose(derivative, derivative_fd, atol=1e-6))
+    #ENDFOR
+
+
+def test_grape_lindblad_discrete_hessian():
+    """
+    Check that the hessian-vector products agree with finite differences
+    of the jacobian.
+    """
+    import numpy as np
+
+    from qoc.core.lindbladdiscrete import grape_lindblad_discrete
+    from qoc.models import IntegrationPolicy
+    from qoc.standard import (conjugate_transpose, SIGMA_MINUS, SIGMA_X, SIGMA_Z,
+                              TargetDensityInfidelity,)
+
+    class HessianCheck(object):
+        hessian_vector_products = True
+        def run(self, function, iteration_count, initial_params, jacobian,
+                args=(), bounds=None, hessian_vector_product=None):
+            params = initial_params + 1e-1 * np.random.rand(*initial_params.shape)
+            vector = np.random.rand(*initial_params.shape)
+            step = 1e-6
+            grads_plus, _ = jacobian(params + step * vector, *args)
+            grads_minus, _ = jacobian(params - step * vector, *args)
+            hessian_vector_product_fd = (grads_plus - grads_minus) / (2 * step)
+            hessian_vector_product_ = hessian_vector_product(params, vector, *args)
+            assert(np.allclose(hessian_vector_product_, hessian_vector_product_fd,
+                               atol=1e-6))
+
+    initial_states = np.array([[[1], [0]], [[0], [1]]])
+    target_states = np.array([[[0], [1]], [[1], [0]]])
+    initial_densities = np.matmul(initial_states, conjugate_transpose(initial_states))
+    target_densities = np.matmul(target_states, conjugate_transpose(target_states))
+    control_count = 2
+    evolution_time = 1
+    control_eval_count = 5
+    system_eval_count = 9
+    costs = [TargetDensityInfidelity(target_densities)]
+    hamiltonian = lambda controls, time: (controls[0] * SIGMA_X
+                                          + controls[1] * SIGMA_Z)
+    lindblad_operators = np.array([SIGMA_MINUS])
+    lindblad_dissipators = np.array([1e-1])
+    lindblad_data = lambda time: (lindblad_dissipators, lindblad_operators)
+    grape_lindblad_discrete(control_count, control_eval_count,
+                            costs, evolution_time,
+                            initial_densities,
+                            system_eval_count,
+                            hamiltonian=hamiltonian,
+                            integration_policy=IntegrationPolicy.MAGNUS,
+                            iteration_count=1,
+                            lindblad_data=lindblad_data,
+                            log_iteration_step=0,
+                            optimizer=HessianCheck(),)
+
+
+### qoc.core.lindbladtrajectories.py ###
+
+def test_evolve_lindblad_trajectories():
+    """
+    Check that the trajectory-averaged densities agree with the
+    density matrix evolution, and that the trajectories are reproducible.
+    """
+    import numpy as np
+
+    from qoc.core import (evolve_lindblad_discrete,
+                          evolve_lindblad_trajectories,)
+    from qoc.standard import (conjugate_transpose, SIGMA_X, SIGMA_Z,
+                              SIGMA_MINUS, TargetDensityInfidelity,)
+
+    evolution_time = 2
+    system_eval_count = 11
+    controls = np.random.rand(5, 1)
+    hamiltonian = lambda controls, time: controls[0] * SIGMA_X + 0.3 * SIGMA_Z
+    lindblad_data = (np.array((0.25, 0.2,)), np.stack((SIGMA_MINUS, SIGMA_Z,)))
+    initial_states = np.array((((1,), (0,)), ((0,), (1,)),), dtype=np.complex128)
+    initial_densities = np.matmul(initial_states, conjugate_transpose(initial_states))
+    costs = [TargetDensityInfidelity(initial_densities[::-1])]
+    result = evolve_lindblad_discrete(evolution_time, initial_densities,
+                                      system_eval_count, controls=controls,
+                                      costs=costs, hamiltonian=hamiltonian,
+                                      lindblad_data=lindblad_data,)
+    trajectories_result = evolve_lindblad_trajectories(evolution_time, initial_states,
+                                                       system_eval_count,
+                                                       controls=controls, costs=costs,
+                                                       hamiltonian=hamiltonian,
+                                                       lindblad_data=lindblad_data,
+                                                       seed=0,
+                                                       trajectory_batch_size=1000,
+                                                       trajectory_count=4000,
+                                                       trajectory_step_multiplier=10,)
+    # The statistical error is on the order of 1 / sqrt(trajectory_count).
+    assert(np.allclose(trajectories_result.final_densities, result.final_densities,
+                       atol=5e-2))
+    assert(np.allclose(trajectories_result.error, result.error, atol=5e-2))
+
+    # The same seed should yield the same trajectories.
+    seeded_results = [evolve_lindblad_trajectories(evolution_time, initial_states,
+                                                   system_eval_count,
+                                                   controls=controls,
+                                                   hamiltonian=hamiltonian,
+                                                   lindblad_data=lindblad_data,
+                                                   seed=1, trajectory_count=50,)
+                      for _ in range(2)]
+    assert(np.allclose(seeded_results[0].final_densities,
+                       seeded_results[1].final_densities))
+
+
 ### qoc.core.mathmethods.py ###
 
 def test_get_lindbladian():
@@ -309,6 +745,56 @@ def test_get_lindbladian():
                                      (-0.5, 0)))
     assert(np.allclose(lindbladian, expected_lindbladian))
 
+    # Test the batched dissipator against the definition, term by term.
+    hilbert_size = 4
+    operator_count = 10
+    densities = np.stack([random_hermitian_matrix(hilbert_size) for _ in range(3)])
+    hamiltonian = random_hermitian_matrix(hilbert_size)
+    dissipators = np.random.rand(operator_count)
+    operators = np.stack([random_complex_matrix(hilbert_size)
+                          for _ in range(operator_count)])
+    expected_lindbladian = -1j * (np.matmul(hamiltonian, densities)
+                                  - np.matmul(densities, hamiltonian))
+    for dissipator, operator in zip(dissipators, operators):
+        operator_dagger = operator.conjugate().T
+        operator_product = np.matmul(operator_dagger, operator)
+        expected_lindbladian = (expected_lindbladian
+                                + dissipator * (np.matmul(np.matmul(operator, densities),
+                                                          operator_dagger)
+                                                - 0.5 * np.matmul(operator_product, densities)
+                                                - 0.5 * np.matmul(densities, operator_product)))
+    #ENDFOR
+    lindbladian = get_lindbladian(densities, dissipators, hamiltonian, operators)
+    assert(np.allclose(lindbladian, expected_lindbladian))
+
+
+def test_get_lindbladian_superoperator():
+    import numpy as np
+    from qoc.core.mathmethods import (get_lindbladian,
+                                      get_lindbladian_superoperator,)
+
+    # The superoperator should act on row-major vectorized densities
+    # as get_lindbladian acts on the densities.
+    hilbert_size = 4
+    density_count = 2
+    densities = np.stack([random_hermitian_matrix(hilbert_size)
+                          for _ in range(density_count)])
+    hamiltonian = random_hermitian_matrix(hilbert_size)
+    dissipators = np.random.rand(3)
+    operators = np.stack([random_complex_matrix(hilbert_size) for _ in range(3)])
+    for dissipators_, hamiltonian_, operators_ in ((dissipators, hamiltonian, operators),
+                                                   (None, hamiltonian, None),
+                                                   (dissipators, None, operators),):
+        superoperator = get_lindbladian_superoperator(hilbert_size, dissipators_,
+                                                      hamiltonian_, operators_)
+        lindbladian = np.matmul(superoperator,
+                                np.reshape(densities, (density_count, hilbert_size ** 2, 1)))
+        expected_lindbladian = get_lindbladian(densities, dissipators_,
+                                               hamiltonian_, operators_)
+        assert(np.allclose(np.reshape(lindbladian, densities.shape),
+                           expected_lindbladian))
+    #ENDFOR
+
 
 def test_interpolate_linear_points():
     import numpy as np
@@ -392,6 +878,15 @@ def test_rkdp5():
 
     assert(np.allclose(y_1, y_1_expected))
 
+    # Dense output at many points, each visited exactly once by the callback.
+    x_eval = np.linspace(x0, x1, 101)[1:]
+    x_eval_indices = list()
+    y_eval = integrate_rkdp5(rhs, x_eval, x0, y0,
+                             eval_callback=lambda i, y: x_eval_indices.append(i))
+    assert(y_eval.shape == (len(x_eval), *y0.shape))
+    assert(np.allclose(y_eval[:, 0], y_sol(x_eval)))
+    assert(x_eval_indices == list(range(len(x_eval))))
+
     if COMPARE:
         from scipy.integrate import ode, solve_ivp
 
@@ -602,6 +1097,805 @@ def test_grape_schroedinger_discrete():
                              max_control_norms[i]).all())
 
 
+def test_grape_schroedinger_discrete_lbfgsb():
+    """
+    Check that L-BFGS-B evolves the system once per evaluation point,
+    and that it terminates once the error is below `min_error`.
+    """
+    import numpy as np
+
+    from qoc.core import (evolve_schroedinger_discrete,
+                          grape_schroedinger_discrete,)
+    from qoc.standard import (LBFGSB, SIGMA_X, SIGMA_Z,
+                              TargetStateInfidelity,)
+
+    hamiltonian_call_count = 0
+    def hamiltonian(controls, time):
+        nonlocal hamiltonian_call_count
+        hamiltonian_call_count += 1
+        return controls[0] * SIGMA_X + SIGMA_Z
+    initial_states = np.array([[[1], [0]]])
+    target_states = np.array([[[0], [1]]])
+    control_count = 1
+    evolution_time = 1
+    control_eval_count = system_eval_count = 11
+    costs = [TargetStateInfidelity(target_states)]
+    controls = np.ones((control_eval_count, control_count))
+    evolve_schroedinger_discrete(evolution_time, hamiltonian, initial_states,
+                                 system_eval_count, controls=controls, costs=costs)
+    evolution_call_count = hamiltonian_call_count
+
+    # The error is always below `min_error`, so a single evolution is performed.
+    hamiltonian_call_count = 0
+    grape_schroedinger_discrete(control_count, control_eval_count,
+                                costs, evolution_time,
+                                hamiltonian, initial_states,
+                                system_eval_count,
+                                initial_controls=controls,
+                                iteration_count=10,
+                                log_iteration_step=0,
+                                min_error=2,
+                                optimizer=LBFGSB(),)
+    assert(hamiltonian_call_count == evolution_call_count)
+
+
+def test_grape_custom_optimizer():
+    """
+    Check that the grape programs accept an optimizer that only implements
+    run(function, iteration_count, initial_params, jacobian, args),
+    and that the controls are still clipped to their maximum norms.
+    """
+    import numpy as np
+
+    from qoc.core import grape_lindblad_discrete, grape_schroedinger_discrete
+    from qoc.standard import (conjugate_transpose, SIGMA_X,
+                              TargetDensityInfidelity, TargetStateInfidelity,)
+
+    class GradientDescent(object):
+        def run(self, function, iteration_count, initial_params, jacobian,
+                args=()):
+            params = np.copy(initial_params)
+            for i in range(iteration_count):
+                grads, terminate = jacobian(params, *args)
+                if terminate:
+                    break
+                params = params - 1e2 * grads
+            #ENDFOR
+
+    hamiltonian = lambda controls, time: controls[0] * SIGMA_X
+    initial_states = np.array([[[1], [0]]])
+    target_states = np.array([[[0], [1]]])
+    initial_densities = np.matmul(initial_states, conjugate_transpose(initial_states))
+    target_densities = np.matmul(target_states, conjugate_transpose(target_states))
+    control_count = 1
+    evolution_time = 1
+    control_eval_count = system_eval_count = 5
+    max_control_norms = np.repeat(1e-1, control_count)
+    result = grape_schroedinger_discrete(control_count, control_eval_count,
+                                         [TargetStateInfidelity(target_states)],
+                                         evolution_time, hamiltonian,
+                                         initial_states, system_eval_count,
+                                         iteration_count=3,
+                                         log_iteration_step=0,
+                                         max_control_norms=max_control_norms,
+                                         optimizer=GradientDescent(),)
+    assert(np.all(np.abs(result.best_controls) <= max_control_norms))
+    result = grape_lindblad_discrete(control_count, control_eval_count,
+                                     [TargetDensityInfidelity(target_densities)],
+                                     evolution_time, initial_densities,
+                                     system_eval_count,
+                                     hamiltonian=hamiltonian,
+                                     iteration_count=3,
+                                     log_iteration_step=0,
+                                     max_control_norms=max_control_norms,
+                                     optimizer=GradientDescent(),)
+    assert(np.all(np.abs(result.best_controls) <= max_control_norms))
+
+
+def test_grape_schroedinger_discrete_trust_ncg():
+    """
+    Check that the hessian-vector products agree with finite differences
+    of the jacobian, and that the trust-region newton conjugate gradient
+    optimizer converges to the same minimum as L-BFGS-B.
+    """
+    import numpy as np
+
+    from qoc.core import grape_schroedinger_discrete
+    from qoc.standard import (conjugate_transpose, ControlNorm, get_fourier_basis,
+                              LBFGSB, SIGMA_PLUS, SIGMA_X, SIGMA_Z,
+                              TargetStateInfidelity, TrustNCG,)
+
+    class HessianCheck(object):
+        hessian_vector_products = True
+        def run(self, function, iteration_count, initial_params, jacobian,
+                args=(), bounds=None, hessian_vector_product=None):
+            params = initial_params + 1e-1 * np.random.rand(*initial_params.shape)
+            vector = np.random.rand(*initial_params.shape)
+            step = 1e-6
+            grads_plus, _ = jacobian(params + step * vector, *args)
+            grads_minus, _ = jacobian(params - step * vector, *args)
+            hessian_vector_product_fd = (grads_plus - grads_minus) / (2 * step)
+            hessian_vector_product_ = hessian_vector_product(params, vector, *args)
+            assert(np.allclose(hessian_vector_product_, hessian_vector_product_fd,
+                               atol=1e-6))
+
+    initial_states = np.array([[[1], [0]], [[0], [1]]])
+    target_states = np.array([[[0], [1]], [[1], [0]]])
+    control_count = 2
+    evolution_time = 1
+    control_eval_count = 5
+    system_eval_count = 9
+    max_control_norms = np.repeat(2., control_count)
+    costs = [TargetStateInfidelity(target_states),
+             ControlNorm(control_count, control_eval_count,
+                         max_control_norms=max_control_norms)]
+    real_hamiltonian = lambda controls, time: (controls[0] * SIGMA_X
+                                               + controls[1] * SIGMA_Z)
+    def complex_hamiltonian(controls, time):
+        hamiltonian_ = controls[0] * SIGMA_PLUS + controls[1] * SIGMA_Z
+        return hamiltonian_ + conjugate_transpose(hamiltonian_) + SIGMA_Z
+    for complex_controls, hamiltonian in ((False, real_hamiltonian),
+                                          (True, complex_hamiltonian)):
+        grape_schroedinger_discrete(control_count, control_eval_count,
+                                    costs, evolution_time,
+                                    hamiltonian, initial_states,
+                                    system_eval_count,
+                                    complex_controls=complex_controls,
+                                    iteration_count=1,
+                                    log_iteration_step=0,
+                                    max_control_norms=max_control_norms,
+                                    optimizer=HessianCheck(),)
+    #ENDFOR
+
+    # Where the controls are rescaled to their maximum norm, i.e. for complex
+    # controls and for controls that are expanded in a basis, the hessian
+    # is that of the function that the optimizer minimizes.
+    class HessianValueCheck(object):
+        hessian_vector_products = True
+        def run(self, function, iteration_count, initial_params, jacobian,
+                args=(), bounds=None, hessian_vector_product=None):
+            params = initial_params + 1e-1 * np.random.rand(*initial_params.shape)
+            vector = np.random.rand(*initial_params.shape)
+            step = 1e-4
+            error_plus, _ = function(params + step * vector, *args)
+            error, _ = function(params, *args)
+            error_minus, _ = function(params - step * vector, *args)
+            curvature_fd = (error_plus - 2 * error + error_minus) / step ** 2
+            curvature = np.dot(vector, hessian_vector_product(params, vector, *args))
+            assert(np.allclose(curvature, curvature_fd, atol=1e-5))
+
+    small_max_control_norms = np.repeat(1e-1, control_count)
+    for complex_controls, hamiltonian, control_basis in (
+            (True, complex_hamiltonian, None),
+            (False, real_hamiltonian, get_fourier_basis(3, control_eval_count)),):
+        grape_schroedinger_discrete(control_count, control_eval_count,
+                                    costs, evolution_time,
+                                    hamiltonian, initial_states,
+                                    system_eval_count,
+                                    complex_controls=complex_controls,
+                                    control_basis=control_basis,
+                                    iteration_count=1,
+                                    log_iteration_step=0,
+                                    max_control_norms=small_max_control_norms,
+                                    optimizer=HessianValueCheck(),)
+    #ENDFOR
+
+    # Check that the optimizer converges.
+    hamiltonian = lambda controls, time: controls[0] * SIGMA_X + SIGMA_Z
+    initial_states = np.array([[[1], [0]]])
+    target_states = np.array([[[0], [1]]])
+    control_count = 1
+    evolution_time = 4
+    control_eval_count = system_eval_count = 5
+    costs = [TargetStateInfidelity(target_states)]
+    max_control_norms = np.repeat(2., control_count)
+    best_errors = list()
+    for optimizer in (LBFGSB(), TrustNCG()):
+        result = grape_schroedinger_discrete(control_count, control_eval_count,
+                                             costs, evolution_time,
+                                             hamiltonian, initial_states,
+                                             system_eval_count,
+                                             iteration_count=20,
+                                             log_iteration_step=0,
+                                             max_control_norms=max_control_norms,
+                                             optimizer=optimizer,)
+        best_errors.append(result.best_error)
+    #ENDFOR
+    assert(np.allclose(best_errors[0], best_errors[1], atol=1e-6))
+
+
+def test_grape_schroedinger_discrete_in_place():
+    """
+    Check that optimizers which update their params in place
+    do not modify the best controls that were reported.
+    """
+    import numpy as np
+
+    from qoc.core import (evolve_schroedinger_discrete,
+                          grape_schroedinger_discrete,)
+    from qoc.standard import (Adadelta, Adafactor, SIGMA_X, SIGMA_Z,
+                              TargetStateInfidelity,)
+
+    hamiltonian = lambda controls, time: controls[0] * SIGMA_X + SIGMA_Z
+    initial_states = np.array([[[1], [0]]])
+    target_states = np.array([[[0], [1]]])
+    control_count = 1
+    evolution_time = 1
+    control_eval_count = system_eval_count = 5
+    costs = [TargetStateInfidelity(target_states)]
+    for optimizer in (Adadelta(learning_rate=10.),
+                      Adafactor(column_count=control_count, learning_rate=1e-1)):
+        result = grape_schroedinger_discrete(control_count, control_eval_count,
+                                             costs, evolution_time,
+                                             hamiltonian, initial_states,
+                                             system_eval_count,
+                                             iteration_count=5,
+                                             log_iteration_step=0,
+                                             optimizer=optimizer,)
+        evolve_result = evolve_schroedinger_discrete(evolution_time, hamiltonian,
+                                                     initial_states, system_eval_count,
+                                                     controls=result.best_controls,
+                                                     costs=costs)
+        assert(np.allclose(evolve_result.error, result.best_error))
+    #ENDFOR
+
+
+def test_grape_schroedinger_discrete_resume():
+    """
+    Check that an optimization run that is interrupted and resumed
+    from its last checkpoint matches an uninterrupted run exactly.
+    """
+    import os
+    import tempfile
+
+    import h5py
+    import numpy as np
+
+    from qoc.core import grape_schroedinger_discrete
+    from qoc.standard import (Adam, SIGMA_X, SIGMA_Z,
+                              TargetStateInfidelity,)
+
+    class Interruption(Exception):
+        pass
+
+    hamiltonian_call_count = 0
+    interrupt_call_count = None
+    def hamiltonian(controls, time):
+        nonlocal hamiltonian_call_count
+        hamiltonian_call_count += 1
+        if hamiltonian_call_count == interrupt_call_count:
+            raise Interruption()
+        # The random numbers check that the random state is restored.
+        return controls[0] * SIGMA_X + (1 + 1e-2 * np.random.rand()) * SIGMA_Z
+    initial_states = np.array([[[1], [0]]])
+    target_states = np.array([[[0], [1]]])
+    control_count = 1
+    evolution_time = 1
+    control_eval_count = system_eval_count = 5
+    costs = [TargetStateInfidelity(target_states)]
+    iteration_count = 10
+    save_iteration_step = 3
+    grape = lambda save_file_path, resume_from=None: (
+        grape_schroedinger_discrete(control_count, control_eval_count,
+                                    costs, evolution_time,
+                                    hamiltonian, initial_states,
+                                    system_eval_count,
+                                    iteration_count=iteration_count,
+                                    log_iteration_step=0,
+                                    optimizer=Adam(learning_rate=1e-1),
+                                    resume_from=resume_from,
+                                    save_file_path=save_file_path,
+                                    save_iteration_step=save_iteration_step,)
+    )
+    with tempfile.TemporaryDirectory() as save_dir:
+        save_file_path = os.path.join(save_dir, "full.h5")
+        np.random.seed(0)
+        result = grape(save_file_path)
+        random_number = np.random.rand()
+        calls_per_iteration = hamiltonian_call_count // iteration_count
+
+        # Interrupt the run in the middle of iteration 7,
+        # after the checkpoint at iteration 6 was saved.
+        resume_file_path = os.path.join(save_dir, "resume.h5")
+        hamiltonian_call_count = 0
+        interrupt_call_count = int(7.5 * calls_per_iteration)
+        np.random.seed(0)
+        try:
+            grape(resume_file_path)
+            raise AssertionError("The optimization run was not interrupted.")
+        except Interruption:
+            pass
+        interrupt_call_count = None
+        np.random.seed(1)
+        resume_result = grape(resume_file_path, resume_from=resume_file_path)
+        resume_random_number = np.random.rand()
+
+        assert(resume_result.best_error == result.best_error)
+        assert(resume_result.best_iteration == result.best_iteration)
+        assert(np.array_equal(resume_result.best_controls, result.best_controls))
+        assert(resume_random_number == random_number)
+        with h5py.File(save_file_path, "r") as save_file:
+            with h5py.File(resume_file_path, "r") as resume_save_file:
+                for name in ("controls", "error", "grads"):
+                    assert(np.array_equal(save_file[name][()],
+                                          resume_save_file[name][()]))
+                #ENDFOR
+                assert(resume_save_file["checkpoint"]["iteration"][()] == 9)
+            #ENDWITH
+        #ENDWITH
+    #ENDWITH
+
+
+def test_grape_schroedinger_discrete_batch():
+    """
+    Check that optimizing over mini-batches of the initial states
+    reduces to the full optimization when the estimates are exact,
+    and that the stochastic optimization makes progress.
+    """
+    import numpy as np
+
+    from qoc.core import (evolve_schroedinger_discrete,
+                          grape_schroedinger_discrete,)
+    from qoc.standard import (Adam, SIGMA_X, SIGMA_Y, SIGMA_Z,
+                              TargetStateInfidelity,)
+
+    hamiltonian = lambda controls, time: (controls[0] * SIGMA_X
+                                          + controls[1] * SIGMA_Y + SIGMA_Z)
+    plus = np.array([[1], [1]]) / np.sqrt(2)
+    minus = np.array([[1], [-1]]) / np.sqrt(2)
+    initial_states = np.array([[[1], [0]], [[0], [1]], plus, minus])
+    target_states = np.array([[[0], [1]], [[1], [0]], plus, -minus])
+    state_count = initial_states.shape[0]
+    control_count = 2
+    evolution_time = 2
+    control_eval_count = system_eval_count = 6
+    costs = [TargetStateInfidelity(target_states)]
+    iteration_count = 20
+    grape = lambda **kwargs: (
+        grape_schroedinger_discrete(control_count, control_eval_count,
+                                    costs, evolution_time,
+                                    hamiltonian, initial_states,
+                                    system_eval_count,
+                                    iteration_count=iteration_count,
+                                    log_iteration_step=0,
+                                    optimizer=Adam(learning_rate=1e-1),
+                                    **kwargs)
+    )
+    result = grape()
+
+    # A mini-batch of all the states is the full optimization.
+    batch_result = grape(batch_size=state_count)
+    assert(np.allclose(batch_result.best_error, result.best_error))
+    assert(np.allclose(batch_result.best_controls, result.best_controls))
+
+    # The variance reduced estimate is exact when the snapshot is refreshed
+    # every iteration.
+    svrg_result = grape(batch_size=1, variance_reduction_step=1)
+    assert(np.allclose(svrg_result.best_error, result.best_error))
+    assert(np.allclose(svrg_result.best_controls, result.best_controls))
+    # Every iteration evolves all of the states, rather than a mini-batch.
+    assert(not np.isnan(svrg_result.best_final_states).any())
+
+    # The stochastic optimization reduces the error of all the states
+    # from that of the default initial controls.
+    initial_controls = np.full((control_eval_count, control_count), 1e-1)
+    initial_error = evolve_schroedinger_discrete(evolution_time, hamiltonian,
+                                                 initial_states, system_eval_count,
+                                                 controls=initial_controls,
+                                                 costs=costs).error
+    for kwargs in ({"batch_size": 2},
+                   {"batch_size": 1, "variance_reduction_step": 5},):
+        np.random.seed(0)
+        stochastic_result = grape(**kwargs)
+        error = evolve_schroedinger_discrete(evolution_time, hamiltonian,
+                                             initial_states, system_eval_count,
+                                             controls=stochastic_result.best_controls,
+                                             costs=costs).error
+        assert(error < initial_error)
+        assert(np.isnan(stochastic_result.best_final_states).any())
+    #ENDFOR
+
+    # The batch size may not exceed the number of states.
+    try:
+        grape(batch_size=state_count + 1)
+        raise AssertionError("The program did not reject the batch size.")
+    except ValueError:
+        pass
+
+
+def test_krotov_schroedinger_discrete():
+    """
+    Check that Krotov's method converges monotonically and that the states
+    of each forward propagation are those of the updated controls.
+    """
+    import os
+    import tempfile
+
+    import h5py
+    import numpy as np
+
+    from qoc.core import (evolve_schroedinger_discrete,
+                          krotov_schroedinger_discrete,)
+    from qoc.standard import (ControlNorm, SIGMA_X, SIGMA_Y, SIGMA_Z,
+                              TargetStateInfidelity,)
+
+    hamiltonian = lambda controls, time: (controls[0] * SIGMA_X
+                                          + controls[1] * SIGMA_Y + SIGMA_Z)
+    initial_states = np.array([[[1], [0]], [[0], [1]]])
+    target_states = np.array([[[0], [1]], [[1], [0]]])
+    control_count = 2
+    evolution_time = 2
+    control_eval_count = system_eval_count = 21
+    costs = [TargetStateInfidelity(target_states)]
+    iteration_count = 30
+    with tempfile.TemporaryDirectory() as save_dir:
+        save_file_path = os.path.join(save_dir, "krotov.h5")
+        result = krotov_schroedinger_discrete(control_count, control_eval_count,
+                                              costs, evolution_time,
+                                              hamiltonian, initial_states,
+                                              system_eval_count,
+                                              iteration_count=iteration_count,
+                                              lambda_a=0.5,
+                                              log_iteration_step=0,
+                                              save_file_path=save_file_path,
+                                              save_iteration_step=1,)
+        with h5py.File(save_file_path, "r") as save_file:
+            saved_controls = save_file["controls"][()]
+            saved_errors = save_file["error"][()]
+            saved_updates = save_file["grads"][()]
+        #ENDWITH
+    #ENDWITH
+    assert(np.all(np.diff(saved_errors) <= 0))
+    assert(result.best_error < 1e-4)
+    assert(result.best_iteration == iteration_count - 1)
+    assert(np.allclose(saved_controls[1:], saved_controls[:-1] + saved_updates[:-1]))
+    for controls, error in zip(saved_controls, saved_errors):
+        evolve_result = evolve_schroedinger_discrete(evolution_time, hamiltonian,
+                                                     initial_states, system_eval_count,
+                                                     controls=controls, costs=costs)
+        assert(np.allclose(evolve_result.error, error))
+    #ENDFOR
+
+    # Costs that do not depend only on the final states are not supported.
+    try:
+        krotov_schroedinger_discrete(control_count, control_eval_count,
+                                     costs + [ControlNorm(control_count, control_eval_count)],
+                                     evolution_time, hamiltonian, initial_states,
+                                     system_eval_count, iteration_count=1,
+                                     log_iteration_step=0,)
+        raise AssertionError("The program did not reject the cost.")
+    except ValueError:
+        pass
+
+
+def test_goat_schroedinger_discrete():
+    """
+    Check the forward propagated gradients of goat_schroedinger_discrete
+    against finite differences, and that it optimizes a pulse.
+    """
+    import os
+    import tempfile
+
+    import autograd.numpy as anp
+    import h5py
+    import numpy as np
+
+    from qoc.core import (evolve_schroedinger_discrete,
+                          goat_schroedinger_discrete,)
+    from qoc.core.schroedingerdiscrete import _evaluate_goat_schroedinger_discrete
+    from qoc.models import GoatSchroedingerDiscreteState, MagnusPolicy
+    from qoc.standard import (LBFGSB, SIGMA_X, SIGMA_Y, SIGMA_Z,
+                              TargetStateInfidelity,)
+
+    evolution_time = 4
+    # A gaussian pulse with a DRAG-like derivative quadrature.
+    def pulse(params, time):
+        gaussian = params[0] * anp.exp(-(time - evolution_time / 2) ** 2
+                                       / (2 * params[2] ** 2))
+        return anp.array([gaussian, params[1] * (time - evolution_time / 2) * gaussian])
+    hamiltonian = lambda controls, time: (controls[0] * SIGMA_X
+                                          + controls[1] * SIGMA_Y + 1e-1 * SIGMA_Z)
+    initial_states = np.array([[[1], [0]], [[0], [1]]])
+    target_states = np.array([[[0], [1]], [[1], [0]]])
+    costs = [TargetStateInfidelity(target_states)]
+    initial_params = np.array([0.3, 0.1, 1.])
+    system_eval_count = 41
+    param_count = initial_params.shape[0]
+    step = 1e-6
+    for magnus_policy in MagnusPolicy:
+        pstate = GoatSchroedingerDiscreteState(costs, evolution_time, hamiltonian,
+                                               initial_params, initial_states, 1, 0,
+                                               magnus_policy, 0, None, None, pulse,
+                                               None, 0, system_eval_count,)
+        error, grads, final_states = _evaluate_goat_schroedinger_discrete(initial_params,
+                                                                          pstate)
+        # The evolution is that of the hamiltonian of the pulse.
+        evolve_result = evolve_schroedinger_discrete(evolution_time,
+                                                     lambda controls, time: (
+                                                         hamiltonian(pulse(initial_params, time),
+                                                                     time)),
+                                                     initial_states, system_eval_count,
+                                                     costs=costs, magnus_policy=magnus_policy)
+        assert(np.allclose(error, evolve_result.error))
+        assert(np.allclose(final_states, evolve_result.final_states))
+        for i, direction in enumerate(np.eye(param_count)):
+            error_plus, _, _ = _evaluate_goat_schroedinger_discrete(initial_params
+                                                                    + step * direction,
+                                                                    pstate, sensitivities=False)
+            error_minus, _, _ = _evaluate_goat_schroedinger_discrete(initial_params
+                                                                     - step * direction,
+                                                                     pstate, sensitivities=False)
+            assert(np.allclose(grads[i], (error_plus - error_minus) / (2 * step), atol=1e-7))
+        #ENDFOR
+    #ENDFOR
+
+    with tempfile.TemporaryDirectory() as save_dir:
+        save_file_path = os.path.join(save_dir, "goat.h5")
+        iteration_count = 20
+        result = goat_schroedinger_discrete(costs, evolution_time, hamiltonian,
+                                            initial_params, initial_states, pulse,
+                                            system_eval_count,
+                                            iteration_count=iteration_count,
+                                            log_iteration_step=0,
+                                            optimizer=LBFGSB(),
+                                            save_file_path=save_file_path,
+                                            save_iteration_step=1,)
+        with h5py.File(save_file_path, "r") as save_file:
+            assert(save_file["controls"].shape[1:] == (system_eval_count, 2))
+            best_params = save_file["params"][result.best_iteration]
+            best_error = save_file["error"][result.best_iteration]
+        #ENDWITH
+    #ENDWITH
+    assert(result.best_error < 1e-6)
+    assert(np.array_equal(best_params, result.best_params))
+    assert(best_error == result.best_error)
+
+
+def test_grape_control_basis():
+    """
+    Check that the gradients with respect to the coefficients of the controls
+    in a basis agree with finite differences, and that the optimized
+    controls lie in the span of the basis.
+    """
+    import numpy as np
+
+    from qoc.core import (grape_lindblad_discrete,
+                          grape_schroedinger_discrete,)
+    from qoc.models import IntegrationPolicy
+    from qoc.standard import (conjugate_transpose, get_fourier_basis,
+                              LBFGSB, SIGMA_PLUS, SIGMA_X, SIGMA_Z,
+                              TargetDensityInfidelity, TargetStateInfidelity,)
+
+    class GradientCheck(object):
+        def run(self, function, iteration_count, initial_params, jacobian,
+                args=(), bounds=None):
+            assert(bounds is None)
+            assert(initial_params.size == param_count)
+            params = initial_params + 1e-1 * np.random.rand(*initial_params.shape)
+            grads, _ = jacobian(params, *args)
+            step = 1e-6
+            for i, direction in enumerate(np.eye(params.size)):
+                error_plus, _ = function(params + step * direction, *args)
+                error_minus, _ = function(params - step * direction, *args)
+                assert(np.allclose(grads[i], (error_plus - error_minus) / (2 * step),
+                                   atol=1e-7))
+            #ENDFOR
+
+    initial_states = np.array([[[1], [0]], [[0], [1]]])
+    target_states = np.array([[[0], [1]], [[1], [0]]])
+    control_count = 2
+    evolution_time = 2
+    control_eval_count = system_eval_count = 21
+    basis_size = 5
+    control_basis = get_fourier_basis(basis_size, control_eval_count)
+    max_control_norms = np.repeat(10., control_count)
+    costs = [TargetStateInfidelity(target_states)]
+    real_hamiltonian = lambda controls, time: (controls[0] * SIGMA_X
+                                               + controls[1] * SIGMA_Z)
+    def complex_hamiltonian(controls, time):
+        hamiltonian_ = controls[0] * SIGMA_PLUS + controls[1] * SIGMA_Z
+        return hamiltonian_ + conjugate_transpose(hamiltonian_) + SIGMA_Z
+    for complex_controls, hamiltonian in ((False, real_hamiltonian),
+                                          (True, complex_hamiltonian)):
+        param_count = basis_size * control_count * (2 if complex_controls else 1)
+        grape_schroedinger_discrete(control_count, control_eval_count,
+                                    costs, evolution_time,
+                                    hamiltonian, initial_states,
+                                    system_eval_count,
+                                    complex_controls=complex_controls,
+                                    control_basis=control_basis,
+                                    iteration_count=1,
+                                    log_iteration_step=0,
+                                    max_control_norms=max_control_norms,
+                                    optimizer=GradientCheck(),)
+    #ENDFOR
+
+    # Check that the optimized controls are expanded in the basis.
+    result = grape_schroedinger_discrete(control_count, control_eval_count,
+                                         costs, evolution_time,
+                                         real_hamiltonian, initial_states,
+                                         system_eval_count,
+                                         control_basis=control_basis,
+                                         iteration_count=20,
+                                         log_iteration_step=0,
+                                         max_control_norms=max_control_norms,
+                                         optimizer=LBFGSB(),)
+    coefficients, _, _, _ = np.linalg.lstsq(control_basis, result.best_controls, rcond=None)
+    assert(np.allclose(np.matmul(control_basis, coefficients), result.best_controls))
+    assert(result.best_error < 1e-6)
+
+    # The lindblad program shares the basis expansion.
+    initial_densities = np.matmul(initial_states, conjugate_transpose(initial_states))
+    target_densities = np.matmul(target_states, conjugate_transpose(target_states))
+    param_count = basis_size * control_count
+    grape_lindblad_discrete(control_count, control_eval_count,
+                            [TargetDensityInfidelity(target_densities)],
+                            evolution_time, initial_densities, system_eval_count,
+                            control_basis=control_basis,
+                            hamiltonian=real_hamiltonian,
+                            integration_policy=IntegrationPolicy.MAGNUS,
+                            iteration_count=1,
+                            log_iteration_step=0,
+                            max_control_norms=max_control_norms,
+                            optimizer=GradientCheck(),)
+
+
+def test_min_time_schroedinger_discrete():
+    """
+    Check that the minimum-time driver finds the shortest evolution time
+    of a rotation with a bounded drive.
+    """
+    import os
+    import tempfile
+
+    import h5py
+    import numpy as np
+
+    from qoc.core import min_time_schroedinger_discrete
+    from qoc.standard import (ControlBandwidthMax, LBFGSB, SIGMA_X,
+                              TargetStateInfidelity,)
+
+    # The state is flipped with an infidelity of at most `min_error`
+    # once |control| * evolution_time >= arcsin(sqrt(1 - min_error)).
+    hamiltonian = lambda controls, time: controls[0] * SIGMA_X
+    initial_states = np.array([[[1], [0]]])
+    target_states = np.array([[[0], [1]]])
+    control_count = 1
+    control_eval_count = system_eval_count = 6
+    costs = [TargetStateInfidelity(target_states)]
+    max_control_norms = np.ones(control_count)
+    min_error = 1e-3
+    min_evolution_time = np.arcsin(np.sqrt(1 - min_error)) / max_control_norms[0]
+    time_tolerance = 1e-2
+    min_time = lambda max_evolution_time: (
+        min_time_schroedinger_discrete(control_count, control_eval_count, costs,
+                                       hamiltonian, initial_states,
+                                       max_evolution_time, min_error,
+                                       system_eval_count,
+                                       time_tolerance=time_tolerance,
+                                       iteration_count=50,
+                                       max_control_norms=max_control_norms,
+                                       optimizer=LBFGSB(),)
+    )
+    result = min_time(4.)
+    assert(min_evolution_time <= result.best_evolution_time
+           <= min_evolution_time + time_tolerance)
+    assert(result.best_result.best_error <= min_error)
+    assert(len(result.errors) == len(result.evolution_times))
+
+    # No evolution time is feasible if the longest one is not.
+    result = min_time(1.)
+    assert(result.best_evolution_time is None)
+    assert(result.evolution_times == [1.])
+
+    # The costs may be constructed for each evolution time.
+    cost_evolution_times = list()
+    def get_costs(evolution_time):
+        cost_evolution_times.append(evolution_time)
+        return costs
+    #ENDDEF
+    result = min_time_schroedinger_discrete(control_count, control_eval_count, get_costs,
+                                            hamiltonian, initial_states, 4., min_error,
+                                            system_eval_count,
+                                            time_tolerance=5e-1,
+                                            iteration_count=50,
+                                            max_control_norms=max_control_norms,
+                                            optimizer=LBFGSB(),)
+    assert(cost_evolution_times == result.evolution_times)
+
+    # Costs that are constructed for an evolution time may not be reused
+    # at other evolution times.
+    bandwidth_cost = ControlBandwidthMax(control_count, control_eval_count, 4.,
+                                         np.repeat(1e-1, control_count))
+    try:
+        min_time_schroedinger_discrete(control_count, control_eval_count,
+                                       costs + [bandwidth_cost],
+                                       hamiltonian, initial_states, 4., min_error,
+                                       system_eval_count)
+        assert(False)
+    except ValueError:
+        pass
+
+    # Each optimization is saved to its own file.
+    with tempfile.TemporaryDirectory() as save_dir:
+        save_file_path = os.path.join(save_dir, "min_time.h5")
+        result = min_time_schroedinger_discrete(control_count, control_eval_count, costs,
+                                                hamiltonian, initial_states, 4., min_error,
+                                                system_eval_count,
+                                                save_file_path=save_file_path,
+                                                time_tolerance=5e-1,
+                                                save_iteration_step=10,
+                                                iteration_count=50,
+                                                max_control_norms=max_control_norms,
+                                                optimizer=LBFGSB(),)
+        assert(len(set(result.save_file_paths)) == len(result.evolution_times))
+        for i, evolution_time in enumerate(result.evolution_times):
+            assert(result.save_file_paths[i]
+                   == os.path.join(save_dir, "min_time_{}.h5".format(i)))
+            with h5py.File(result.save_file_paths[i], "r") as save_file:
+                assert(np.allclose(save_file["evolution_time"][()], evolution_time))
+        #ENDFOR
+    #ENDWITH
+
+    # A single save file can not resume the bisection.
+    try:
+        min_time_schroedinger_discrete(control_count, control_eval_count, costs,
+                                       hamiltonian, initial_states, 4., min_error,
+                                       system_eval_count, resume_from="min_time.h5")
+        assert(False)
+    except ValueError:
+        pass
+
+
+def test_multiresolution_schroedinger_discrete():
+    """
+    Check that the controls are resampled exactly between resolutions
+    and that the coarse-to-fine driver converges at the finest resolution.
+    """
+    import numpy as np
+
+    from qoc.core import multiresolution_schroedinger_discrete
+    from qoc.core.common import resample_controls
+    from qoc.core.schroedingerdiscrete import evolve_schroedinger_discrete
+    from qoc.standard import (Adam, SIGMA_X, SIGMA_Y, TargetStateInfidelity,)
+
+    # Resampling reproduces linear controls exactly.
+    controls = np.stack((np.linspace(0, 1, 4), 1j * np.linspace(2, -1, 4)), axis=1)
+    expected_controls = np.stack((np.linspace(0, 1, 7), 1j * np.linspace(2, -1, 7)),
+                                 axis=1)
+    assert(np.allclose(resample_controls(controls, 7), expected_controls))
+
+    # Refining the control grid leaves the linearly interpolated controls,
+    # and hence the evolution, unchanged.
+    hamiltonian = lambda controls, time: controls[0] * SIGMA_X + controls[1] * SIGMA_Y
+    initial_states = np.array([[[1], [0]]])
+    target_states = np.array([[[0], [1]]])
+    costs = [TargetStateInfidelity(target_states)]
+    evolution_time = 2.
+    system_eval_count = 21
+    controls = np.random.default_rng(0).uniform(-1, 1, (6, 2))
+    errors = [evolve_schroedinger_discrete(evolution_time, hamiltonian, initial_states,
+                                           system_eval_count, controls=controls_,
+                                           costs=costs).error
+              for controls_ in (controls, resample_controls(controls, 11))]
+    assert(np.allclose(errors[0], errors[1]))
+
+    # Flip the state at three resolutions.
+    control_eval_counts = [3, 6, 11]
+    system_eval_counts = [5, 11, 21]
+    min_error = 1e-4
+    result = multiresolution_schroedinger_discrete(2, control_eval_counts, costs,
+                                                   evolution_time, hamiltonian,
+                                                   initial_states, system_eval_counts,
+                                                   iteration_counts=200,
+                                                   min_errors=[1e-2, 1e-2, min_error],
+                                                   optimizer=Adam(learning_rate=1e-1),)
+    assert(len(result.results) == 3)
+    assert(result.best_result is result.results[-1])
+    assert(np.shape(result.best_result.best_controls) == (11, 2))
+    assert(result.best_result.best_error <= min_error)
+
+
 ### utility methods ###
 
 def random_complex_matrix(matrix_size):
@@ -626,18 +1920,41 @@ def random_hermitian_matrix(matrix_size):
 ### all ###
 def _test_all():
     test_clip_control_norms()
+    test_get_control_bounds()
     test_strip_slap()
+    test_evaluate_control_costs()
     
     test_evolve_lindblad_discrete()
+    test_evolve_lindblad_discrete_magnus()
+    test_evolve_lindblad_discrete_fixed_step()
+    test_evolve_lindblad_discrete_constant()
+    test_evolve_lindblad_discrete_packed()
+    test_evolve_lindblad_discrete_low_rank()
     test_grape_lindblad_discrete()
+    test_evaluate_lindblad_discrete_rkdp5_grads()
+    test_grape_lindblad_discrete_hessian()
+
+    test_evolve_lindblad_trajectories()
     
     test_get_lindbladian()
+    test_get_lindbladian_superoperator()
     test_interpolate_linear_points()
     test_magnus()
     test_rkdp5()
     
     test_evolve_schroedinger_discrete()
     test_grape_schroedinger_discrete()
+    test_grape_schroedinger_discrete_lbfgsb()
+    test_grape_custom_optimizer()
+    test_grape_schroedinger_discrete_trust_ncg()
+    test_grape_schroedinger_discrete_in_place()
+    test_grape_schroedinger_discrete_resume()
+    test_grape_schroedinger_discrete_batch()
+    test_krotov_schroedinger_discrete()
+    test_goat_schroedinger_discrete()
+    test_grape_control_basis()
+    test_min_time_schroedinger_discrete()
+    test_multiresolution_schroedinger_discrete()
 
 
 if __name__ == "__main__":
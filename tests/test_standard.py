@@ -22,11 +22,117 @@ def test_constants():
 
 ### qoc.standard.costs ###
 
+def test_cost_and_grad():
+    import numpy as np
+
+    from qoc.models import Cost
+    from qoc.standard import (ControlArea, ControlNorm, ControlVariation,
+                              ForbidDensities, ForbidStates,
+                              TargetDensityInfidelity, TargetDensityInfidelityTime,
+                              TargetStateInfidelity, TargetStateInfidelityTime,)
+
+    # Check that the closed form gradients of the standard costs
+    # agree with the gradients autograd computes for them.
+    random_complex = lambda *shape: np.random.rand(*shape) + 1j * np.random.rand(*shape)
+    control_count = 3
+    control_eval_count = 12
+    forbidden_count = 2
+    hilbert_size = 4
+    state_count = 2
+    system_eval_count = 11
+    max_control_norms = np.array((2., 3., 4.,))
+    control_weights = np.random.rand(control_eval_count, control_count)
+    costs = (
+        ControlArea(control_count, control_eval_count,
+                    max_control_norms=max_control_norms),
+        ControlNorm(control_count, control_eval_count,
+                    control_weights=control_weights,
+                    max_control_norms=max_control_norms),
+        ControlVariation(control_count, control_eval_count,
+                         max_control_norms=max_control_norms, order=2),
+        ForbidStates(random_complex(state_count, forbidden_count, hilbert_size, 1),
+                     system_eval_count),
+        TargetStateInfidelity(random_complex(state_count, hilbert_size, 1)),
+        TargetStateInfidelityTime(system_eval_count,
+                                  random_complex(state_count, hilbert_size, 1)),
+    )
+    density_costs = (
+        ForbidDensities(random_complex(state_count, forbidden_count,
+                                       hilbert_size, hilbert_size),
+                        system_eval_count),
+        TargetDensityInfidelity(random_complex(state_count, hilbert_size, hilbert_size)),
+        TargetDensityInfidelityTime(system_eval_count,
+                                    random_complex(state_count, hilbert_size,
+                                                   hilbert_size)),
+    )
+    states = random_complex(state_count, hilbert_size, 1)
+    densities = random_complex(state_count, hilbert_size, hilbert_size)
+    controls_list = (random_complex(control_eval_count, control_count),
+                     np.random.rand(control_eval_count, control_count) - 0.5,)
+    for costs_, states_ in ((costs, states), (density_costs, densities)):
+        for cost in costs_:
+            for controls in controls_list:
+                cost_, dcost_dcontrols, dcost_dstates = cost.cost_and_grad(controls, states_, 1)
+                (cost_expected, dcost_dcontrols_expected,
+                 dcost_dstates_expected) = Cost.cost_and_grad(cost, controls, states_, 1)
+                assert(np.allclose(cost_, cost_expected))
+                for grads, grads_expected in ((dcost_dcontrols, dcost_dcontrols_expected),
+                                              (dcost_dstates, dcost_dstates_expected)):
+                    if grads is None:
+                        assert(np.allclose(grads_expected, 0))
+                    else:
+                        assert(np.allclose(grads, grads_expected))
+            #ENDFOR
+        #ENDFOR
+    #ENDFOR
+
+    # Check that the density costs computed from the factors of the densities
+    # agree with the costs computed from the densities.
+    density_factors = random_complex(state_count, hilbert_size, 2)
+    factor_densities = np.matmul(density_factors,
+                                 np.conjugate(np.swapaxes(density_factors, -1, -2)))
+    for cost in density_costs:
+        cost_expected = cost.cost(controls, factor_densities, 1)
+        assert(np.allclose(cost.cost_low_rank(controls, density_factors, 1), cost_expected))
+        assert(np.allclose(Cost.cost_low_rank(cost, controls, density_factors, 1),
+                           cost_expected))
+    #ENDFOR
+
+
 # TODO: implement me
 def test_controlarea():
     pass
 
 
+def test_controlbandwidthmax():
+    import numpy as np
+    from qoc.standard import ControlBandwidthMax
+
+    # The cost should agree with penalizing each control's fft separately.
+    control_count = 3
+    evolution_time = 10
+    max_bandwidths = np.array((0.3, 0.5, 0.7,))
+    for control_eval_count in (20, 21,):
+        cost = ControlBandwidthMax(control_count, control_eval_count,
+                                   evolution_time, max_bandwidths)
+        real_controls = np.random.rand(control_eval_count, control_count)
+        complex_controls = (real_controls
+                            + 1j * np.random.rand(control_eval_count, control_count))
+        for controls in (real_controls, complex_controls,):
+            expected_cost = 0
+            for i, max_bandwidth in enumerate(max_bandwidths):
+                control_fft = np.abs(np.fft.fft(controls[:, i]))
+                penalized_ffts = control_fft[cost.freqs >= max_bandwidth]
+                expected_cost = expected_cost + (np.sum(penalized_ffts)
+                                                 / (penalized_ffts.shape[0]
+                                                    * np.max(penalized_ffts)))
+            #ENDFOR
+            expected_cost = expected_cost / control_count
+            assert(np.allclose(cost.cost(controls, None, 0), expected_cost))
+        #ENDFOR
+    #ENDFOR
+
+
 # TODO: implement me
 def test_controlnorm():
     pass
@@ -225,6 +331,104 @@ def test_targetstateinfidelitytime():
 
 ### qoc.standard.functions ###
 
+def test_cost_subset():
+    """
+    Check that the costs for a subset of the states equal the costs
+    constructed for that subset, and that they are unbiased.
+    """
+    import itertools
+
+    import numpy as np
+
+    from qoc.standard import (conjugate_transpose, ControlNorm,
+                              ForbidDensities, ForbidStates,
+                              TargetDensityInfidelity, TargetDensityInfidelityTime,
+                              TargetStateInfidelity, TargetStateInfidelityTime,)
+
+    state_count = 4
+    hilbert_size = 3
+    subset_count = 2
+    system_eval_count = 5
+    system_eval_step = 2
+    def random_states(*shape):
+        states = (np.random.rand(*shape, hilbert_size, 1)
+                  + 1j * np.random.rand(*shape, hilbert_size, 1))
+        return states / np.linalg.norm(states, axis=-2, keepdims=True)
+    def to_densities(states):
+        return np.matmul(states, conjugate_transpose(states))
+    states = random_states(state_count)
+    targets = random_states(state_count)
+    forbidden = random_states(state_count, 2)
+    get_costs = lambda indices: (
+        (ForbidStates(forbidden[indices], system_eval_count), states),
+        (TargetStateInfidelity(targets[indices]), states),
+        (TargetStateInfidelityTime(system_eval_count, targets[indices]), states),
+        (ForbidDensities(to_densities(forbidden[indices]), system_eval_count),
+         to_densities(states)),
+        (TargetDensityInfidelity(to_densities(targets[indices])), to_densities(states)),
+        (TargetDensityInfidelityTime(system_eval_count, to_densities(targets[indices])),
+         to_densities(states)),
+    )
+    full_indices = np.arange(state_count)
+    subset_errors = list()
+    for indices in itertools.combinations(full_indices, subset_count):
+        indices = np.array(indices)
+        errors = list()
+        for (cost, states_), (expected_cost, _) in zip(get_costs(full_indices),
+                                                       get_costs(indices)):
+            subset_cost = cost.subset(indices)
+            error = subset_cost.cost(None, states_[indices], system_eval_step)
+            expected_error = expected_cost.cost(None, states_[indices], system_eval_step)
+            assert(np.allclose(error, expected_error))
+            errors.append(error)
+        #ENDFOR
+        subset_errors.append(errors)
+    #ENDFOR
+    full_errors = [cost.cost(None, states_, system_eval_step)
+                   for cost, states_ in get_costs(full_indices)]
+    assert(np.allclose(np.mean(subset_errors, axis=0), full_errors))
+
+    # Costs that do not depend on the states are the same for every subset.
+    control_norm = ControlNorm(1, 1)
+    assert(control_norm.subset(np.array([0])) is control_norm)
+
+
+def test_control_basis():
+    """
+    Check the shapes, norms and bandwidths of the control bases.
+    """
+    import numpy as np
+
+    from qoc.standard import (get_chebyshev_basis, get_crab_basis,
+                              get_fourier_basis, get_slepian_basis,)
+
+    basis_size = 7
+    control_eval_count = 64
+    for control_basis in (get_chebyshev_basis(basis_size, control_eval_count),
+                          get_crab_basis(basis_size, control_eval_count, seed=0),
+                          get_fourier_basis(basis_size, control_eval_count),
+                          get_slepian_basis(basis_size, control_eval_count),):
+        assert(control_basis.shape == (control_eval_count, basis_size))
+        assert(np.allclose(np.max(np.abs(control_basis)), 1))
+        assert(np.linalg.matrix_rank(control_basis) == basis_size)
+    #ENDFOR
+
+    # The fourier basis has no frequencies above (basis_size // 2) / evolution_time.
+    # The periodic extension over `control_eval_count` - 1 points is exact.
+    fourier_basis = get_fourier_basis(basis_size, control_eval_count)
+    spectrum = np.fft.rfft(fourier_basis[:-1], axis=0)
+    assert(np.allclose(spectrum[basis_size // 2 + 1:], 0))
+
+    # The crab basis is reproducible given a seed.
+    assert(np.array_equal(get_crab_basis(basis_size, control_eval_count, seed=1),
+                          get_crab_basis(basis_size, control_eval_count, seed=1)))
+
+    # The slepian sequences are orthogonal.
+    slepian_basis = get_slepian_basis(basis_size, control_eval_count)
+    gram = np.matmul(slepian_basis.T, slepian_basis)
+    assert(np.allclose(gram, np.diag(np.diag(gram))))
+
+
 def test_expm():
     from autograd import jacobian
     import numpy as np
@@ -247,8 +451,182 @@ def test_expm():
     assert(np.allclose(dexpm_dm, dexpm_dm_expected))
 
 
+def test_expm_multiply():
+    import autograd.numpy as anp
+    from autograd.test_util import check_grads
+    import numpy as np
+    import scipy.linalg as la
+
+    from qoc.standard.functions.expm import expm_multiply
+
+    # Check the action of the exponential, including a matrix with a large norm,
+    # against scipy.
+    for scale in (0.1, 5.):
+        a = scale * (np.random.rand(6, 6) + 1j * np.random.rand(6, 6))
+        b = np.random.rand(2, 6, 3) + 1j * np.random.rand(2, 6, 3)
+        assert(np.allclose(expm_multiply(a, b), np.matmul(la.expm(a), b)))
+    #ENDFOR
+    check_grads(lambda a_: anp.abs(expm_multiply(a_, b)), modes=["rev"], order=1)(a / scale)
+
+
+def test_traces_inner_products():
+    import autograd.numpy as anp
+    from autograd.test_util import check_grads
+    import numpy as np
+
+    from qoc.standard.functions.convenience import (conjugate_transpose,
+                                                    inner_products, traces,)
+
+    # Check the batched primitives against their loop equivalents.
+    shape = (3, 2, 4, 4)
+    a = np.random.rand(*shape) + 1j * np.random.rand(*shape)
+    b = np.random.rand(*shape) + 1j * np.random.rand(*shape)
+    expected_traces = np.array([[np.trace(a_) for a_ in a__] for a__ in a])
+    assert(np.allclose(traces(a), expected_traces))
+    expected_inner_products = traces(np.matmul(conjugate_transpose(a), b))
+    assert(np.allclose(inner_products(a, b), expected_inner_products))
+    assert(np.allclose(inner_products(a, b[0, 0]),
+                       traces(np.matmul(conjugate_transpose(a), b[0, 0]))))
+
+    # Check the vjps, including broadcasting, against finite differences.
+    check_grads(lambda a_: anp.abs(traces(a_)), modes=["rev"], order=1)(a)
+    check_grads(lambda a_, b_: anp.abs(inner_products(a_, b_)),
+                modes=["rev"], order=1)(a, b)
+    check_grads(lambda a_, b_: anp.abs(inner_products(a_, b_)),
+                modes=["rev"], order=1)(a, b[:, :1])
+
+
+def test_pack_hermitian():
+    import autograd.numpy as anp
+    from autograd.test_util import check_grads
+    import numpy as np
+
+    from qoc.standard.functions.convenience import (pack_hermitian,
+                                                    pack_hermitian_superoperator,
+                                                    unpack_hermitian,)
+
+    # Check that the packing round trips and holds hilbert_size ** 2 reals.
+    hilbert_size = 4
+    shape = (3, 2, hilbert_size, hilbert_size)
+    a = np.random.rand(*shape) + 1j * np.random.rand(*shape)
+    hermitian = a + np.conjugate(np.swapaxes(a, -1, -2))
+    packed = pack_hermitian(hermitian)
+    assert(packed.shape == (3, 2, hilbert_size ** 2))
+    assert(np.isrealobj(packed))
+    assert(np.allclose(unpack_hermitian(packed), hermitian))
+    assert(np.allclose(packed[..., :hilbert_size],
+                       np.real(np.diagonal(hermitian, axis1=-2, axis2=-1))))
+
+    # Check that the packed superoperator commutes with the packing
+    # for a hermiticity preserving superoperator, p -> A p A^dagger + B p B^dagger.
+    b = np.random.rand(2, hilbert_size, hilbert_size) + 1j * np.random.rand(2, hilbert_size, hilbert_size)
+    superoperator = (np.kron(b[0], np.conjugate(b[0]))
+                     + np.kron(b[1], np.conjugate(b[1])))
+    vectorized = np.reshape(hermitian, (6, hilbert_size ** 2))
+    expected_packed = pack_hermitian(np.reshape(np.matmul(vectorized, superoperator.T), shape))
+    packed_superoperator = pack_hermitian_superoperator(superoperator)
+    assert(np.isrealobj(packed_superoperator))
+    assert(np.allclose(np.matmul(packed, packed_superoperator.T), expected_packed))
+
+    # Check the gradients against finite differences.
+    check_grads(lambda a_: pack_hermitian(a_), modes=["rev"], order=1)(a)
+    check_grads(lambda packed_: anp.abs(unpack_hermitian(packed_)), modes=["rev"], order=1)(packed)
+    check_grads(pack_hermitian_superoperator, modes=["rev"], order=1)(superoperator)
+
+
 ### qoc.standard.optimizers ###
 
+def test_adadelta():
+    import numpy as np
+
+    from qoc.standard.optimizers.adadelta import Adadelta
+
+    # Check the first two updates against the algorithm in the paper.
+    rho = 0.95
+    epsilon = 1e-6
+    grads = np.array([[0, 1],
+                      [2, 3]], dtype=np.float64)
+    params = np.ones((2, 2))
+    gradient_square_moment = (1 - rho) * np.square(grads)
+    step1 = np.sqrt(epsilon) / np.sqrt(gradient_square_moment + epsilon) * grads
+    update_square_moment = (1 - rho) * np.square(step1)
+    params1 = params - step1
+    gradient_square_moment = rho * gradient_square_moment + (1 - rho) * np.square(grads)
+    step2 = (np.sqrt(update_square_moment + epsilon)
+             / np.sqrt(gradient_square_moment + epsilon) * grads)
+    params2 = params1 - step2
+    adadelta = Adadelta(epsilon=epsilon, rho=rho)
+    adadelta.run(None, 0, params, None)
+    params_test = np.copy(params)
+    adadelta.update(grads, params_test)
+    assert(np.allclose(params_test, params1))
+    adadelta.update(grads, params_test)
+    assert(np.allclose(params_test, params2))
+
+    # Check that the optimizer minimizes a quadratic within the bounds,
+    # and that the initial params are not modified.
+    target = np.arange(5.)
+    jacobian = lambda params_: (2 * (params_ - target), False)
+    bounds = (np.repeat(-1., 5), np.repeat(2., 5))
+    evaluated_params = list()
+    def jacobian_(params_):
+        evaluated_params.append(np.copy(params_))
+        return jacobian(params_)
+    initial_params = np.zeros(5)
+    Adadelta(learning_rate=10.).run(None, 1000, initial_params, jacobian_, bounds=bounds)
+    assert(np.allclose(evaluated_params[-1], np.clip(target, *bounds), atol=1e-3))
+    assert(np.allclose(initial_params, np.zeros(5)))
+
+
+def test_adafactor():
+    import numpy as np
+
+    from qoc.standard.optimizers.adafactor import Adafactor
+
+    # Check the first update against the algorithm in the paper.
+    # On the first iteration beta_2 is 0, so the second moment is
+    # the outer product of the row and column sums of the squared gradients
+    # divided by the total sum.
+    grads = np.array([[1, 2],
+                      [3, 4],
+                      [5, 6]], dtype=np.float64)
+    square_grads = np.square(grads)
+    second_moment = (np.outer(np.sum(square_grads, axis=1), np.sum(square_grads, axis=0))
+                     / np.sum(square_grads))
+    step = grads / np.sqrt(second_moment)
+    step = step / max(1, np.sqrt(np.mean(np.square(step))))
+    params = np.ones(6)
+    params1 = params - 1e-2 * np.ravel(step)
+    adafactor = Adafactor(column_count=2)
+    adafactor.run(None, 0, params, None)
+    assert(adafactor.row_square_moment.shape == (3,))
+    assert(adafactor.column_square_moment.shape == (2,))
+    params_test = np.copy(params)
+    adafactor.update(np.ravel(grads), params_test)
+    assert(np.allclose(params_test, params1))
+
+    # Check that the params must fill the matrix.
+    try:
+        Adafactor(column_count=4).run(None, 0, params, None)
+        raise AssertionError("Adafactor accepted params that do not fill the matrix.")
+    except ValueError:
+        pass
+
+    # Check that the optimizer minimizes a quadratic within the bounds.
+    target = np.arange(6.)
+    jacobian = lambda params_: (2 * (params_ - target), False)
+    bounds = (np.repeat(-1., 6), np.repeat(2., 6))
+    for column_count in (None, 2):
+        evaluated_params = list()
+        def jacobian_(params_):
+            evaluated_params.append(np.copy(params_))
+            return jacobian(params_)
+        Adafactor(column_count=column_count, learning_rate=1e-1).run(None, 300, np.zeros(6),
+                                                                     jacobian_, bounds=bounds)
+        assert(np.allclose(evaluated_params[-1], np.clip(target, *bounds), atol=1e-2))
+    #ENDFOR
+
+
 def test_adam():
     import numpy as np
     
@@ -297,10 +675,159 @@ def test_adam():
     assert(np.allclose(params1[0][1], params[0][1]))
     assert(np.allclose(params1[1][0], params[1][0]))
 
+    # Check the in place update against the textbook update
+    # with gradient scaling, gradient clipping and learning rate decay,
+    # and check that the gradients are not modified.
+    beta_1 = 0.9
+    beta_2 = 0.999
+    clip_grads = 0.5
+    epsilon = 1e-8
+    learning_rate = 1e-2
+    learning_rate_decay = 2
+    scale_grads = 2
+    adam = Adam(clip_grads=clip_grads, learning_rate=learning_rate,
+                learning_rate_decay=learning_rate_decay, scale_grads=scale_grads)
+    params = np.random.rand(10)
+    gradient_moment = np.zeros(10)
+    gradient_square_moment = np.zeros(10)
+    adam.run(None, 0, params, None)
+    params_test = np.copy(params)
+    for iteration in range(1, 4):
+        grads = np.random.rand(10) - 0.5
+        grads_copy = np.copy(grads)
+        params_test_ = adam.update(grads, params_test, out=params_test)
+        assert(params_test_ is params_test)
+        assert(np.array_equal(grads, grads_copy))
+        grads = np.clip(grads / np.linalg.norm(grads) * scale_grads, -clip_grads, clip_grads)
+        gradient_moment = beta_1 * gradient_moment + (1 - beta_1) * grads
+        gradient_square_moment = (beta_2 * gradient_square_moment
+                                  + (1 - beta_2) * np.square(grads))
+        gradient_moment_hat = gradient_moment / (1 - np.power(beta_1, iteration))
+        gradient_square_moment_hat = (gradient_square_moment
+                                      / (1 - np.power(beta_2, iteration)))
+        learning_rate_ = learning_rate * np.exp(-(iteration - 1) / learning_rate_decay)
+        params = params - learning_rate_ * (gradient_moment_hat
+                                            / (np.sqrt(gradient_square_moment_hat) + epsilon))
+        assert(np.allclose(params_test, params))
+    #ENDFOR
+
+
+def test_lbfgsb():
+    import numpy as np
+
+    from qoc.standard.optimizers.lbfgsb import LBFGSB
+
+    # Check that the optimizer minimizes a quadratic, and that the function
+    # and jacobian are evaluated at the same points.
+    target = np.arange(5.)
+    function_params = list()
+    jacobian_params = list()
+    def function(params, min_error):
+        function_params.append(np.copy(params))
+        error = np.sum(np.square(params - target))
+        return error, error <= min_error
+    def jacobian(params, min_error):
+        jacobian_params.append(np.copy(params))
+        return 2 * (params - target), False
+    result = LBFGSB().run(function, 100, np.zeros(5), jacobian, args=(0,))
+    assert(np.allclose(result.x, target))
+    assert(np.allclose(function_params, jacobian_params))
+
+    # Check that optimization terminates once the error is below `min_error`.
+    function_params.clear()
+    result = LBFGSB().run(function, 100, np.zeros(5), jacobian, args=(1,))
+    assert(result.fun <= 1)
+    assert(np.allclose(function_params[-1], result.x))
+    assert(len(function_params) < 5)
+
+    # Check that the optimizer converges onto the bounds.
+    bounds = (np.repeat(-1., 5), np.repeat(2., 5))
+    result = LBFGSB().run(function, 100, np.zeros(5), jacobian, args=(0,),
+                          bounds=bounds)
+    assert(np.allclose(result.x, np.clip(target, *bounds)))
+
+
+def test_trust_ncg():
+    import numpy as np
+
+    from qoc.standard.optimizers.trustncg import TrustNCG
+
+    # Check that the optimizer minimizes a non-separable quadratic.
+    hessian = np.diag(np.arange(1., 6.)) + np.ones((5, 5))
+    target = np.arange(5.)
+    hessian_vector_products = list()
+    def function(params, min_error):
+        error = np.dot(params - target, np.matmul(hessian, params - target)) / 2
+        return error, error <= min_error
+    def jacobian(params, min_error):
+        return np.matmul(hessian, params - target), False
+    def hessian_vector_product(params, vector, min_error):
+        hessian_vector_products.append(vector)
+        return np.matmul(hessian, vector)
+    result = TrustNCG().run(function, 100, np.zeros(5), jacobian, args=(0,),
+                            hessian_vector_product=hessian_vector_product)
+    assert(np.allclose(result.x, target))
+    assert(len(hessian_vector_products) > 0)
+
+    # Check that the hessian-vector products are required.
+    try:
+        TrustNCG().run(function, 100, np.zeros(5), jacobian, args=(0,))
+        assert(False)
+    except ValueError:
+        pass
+
+    # Check that optimization terminates once the error is below `min_error`.
+    result = TrustNCG().run(function, 100, np.zeros(5), jacobian, args=(1,),
+                            hessian_vector_product=hessian_vector_product)
+    assert(result.fun <= 1)
+
+    # Check that the optimizer respects the bounds.
+    bounds = (np.repeat(-1., 5), np.repeat(2., 5))
+    result = TrustNCG().run(function, 100, np.zeros(5), jacobian, args=(0,),
+                            bounds=bounds,
+                            hessian_vector_product=hessian_vector_product)
+    assert(np.all(bounds[0] <= result.x) and np.all(result.x <= bounds[1]))
+    assert(result.fun <= function(np.clip(target, *bounds), 0)[0] + 1e-6)
+
+
+def test_optimizer_state():
+    import numpy as np
+
+    from qoc.standard.optimizers.adadelta import Adadelta
+    from qoc.standard.optimizers.adafactor import Adafactor
+    from qoc.standard.optimizers.adam import Adam
+    from qoc.standard.optimizers.sgd import SGD
+
+    # Check that an optimization series continued from the state
+    # at one of its iterations matches the original series.
+    target = np.arange(6.)
+    for optimizer_type in (Adadelta, Adafactor, Adam, SGD):
+        optimizer = optimizer_type()
+        evaluated_params = list()
+        states = list()
+        def jacobian(params):
+            evaluated_params.append(np.copy(params))
+            states.append(optimizer.get_state())
+            return 2 * (params - target), False
+        optimizer.run(None, 6, np.zeros(6), jacobian)
+        params = evaluated_params
+        state = states[3]
+        optimizer = optimizer_type()
+        evaluated_params = list()
+        optimizer.run(None, 3, params[3], jacobian, initial_state=state)
+        assert(np.array_equal(params[3:], evaluated_params))
+        # The state may also be set before an update outside of `run`.
+        optimizer = optimizer_type()
+        optimizer.set_state(state)
+        new_params = optimizer.update(2 * (params[3] - target), np.copy(params[3]))
+        assert(np.allclose(new_params, params[4]))
+    #ENDFOR
+
 
 def test_sgd():
     import numpy as np
 
+    from qoc.standard.optimizers.adam import Adam
     from qoc.standard.optimizers.sgd import SGD
     
     sgd = SGD(learning_rate=1)
@@ -309,13 +836,30 @@ def test_sgd():
     params = sgd.update(grads, params)
     assert(np.allclose(params, np.zeros_like(params)))
 
+    # Check that the params are projected onto the bounds.
+    target = np.arange(5.)
+    jacobian = lambda params_: (2 * (params_ - target), False)
+    bounds = (np.repeat(-1., 5), np.repeat(2., 5))
+    for optimizer in (SGD(learning_rate=1e-1), Adam(learning_rate=1e-1),):
+        # The optimizers do not return the params, so record the last ones evaluated.
+        evaluated_params = list()
+        def jacobian_(params_):
+            evaluated_params.append(params_)
+            return jacobian(params_)
+        optimizer.run(None, 300, np.zeros(5), jacobian_, bounds=bounds)
+        assert(np.allclose(evaluated_params[-1], np.clip(target, *bounds), atol=1e-3))
+    #ENDFOR
+
 
 ### all ###
 
 def _test_all():
     test_constants()
     
+    test_cost_and_grad()
+    test_cost_subset()
     test_controlarea()
+    test_controlbandwidthmax()
     test_controlnorm()
     test_controlvariation()
     test_forbiddensities()
@@ -325,10 +869,19 @@ def _test_all():
     test_targetstateinfidelity()
     test_targetstateinfidelitytime()
 
+    test_control_basis()
     test_expm()
+    test_expm_multiply()
+    test_traces_inner_products()
+    test_pack_hermitian()
     
+    test_adadelta()
+    test_adafactor()
     test_adam()
+    test_lbfgsb()
+    test_optimizer_state()
     test_sgd()
+    test_trust_ncg()
 
 
 if __name__ == "__main__":